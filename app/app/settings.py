@@ -53,7 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so it times everything below and sees the bytes sent
+    "core.instrumentation.RequestMetricsMiddleware",
+    # records the queries of sampled requests and of tests with a budget
+    "core.query_detector.QueryDetectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # compresses what every middleware below has produced
+    "core.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -81,6 +87,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "app.wsgi.application"
+ASGI_APPLICATION = "app.asgi.application"
+
+# ASYNC_VIEWS=1 serves the hot read endpoints with async views (see
+# core/async_views.py). app/asgi.py turns it on; leave it off under WSGI.
+ASYNC_VIEWS = bool(int(os.environ.get("ASYNC_VIEWS", 0)))
+
+# worker processes serving requests (set by scripts/run.sh); in-process
+# caches that other workers cannot invalidate are only used when it is 1
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 1))
 
 
 # Database
@@ -90,12 +105,29 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "HOST": os.environ.get("DB_HOST"),
+        "PORT": os.environ.get("DB_PORT", ""),
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        # keep a connection open for this many seconds instead of
+        # reconnecting on every request (0 closes it after each request).
+        # Under ASGI each request queries from a thread of its own, which a
+        # kept connection would outlive; pool with pgbouncer there instead.
+        "CONN_MAX_AGE": int(
+            os.environ.get("DB_CONN_MAX_AGE") or (0 if ASYNC_VIEWS else 60)
+        ),
+        # check a reused connection is still alive before handing it out
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("DB_CONN_HEALTH_CHECKS", 1))),
     }
 }
 
+# DB_POOL_MODE=pgbouncer connects through pgbouncer in transaction pooling
+# mode (see DEPLOYMENT_GUIDE.md). Server-side cursors only live as long as
+# the transaction that opened them, so they must be disabled there.
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "")
+if DB_POOL_MODE == "pgbouncer":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -137,6 +169,24 @@ MEDIA_URL = "/static/media/"
 MEDIA_ROOT = "/vol/web/media"
 STATIC_ROOT = "/vol/web/static"
 
+# "content" names uploaded images after the sha256 of their bytes so that
+# identical uploads are stored once; "uuid" gives every upload a new file
+RECIPE_IMAGE_STORAGE_MODE = os.environ.get("RECIPE_IMAGE_STORAGE_MODE", "content")
+
+STORAGES = {
+    "default": {
+        "BACKEND": "core.storage.MediaStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# largest recipe image accepted; keep in line with nginx client_max_body_size
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get("RECIPE_IMAGE_MAX_UPLOAD_SIZE", 10 * 1024 * 1024)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -150,8 +200,113 @@ REST_FRAMEWORK = {
     # YOUR SETTINGS
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "user.authentication.CachedTokenAuthentication",
+    ],
+    # JSON is written and read with orjson (see core/renderers.py); the
+    # browsable API is only offered in development
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
     ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+# token -> user lookups are cached in-process (see user/authentication.py).
+# With more than one worker SHARED_CACHE must name an alias in CACHES shared
+# by all of them, which tells every worker about revoked tokens and changed
+# users; without one the cache is off.
+TOKEN_AUTH_CACHE = {
+    "MAX_SIZE": int(os.environ.get("TOKEN_AUTH_CACHE_SIZE", 1024)),
+    "TTL": int(os.environ.get("TOKEN_AUTH_CACHE_TTL", 30)),
+    "SHARED_CACHE": os.environ.get("TOKEN_AUTH_SHARED_CACHE") or None,
+}
+
+# "all" and "exclude" recipe filters are answered from per-user bitmaps kept
+# in-process for TTL seconds (see recipe/bitmaps.py); recipes changed since
+# an index was built are matched in SQL
+RECIPE_BITMAP_INDEX = {
+    "ENABLED": bool(int(os.environ.get("RECIPE_BITMAP_INDEX", 1))),
+    "MAX_USERS": int(os.environ.get("RECIPE_BITMAP_INDEX_USERS", 256)),
+    "TTL": int(os.environ.get("RECIPE_BITMAP_INDEX_TTL", 30)),
+}
+
+# tag/ingredient autocomplete (?q=) is answered from per-user name indexes
+# kept in-process for TTL seconds (see recipe/autocomplete.py); names added
+# or renamed since an index was built are matched in SQL
+RECIPE_ATTR_AUTOCOMPLETE = {
+    "ENABLED": bool(int(os.environ.get("RECIPE_AUTOCOMPLETE_INDEX", 1))),
+    "MAX_USERS": int(os.environ.get("RECIPE_AUTOCOMPLETE_INDEX_USERS", 256)),
+    "TTL": int(os.environ.get("RECIPE_AUTOCOMPLETE_INDEX_TTL", 30)),
+}
+
+# the recipe, tag and ingredient lists are cached per user for TTL seconds
+# (see recipe/response_cache.py) in the "responses" alias below
+RESPONSE_CACHE = {
+    "ENABLED": bool(int(os.environ.get("RESPONSE_CACHE", 1))),
+    "ALIAS": "responses",
+    "TTL": int(os.environ.get("RESPONSE_CACHE_TTL", 60)),
+}
+
+# local memory is per worker; "file" shares the cache (and so the hits)
+# between all workers on the host
+if os.environ.get("RESPONSE_CACHE_BACKEND") == "file":
+    RESPONSES_CACHE_BACKEND = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("RESPONSE_CACHE_DIR", "/vol/web/cache"),
+    }
+else:
+    RESPONSES_CACHE_BACKEND = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        **RESPONSES_CACHE_BACKEND,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# text and JSON responses of at least MIN_SIZE bytes (and all streamed ones)
+# are compressed with brotli or gzip, as the client prefers
+# (see core/compression.py)
+RESPONSE_COMPRESSION = {
+    "ENABLED": bool(int(os.environ.get("RESPONSE_COMPRESSION", 1))),
+    "MIN_SIZE": int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024)),
+    "GZIP_LEVEL": int(os.environ.get("RESPONSE_COMPRESSION_GZIP_LEVEL", 6)),
+    "BROTLI_QUALITY": int(os.environ.get("RESPONSE_COMPRESSION_BROTLI_QUALITY", 4)),
+}
+
+# a SAMPLE_RATE share of requests is timed (SQL, serializers, total);
+# /api/metrics/ exports the totals per view (see core/instrumentation.py).
+# The Server-Timing header shows every client the query counts and times,
+# so it is only sent under DEBUG unless turned on
+REQUEST_METRICS = {
+    "ENABLED": bool(int(os.environ.get("REQUEST_METRICS", 1))),
+    "SAMPLE_RATE": float(os.environ.get("REQUEST_METRICS_SAMPLE_RATE", 1.0)),
+    "SERVER_TIMING": bool(
+        int(os.environ.get("REQUEST_METRICS_SERVER_TIMING", int(DEBUG)))
+    ),
+}
+
+# the bearer token a scraper must send to read /api/metrics/; while it is
+# unset the endpoint refuses every request
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# a share of requests has its queries grouped by shape; shapes repeated
+# REPEAT_THRESHOLD times (N+1) and queries over SLOW_MS are logged with
+# the code they came from (see core/query_detector.py)
+QUERY_DETECTOR = {
+    "SAMPLE_RATE": float(os.environ.get("QUERY_DETECTOR_SAMPLE_RATE", 0.0)),
+    "REPEAT_THRESHOLD": int(os.environ.get("QUERY_DETECTOR_REPEAT_THRESHOLD", 10)),
+    "SLOW_MS": float(os.environ.get("QUERY_DETECTOR_SLOW_MS", 100)),
 }
 
 AUTHENTICATION_BACKENDS = [
@@ -163,3 +318,11 @@ AUTHENTICATION_BACKENDS = [
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 }
+
+# /api/schema/ is generated once per code version and then served from
+# memory, backed by files in OPENAPI_SCHEMA_DIR (see core/schema.py)
+OPENAPI_SCHEMA_CACHE = bool(int(os.environ.get("OPENAPI_SCHEMA_CACHE", 1)))
+OPENAPI_SCHEMA_DIR = os.environ.get("OPENAPI_SCHEMA_DIR", "/vol/web/schema")
+# identifies the deployed code (e.g. the git commit); when unset it is
+# derived from the source files
+CODE_VERSION = os.environ.get("CODE_VERSION", "")
@@ -15,26 +15,77 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 from django.contrib import admin
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from core.instrumentation import render_metrics
+from core.schema import CachedSpectacularAPIView
+from recipe.response_cache import stats as response_cache_stats
+
+
+def _health():
+    return {
+        "status": "ok",
+        "version": "1",
+        # counters of this worker process only
+        "response_cache": response_cache_stats.snapshot(),
+    }
 
 
 def health(request):
     """Simple deployment health check."""
-    return JsonResponse({"status": "ok", "version": "1"})
+    return JsonResponse(_health())
+
+
+async def ahealth(request):
+    """Simple deployment health check, for ASGI."""
+    return JsonResponse(_health())
+
+
+def _metrics():
+    cache = response_cache_stats.snapshot()
+    content = render_metrics(
+        [
+            (f"response_cache_{name}_total", f"Response cache {name}.", value)
+            for name, value in cache.items()
+        ]
+    )
+    return HttpResponse(
+        content, content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _metrics_allowed(request):
+    """Return True if request bears the METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    return bool(token) and constant_time_compare(header, f"Bearer {token}")
+
+
+def metrics(request):
+    """This worker's request metrics, in the Prometheus text format."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return _metrics()
+
+
+async def ametrics(request):
+    """This worker's request metrics, for ASGI."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return _metrics()
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/health/", health, name="health"),
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path("api/health/", ahealth if settings.ASYNC_VIEWS else health, name="health"),
+    path("api/metrics/", ametrics if settings.ASYNC_VIEWS else metrics, name="metrics"),
+    path("api/schema/", CachedSpectacularAPIView.as_view(), name="api-schema"),
     path(
         "api/docs/",
         SpectacularSwaggerView.as_view(url_name="api-schema"),
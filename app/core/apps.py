@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # times the SQL of sampled requests on every new connection
+        from core import instrumentation  # noqa: F401
+
+        # records the queries of checked requests on every new connection
+        from core import query_detector  # noqa: F401
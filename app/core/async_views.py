@@ -0,0 +1,143 @@
+"""
+Async handlers for the hot read endpoints, served under ASGI.
+
+Under ASGI, Django runs a sync view in a thread and the request holds
+that thread while it waits on the cache or the database. A view with
+AsyncViewMixin can give its GET handler an async twin, named after it
+with an "a" in front: alist for list, aretrieve for retrieve, aget for an
+APIView's get. With ASYNC_VIEWS on, as_view() returns an async view that
+awaits the twin for GET requests and runs the usual sync view in a thread
+for every other method. Routes without a twin keep their sync view.
+
+Authentication is awaited too: an authenticator's aauthenticate() is used
+when it has one, so a token found in the token cache costs no thread at
+all. Permissions, content negotiation and exception handling are DRF's
+own, as they do no I/O.
+
+ASYNC_VIEWS is off under WSGI (app/asgi.py turns it on), as an async view
+there needs an event loop of its own for every request.
+
+DRF's paginators only read synchronously and the bitmap and name indexes
+build themselves on first use, so those steps run in a thread through
+sync_to_async, which is also how the async ORM methods of this Django
+release reach the database.
+"""
+
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+
+async def authenticate(request):
+    """Authenticate request like Request._authenticate, awaiting the I/O."""
+    for authenticator in request.authenticators:
+        aauthenticate = getattr(authenticator, "aauthenticate", None)
+        if aauthenticate is None:
+            aauthenticate = sync_to_async(authenticator.authenticate)
+        try:
+            user_auth_tuple = await aauthenticate(request)
+        except exceptions.APIException:
+            request._not_authenticated()
+            raise
+
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+
+    request._not_authenticated()
+
+
+class AsyncViewMixin:
+    """Serve GET with the async twin of its handler when ASYNC_VIEWS is on."""
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        """Return the view, async if the GET handler has an async twin."""
+        if actions is None:
+            view = super().as_view(**initkwargs)
+        else:
+            view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+
+        # a viewset maps methods to actions, an APIView handles them itself
+        if actions is None:
+            handler_name = "aget"
+        elif "get" in actions:
+            handler_name = f"a{actions['get']}"
+        else:
+            return view
+        if not hasattr(cls, handler_name):
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            if request.method != "GET":
+                # writes keep their sync handlers, run in a thread
+                return await sync_to_async(view)(request, *args, **kwargs)
+
+            self = cls(**initkwargs)
+            if actions is None:
+                self.setup(request, *args, **kwargs)
+            else:
+                # as ViewSetMixin's view does, so the Allow header is the same
+                actions.setdefault("head", actions["get"])
+                self.action_map = actions
+                for method, action in actions.items():
+                    setattr(self, method, getattr(self, action))
+                self.request = request
+                self.args = args
+                self.kwargs = kwargs
+            handler = getattr(self, handler_name)
+            return await self.adispatch(handler, request, *args, **kwargs)
+
+        # keeps cls, initkwargs, actions and csrf_exempt for the router,
+        # the schema and the middleware
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, handler, request, *args, **kwargs):
+        """dispatch() for a GET request answered by an async handler."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await authenticate(request)
+            # the user is known now, so initial() does no I/O
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_queryset(self):
+        """Return get_queryset(), which may read the database, from a thread."""
+        return await sync_to_async(self.get_queryset)()
+
+    async def aget_object(self):
+        """get_object() with the async ORM."""
+        queryset = self.filter_queryset(await self.aget_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            # the lookups get_object_or_404 turns into a 404 as well
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """retrieve() with the async ORM."""
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
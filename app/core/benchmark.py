@@ -0,0 +1,173 @@
+"""
+Helpers for the scenarios run by the `benchmark` management command.
+
+Each app can define a `benchmarks` module whose functions are registered
+with `@register("name")`. A scenario receives the number of iterations (and
+`size` when `--size` is given, for scenarios that seed a dataset) and
+returns a JSON-serializable dict of results.
+
+Results saved with `--output` can be given back as `--baseline`; compare()
+reports the metrics that got worse by more than a threshold. Which way is
+worse is read from the metric's name: times (`*_us`, `*_ms`), sizes
+(`bytes`, `*_kb`) and query counts should not grow, rates (`*_per_sec`)
+should not drop.
+"""
+
+import resource
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.db import connection, transaction
+
+LOWER_IS_BETTER = (
+    "_us",
+    "_ms",
+    "_kb",
+    "bytes",
+    "queries_per_call",
+    "queries_per_request",
+)
+HIGHER_IS_BETTER = ("_per_sec",)
+
+_registry = {}
+
+
+def register(name):
+    """Register a benchmark scenario under name."""
+
+    def decorator(func):
+        _registry[name] = func
+        return func
+
+    return decorator
+
+
+def get_scenarios():
+    """Return the registered scenarios by name."""
+    return dict(_registry)
+
+
+def percentile(sorted_values, pct):
+    """Return the pct percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1)))
+    )
+    return sorted_values[index]
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block."""
+    counter = {"queries": 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter["queries"] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def measure(func, iterations):
+    """Call func iterations times and return timing and query statistics."""
+    timings = []
+    with count_queries() as counter:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "queries_per_call": counter["queries"] / iterations,
+        "mean_us": round(sum(timings) / iterations * 1e6, 2),
+        "p50_us": round(percentile(timings, 50) * 1e6, 2),
+        "p95_us": round(percentile(timings, 95) * 1e6, 2),
+        "p99_us": round(percentile(timings, 99) * 1e6, 2),
+    }
+
+
+def peak_rss_kb():
+    """Return the most memory this process has held, in KiB."""
+    # ru_maxrss is in KiB on Linux, which the images run
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_requests(send, iterations, max_seconds=None, rollback=False):
+    """Send a test client request repeatedly and return its statistics.
+
+    send() is called iterations times, or until max_seconds have passed.
+    With rollback, every call runs in a transaction rolled back afterwards,
+    so a request that changes data meets the same data each time; the
+    savepoint is not timed or counted.
+    """
+    timings = []
+    queries = 0
+    deadline = time.perf_counter() + max_seconds if max_seconds else None
+    for _ in range(iterations):
+        with transaction.atomic() if rollback else nullcontext():
+            with count_queries() as counter:
+                start = time.perf_counter()
+                response = send()
+                # a streamed body is produced as the client reads it
+                if response.streaming:
+                    body = b"".join(response.streaming_content)
+                else:
+                    body = response.content
+                timings.append(time.perf_counter() - start)
+            if rollback:
+                transaction.set_rollback(True)
+        queries += counter["queries"]
+        if deadline and time.perf_counter() > deadline:
+            break
+
+    requests = len(timings)
+    timings.sort()
+    return {
+        "status": response.status_code,
+        "requests": requests,
+        "queries_per_request": round(queries / requests, 2),
+        "bytes": len(body),
+        "mean_us": round(sum(timings) / requests * 1e6, 2),
+        "p50_us": round(percentile(timings, 50) * 1e6, 2),
+        "p95_us": round(percentile(timings, 95) * 1e6, 2),
+        "p99_us": round(percentile(timings, 99) * 1e6, 2),
+        # the process peak so far, which only grows as the run goes on
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def _metrics(results, prefix=""):
+    """Yield (dotted path, value) for every number in nested results."""
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _metrics(value, f"{path}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(results, baseline, threshold):
+    """Return the metrics of results worse than baseline by over threshold %."""
+    previous = dict(_metrics(baseline))
+    regressions = []
+    for path, value in _metrics(results):
+        old = previous.get(path)
+        name = path.rsplit(".", 1)[-1]
+        if old is None:
+            continue
+        if name.endswith(LOWER_IS_BETTER):
+            worse = value > old * (1 + threshold / 100)
+        elif name.endswith(HIGHER_IS_BETTER):
+            worse = value < old * (1 - threshold / 100)
+        else:
+            continue
+        if worse:
+            change = round((value - old) / old * 100, 1) if old else None
+            regressions.append(
+                {"metric": path, "baseline": old, "value": value, "change_pct": change}
+            )
+    return regressions
@@ -0,0 +1,155 @@
+"""
+Response compression, negotiated per request.
+
+Responses of at least MIN_SIZE bytes are compressed with brotli or gzip,
+whichever the client's Accept-Encoding prefers (brotli on a tie, as it
+makes JSON smaller for the same time). Smaller responses are sent as they
+are: compressing them saves less than it costs. Streamed responses, such
+as the recipe export, are compressed as they are produced, whatever their
+size. Without the brotli package only gzip is offered.
+
+Like GZipMiddleware, a compressed response gets a weak ETag; If-None-Match
+compares ETags weakly, so clients still get their 304s.
+"""
+
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MIN_SIZE": 1024,
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 4,
+}
+
+# text and JSON bodies; images and archives are compressed already
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/(json|x-ndjson|javascript|xml|vnd\.oai\.openapi))"
+)
+
+
+def get_options():
+    """Return the RESPONSE_COMPRESSION settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, "RESPONSE_COMPRESSION", {})}
+
+
+def _gzip(options):
+    compressor = zlib.compressobj(
+        options["GZIP_LEVEL"], zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    return compressor.compress, compressor.flush
+
+
+def _brotli(options):
+    compressor = brotli.Compressor(quality=options["BROTLI_QUALITY"])
+    return compressor.process, compressor.finish
+
+
+# content coding -> factory of (compress, finish), best first
+COMPRESSORS = {"br": _brotli, "gzip": _gzip} if brotli else {"gzip": _gzip}
+
+
+def parse_accept_encoding(header):
+    """Return content coding -> q value of an Accept-Encoding header."""
+    qualities = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def choose_encoding(header):
+    """Return the supported coding the client prefers, or None."""
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in COMPRESSORS:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compress_chunks(chunks, compress, finish):
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def _acompress_chunks(chunks, compress, finish):
+    async for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with brotli or gzip, as the client prefers."""
+
+    async def __acall__(self, request):
+        # no I/O here, so under ASGI skip MiddlewareMixin's trip to a thread
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        options = get_options()
+        if not options["ENABLED"] or response.has_header("Content-Encoding"):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get("Content-Type", "")):
+            return response
+        if not response.streaming and len(response.content) < options["MIN_SIZE"]:
+            return response
+
+        # the body now depends on Accept-Encoding, caches must know that
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+
+        compress, finish = COMPRESSORS[coding](options)
+        if response.streaming:
+            # not flushed per chunk; the export yields one line per recipe
+            if response.is_async:
+                response.streaming_content = _acompress_chunks(
+                    response.streaming_content, compress, finish
+                )
+            else:
+                response.streaming_content = _compress_chunks(
+                    response.streaming_content, compress, finish
+                )
+            # the compressed length is only known once it has been sent
+            del response.headers["Content-Length"]
+        else:
+            content = compress(response.content) + finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = f"W/{etag}"
+        response.headers["Content-Encoding"] = coding
+        return response
@@ -0,0 +1,28 @@
+"""
+Helpers to inspect the PostgreSQL query plan chosen for a queryset.
+"""
+
+import json
+
+
+def explain(queryset, analyze=False):
+    """Return the root node of the JSON plan PostgreSQL picks for queryset."""
+    output = queryset.explain(format="json", analyze=analyze)
+    return json.loads(output)[0]["Plan"]
+
+
+def plan_nodes(plan):
+    """Yield every node of a plan, depth first."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def indexes_used(plan):
+    """Return the names of the indexes scanned anywhere in plan."""
+    return {node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node}
+
+
+def node_types(plan):
+    """Return the node types (e.g. "Seq Scan", "Sort") found in plan."""
+    return {node["Node Type"] for node in plan_nodes(plan)}
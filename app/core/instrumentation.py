@@ -0,0 +1,378 @@
+"""
+Per-request timings, exported as Server-Timing and Prometheus metrics.
+
+A sampled request records how long it took, how many SQL queries it ran
+and how long they took, how long its serializers spent rendering and
+validating (including any query a serializer runs), and how many bytes
+its response sent. The request carries that in a context variable, so it
+follows the request into the threads the ASGI handler and the async views
+run sync code in. Every database connection gets an execute wrapper once,
+when it connects, which does nothing for requests that are not sampled.
+
+Sampled requests are added to this worker's totals by view and action,
+which /api/metrics/ serves in the Prometheus text format together with the
+response cache counters, and, with SERVER_TIMING on, get a Server-Timing
+header. Each worker process
+keeps its own totals and labels them with its pid, so series from
+different workers do not mix. Totals only count sampled requests; with a
+SAMPLE_RATE below 1 they are a sample, but ratios and averages hold.
+Requests that are not sampled cost a settings lookup and a random().
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.deprecation import MiddlewareMixin
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SAMPLE_RATE": 1.0,
+    "SERVER_TIMING": False,
+}
+
+# upper bounds in seconds of the request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "recipe_app"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def get_options():
+    """Return the REQUEST_METRICS settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, "REQUEST_METRICS", {})}
+
+
+class RequestMetrics:
+    """What one sampled request spent its time on."""
+
+    __slots__ = ("queries", "db_seconds", "serializer_seconds", "serializing")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        # set while a serializer is timed, so nested ones are not counted twice
+        self.serializing = False
+
+
+def current_metrics():
+    """Return the metrics of the request being handled, if it is sampled."""
+    return _current.get()
+
+
+def _time_queries(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Time the queries of sampled requests on every new connection."""
+    # connection_created is sent again each time the connection reconnects
+    if _time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_queries)
+
+
+class TimedSerializerMixin:
+    """Add the time a serializer spends to the sampled request's metrics."""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_seconds += time.perf_counter() - start
+            metrics.serializing = False
+
+    def to_internal_value(self, data):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_internal_value(data)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_internal_value(data)
+        finally:
+            metrics.serializer_seconds += time.perf_counter() - start
+            metrics.serializing = False
+
+
+@contextmanager
+def serializer_time():
+    """Add the time spent in the block to the request's serializer time."""
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_seconds += time.perf_counter() - start
+        metrics.serializing = False
+
+
+class RequestStats:
+    """Thread-safe totals of the sampled requests of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every recorded request."""
+        with self._lock:
+            # (view, action, status) -> requests
+            self.requests = {}
+            # (view, action) -> [bucket counts..., count, seconds, queries,
+            # db seconds, serializer seconds, bytes]
+            self.views = {}
+
+    def record(self, view, action, status, seconds, metrics, size):
+        """Add one request to the totals."""
+        with self._lock:
+            key = (view, action, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            totals = self.views.get((view, action))
+            if totals is None:
+                totals = self.views[(view, action)] = [0] * (len(BUCKETS) + 6)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    totals[i] += 1
+            n = len(BUCKETS)
+            totals[n] += 1
+            totals[n + 1] += seconds
+            totals[n + 2] += metrics.queries
+            totals[n + 3] += metrics.db_seconds
+            totals[n + 4] += metrics.serializer_seconds
+            totals[n + 5] += size
+
+    def snapshot(self):
+        """Return copies of the request counts and the per-view totals."""
+        with self._lock:
+            return dict(self.requests), {k: list(v) for k, v in self.views.items()}
+
+
+stats = RequestStats()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    """Return labels in the Prometheus text format."""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def render_metrics(counters=()):
+    """Return this worker's totals in the Prometheus text format.
+
+    counters are (name, help, value) of other counters of this worker to
+    export along with them.
+    """
+    options = get_options()
+    requests, views = stats.snapshot()
+    worker = os.getpid()
+    lines = []
+
+    def add(name, kind, help_text, samples):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{PREFIX}_{name}{suffix}{_labels(**labels)} {value}")
+
+    rate = options["SAMPLE_RATE"] if options["ENABLED"] else 0
+    add(
+        "sample_rate",
+        "gauge",
+        "Share of the requests that are measured.",
+        [("", {"worker": worker}, rate)],
+    )
+    add(
+        "requests_total",
+        "counter",
+        "Sampled requests by view, action and status.",
+        [
+            ("", {"view": v, "action": a, "status": s, "worker": worker}, count)
+            for (v, a, s), count in sorted(requests.items())
+        ],
+    )
+
+    n = len(BUCKETS)
+    by_view = [
+        ({"view": v, "action": a, "worker": worker}, totals)
+        for (v, a), totals in sorted(views.items())
+    ]
+    histogram = []
+    for labels, totals in by_view:
+        for bound, count in zip(BUCKETS, totals):
+            histogram.append(("_bucket", {**labels, "le": bound}, count))
+        histogram.append(("_bucket", {**labels, "le": "+Inf"}, totals[n]))
+        histogram.append(("_sum", labels, totals[n + 1]))
+        histogram.append(("_count", labels, totals[n]))
+    add(
+        "request_duration_seconds",
+        "histogram",
+        "Time spent on sampled requests, to the last byte of a stream.",
+        histogram,
+    )
+    for offset, name, help_text in (
+        (2, "db_queries_total", "SQL queries run by sampled requests."),
+        (3, "db_seconds_total", "Time sampled requests spent in SQL queries."),
+        (4, "serializer_seconds_total", "Time sampled requests spent serializing."),
+        (5, "response_bytes_total", "Bytes sent in responses to sampled requests."),
+    ):
+        add(
+            name,
+            "counter",
+            help_text,
+            [("", labels, totals[n + offset]) for labels, totals in by_view],
+        )
+
+    for name, help_text, value in counters:
+        add(name, "counter", help_text, [("", {"worker": worker}, value)])
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(metrics, seconds):
+    """Return the Server-Timing header value for a request."""
+    return (
+        f"app;dur={seconds * 1e3:.1f}, "
+        f'db;dur={metrics.db_seconds * 1e3:.1f};desc="{metrics.queries} queries", '
+        f"serializer;dur={metrics.serializer_seconds * 1e3:.1f}"
+    )
+
+
+def route(request):
+    """Return the view name and action a request was routed to."""
+    match = getattr(request, "resolver_match", None)
+    method = request.method.lower()
+    if match is None:
+        return "unresolved", method
+    # a viewset maps methods to actions; other views handle the method
+    actions = getattr(match.func, "actions", None) or {}
+    return match.view_name, actions.get(method, method)
+
+
+def sampled(options):
+    """Return True if this request is to be measured."""
+    rate = options["SAMPLE_RATE"]
+    if not options["ENABLED"] or rate <= 0:
+        return False
+    return rate >= 1 or random.random() < rate
+
+
+def _stream(chunks, metrics, done):
+    """Pass chunks on, counting their bytes and their queries."""
+    # a streamed body runs its queries while it is sent, after the view
+    # has returned, so the request's metrics are made current again
+    iterator = iter(chunks)
+    size = 0
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        done(size)
+
+
+async def _astream(chunks, metrics, done):
+    """_stream() for an async body."""
+    iterator = chunks.__aiter__()
+    size = 0
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        done(size)
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """Measure sampled requests, add Server-Timing and record them by view."""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        options = get_options()
+        if not sampled(options):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, start, options)
+
+    async def __acall__(self, request):
+        # the view's sync code runs in threads that copy this context
+        options = get_options()
+        if not sampled(options):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, start, options)
+
+    def _finish(self, request, response, metrics, start, options):
+        view, action = route(request)
+
+        def done(size):
+            seconds = time.perf_counter() - start
+            stats.record(view, action, response.status_code, seconds, metrics, size)
+
+        if options["SERVER_TIMING"]:
+            seconds = time.perf_counter() - start
+            response.headers["Server-Timing"] = server_timing(metrics, seconds)
+        if response.streaming:
+            stream = _astream if response.is_async else _stream
+            response.streaming_content = stream(
+                response.streaming_content, metrics, done
+            )
+        else:
+            done(len(response.content))
+        return response
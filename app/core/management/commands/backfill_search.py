@@ -0,0 +1,60 @@
+"""
+Django command to build the search documents of existing recipes.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Recipe, RecipeSearchDocument
+
+
+class Command(BaseCommand):
+    """Fill in RecipeSearchDocument for recipes created before search."""
+
+    help = "Build missing recipe search documents in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild every document, not only the missing ones.",
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        recipes = Recipe.objects.order_by("id")
+        if not options["all"]:
+            recipes = recipes.filter(search_document__isnull=True)
+
+        built = 0
+        last_id = 0
+        while True:
+            # one short transaction per batch keeps locks and WAL bursts small
+            with transaction.atomic():
+                ids = list(
+                    recipes.filter(id__gt=last_id).values_list("id", flat=True)[
+                        : options["batch_size"]
+                    ]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                self.build(ids)
+            built += len(ids)
+            self.stdout.write(f"Built {built} search document(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} search document(s)"))
+
+    def build(self, recipe_ids):
+        """Compute and store the documents of recipe_ids."""
+        # the same function the triggers use, so the results are identical
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {RecipeSearchDocument._meta.db_table} (recipe_id, vector)
+                SELECT id, core_recipe_search_vector(id) FROM unnest(%s) AS id
+                ON CONFLICT (recipe_id) DO UPDATE SET vector = EXCLUDED.vector
+                """,
+                [recipe_ids],
+            )
@@ -0,0 +1,94 @@
+"""
+Django command to run the registered benchmark scenarios.
+
+With --baseline the results are compared with those of an earlier run
+(saved with --output) and the command fails when a metric got worse by
+more than --threshold percent, so it can gate a CI job.
+"""
+
+import inspect
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.module_loading import autodiscover_modules
+
+from core.benchmark import compare, get_scenarios
+
+
+def accepts_size(scenario):
+    """Return True if scenario takes a dataset size."""
+    return "size" in inspect.signature(scenario).parameters
+
+
+class Command(BaseCommand):
+    """Run benchmark scenarios against the configured database."""
+
+    help = "Run benchmark scenarios and print their results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help="Scenarios to run (default: all registered scenarios).",
+        )
+        parser.add_argument("--iterations", type=int, default=1000)
+        parser.add_argument(
+            "--size",
+            type=int,
+            help="Dataset size for scenarios that seed data (default: their own).",
+        )
+        parser.add_argument("--output", help="Also write the results to this file.")
+        parser.add_argument(
+            "--baseline",
+            help="Results of an earlier run to check these against.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20.0,
+            help="Percent a metric may get worse than the baseline (default: 20).",
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        autodiscover_modules("benchmarks")
+        scenarios = get_scenarios()
+        names = options["scenarios"] or sorted(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options["baseline"]:
+            # read up front, so a bad path fails before the scenarios run
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read the baseline: {exc}")
+
+        results = {}
+        for name in names:
+            # scenarios seed their own data; roll it back afterwards
+            with transaction.atomic():
+                scenario = scenarios[name]
+                kwargs = {"iterations": options["iterations"]}
+                if options["size"] is not None and accepts_size(scenario):
+                    kwargs["size"] = options["size"]
+                results[name] = scenario(**kwargs)
+                transaction.set_rollback(True)
+
+        output = json.dumps(results, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options["threshold"])
+            if regressions:
+                self.stderr.write(json.dumps(regressions, indent=2))
+                raise CommandError(
+                    f"{len(regressions)} metrics are more than "
+                    f"{options['threshold']:g}% worse than the baseline."
+                )
@@ -0,0 +1,23 @@
+"""
+Django command to prebuild the OpenAPI schema.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.schema import build_schema
+from core.version import code_version
+
+
+class Command(BaseCommand):
+    """Generate the OpenAPI schema once so requests can serve it from disk."""
+
+    help = "Build the OpenAPI schema for the current code version."
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        paths = build_schema()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Schema for version {code_version()} written to {', '.join(paths)}"
+            )
+        )
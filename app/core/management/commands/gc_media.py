@@ -0,0 +1,166 @@
+"""
+Django command to remove media files no recipe refers to any more.
+"""
+
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import MediaFile, Recipe
+from recipe.images import VARIANTS
+
+MEDIA_ROOT_DIR = os.path.join("uploads", "recipe")
+
+
+class Command(BaseCommand):
+    """Garbage-collect orphaned recipe images and their variants."""
+
+    help = "Delete unreferenced recipe image files in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--grace-seconds",
+            type=int,
+            default=3600,
+            help="Leave files touched more recently than this alone.",
+        )
+        parser.add_argument(
+            "--scan",
+            action="store_true",
+            help="Also walk the media directory for files nothing refers to.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        self.storage = default_storage
+        self.dry_run = options["dry_run"]
+        self.batch_size = options["batch_size"]
+        self.cutoff = timezone.now() - timedelta(seconds=options["grace_seconds"])
+
+        removed = self.collect_unreferenced()
+        if options["scan"]:
+            removed += self.collect_orphans()
+
+        verb = "Would remove" if self.dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} media file(s)"))
+
+    def collect_unreferenced(self):
+        """Delete files whose reference count dropped to zero."""
+        removed = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # skip rows another gc run is already working on
+                rows = list(
+                    MediaFile.objects.select_for_update(skip_locked=True)
+                    .filter(ref_count=0, updated_at__lt=self.cutoff, id__gt=last_id)
+                    .order_by("id")[: self.batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                # do not trust the counter alone, re-check against recipes
+                names = [row.name for row in rows]
+                in_use = self.referenced(names)
+                garbage = [
+                    name
+                    for name in names
+                    if name not in in_use and not self.recently_touched(name)
+                ]
+                if not self.dry_run:
+                    for name in garbage:
+                        self.delete_image(name)
+                    MediaFile.objects.filter(name__in=garbage).delete()
+                removed += len(garbage)
+        return removed
+
+    def collect_orphans(self):
+        """Walk the media directory and delete files nothing refers to."""
+        removed = 0
+        batch = []
+        for name in self.walk(MEDIA_ROOT_DIR):
+            batch.append(name)
+            if len(batch) >= self.batch_size:
+                removed += self.delete_orphans(batch)
+                batch = []
+        if batch:
+            removed += self.delete_orphans(batch)
+        return removed
+
+    def delete_orphans(self, names):
+        """Delete the files in names that no recipe refers to."""
+        # an original's variants live in a directory named after its stem
+        originals = {}
+        for name in names:
+            if self.is_variant(name):
+                image_stem = os.path.dirname(name)
+            else:
+                image_stem = os.path.splitext(name)[0]
+            originals.setdefault(image_stem, []).append(name)
+
+        in_use = self.referenced_stems(originals)
+        garbage = [
+            name
+            for image_stem, files in originals.items()
+            if image_stem not in in_use
+            for name in files
+            if not self.recently_touched(name)
+        ]
+        if not self.dry_run:
+            for name in garbage:
+                self.storage.delete(name)
+            MediaFile.objects.filter(name__in=garbage).delete()
+        return len(garbage)
+
+    def walk(self, path):
+        """Yield the name of every file stored below path."""
+        if not self.storage.exists(path):
+            return
+        dirs, files = self.storage.listdir(path)
+        for file_name in files:
+            yield os.path.join(path, file_name)
+        for dir_name in dirs:
+            yield from self.walk(os.path.join(path, dir_name))
+
+    def is_variant(self, name):
+        """Return True if name is a resized copy of an original image."""
+        return os.path.splitext(os.path.basename(name))[0] in VARIANTS
+
+    def referenced(self, names):
+        """Return the subset of names used as a recipe image."""
+        return set(
+            Recipe.objects.filter(image__in=names).values_list("image", flat=True)
+        )
+
+    def referenced_stems(self, image_stems):
+        """Return the subset of image_stems belonging to a recipe image."""
+        if not image_stems:
+            return set()
+        query = Q()
+        for image_stem in image_stems:
+            query |= Q(image__startswith=f"{image_stem}.")
+        images = Recipe.objects.filter(query).values_list("image", flat=True)
+        return {os.path.splitext(image)[0] for image in images}
+
+    def recently_touched(self, name):
+        """Return True if the file changed inside the grace period."""
+        try:
+            return self.storage.get_modified_time(name) >= self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def delete_image(self, name):
+        """Delete an original image and its variants."""
+        self.storage.delete(name)
+        image_stem = os.path.splitext(name)[0]
+        if self.storage.exists(image_stem):
+            for variant in self.storage.listdir(image_stem)[1]:
+                self.storage.delete(os.path.join(image_stem, variant))
@@ -0,0 +1,157 @@
+"""
+Django command to load test a running server over HTTP.
+
+Each of --concurrency clients keeps a connection open (reopening it when
+the server closes it) and sends GET requests for the given paths in turn,
+as fast as the server answers, for --duration seconds. Run it with the
+same data and token against the uwsgi and the uvicorn deployment
+(SERVER_MODE) to compare them; the results are printed as JSON like those
+of the benchmark command.
+
+Point it at the nginx proxy (http://proxy:8000 in the production compose),
+not at app:9000: uwsgi listens there with its own protocol, not HTTP.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile
+
+# the endpoints with async views under ASGI; a recipe detail needs an ID
+DEFAULT_PATHS = [
+    "/api/health/",
+    "/api/user/me/",
+    "/api/recipe/recipes/",
+    "/api/recipe/tags/",
+    "/api/recipe/ingredients/",
+]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return its status and whether it keeps alive."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def client(url, paths, headers, deadline, timings, statuses):
+    """Send requests on one connection until the deadline."""
+    writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        # connecting is part of the latency when the server does not keep alive
+        start = time.perf_counter()
+        fresh = writer is None
+        if fresh:
+            reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        path = paths[i % len(paths)]
+        request = f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n{headers}\r\n"
+        try:
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # a kept connection the server closed is reopened and the
+            # request sent again; only a fresh connection failing is an error
+            if fresh:
+                statuses["error"] += 1
+                i += 1
+            writer.close()
+            writer = None
+            continue
+        timings.append(time.perf_counter() - start)
+        statuses[str(status)] += 1
+        i += 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, paths, headers, concurrency, duration):
+    """Load url's paths with concurrency clients and return the results."""
+    timings = []
+    statuses = Counter()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(
+        *[
+            client(url, paths, headers, deadline, timings, statuses)
+            for _ in range(concurrency)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+
+    timings.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "requests_per_sec": round(len(timings) / elapsed, 1),
+        "statuses": dict(statuses),
+        "mean_ms": round(sum(timings) / len(timings) * 1e3, 2) if timings else 0.0,
+        "p50_ms": round(percentile(timings, 50) * 1e3, 2),
+        "p95_ms": round(percentile(timings, 95) * 1e3, 2),
+        "p99_ms": round(percentile(timings, 99) * 1e3, 2),
+    }
+
+
+class Command(BaseCommand):
+    """Load test a running server and print the results as JSON."""
+
+    help = "Send concurrent GET requests to a running server and report latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url", help="Base URL of the server, e.g. the proxy at http://proxy:8000"
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request, repeatable (default: the hot read endpoints).",
+        )
+        parser.add_argument("--token", help="API token sent with every request.")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("Expected a plain http:// URL.")
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        headers = "Accept: application/json\r\n"
+        if options["token"]:
+            headers += f"Authorization: Token {options['token']}\r\n"
+        paths = options["paths"] or DEFAULT_PATHS
+
+        results = asyncio.run(
+            run(url, paths, headers, options["concurrency"], options["duration"])
+        )
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,42 @@
+"""
+Django command to process queued recipe images.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipe.tasks import process_pending
+
+
+class Command(BaseCommand):
+    """Worker that builds recipe image variants from the job queue."""
+
+    help = "Process queued recipe images (runs until stopped unless --once)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs queued right now and exit.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        while True:
+            # honour CONN_MAX_AGE and health checks like a request would
+            close_old_connections()
+            processed = process_pending()
+            if processed:
+                self.stdout.write(f"Processed {processed} image job(s)")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["poll_interval"])
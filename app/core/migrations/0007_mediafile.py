@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    """Create reference counts for images uploaded before counting began."""
+    Recipe = apps.get_model("core", "Recipe")
+    MediaFile = apps.get_model("core", "MediaFile")
+    counts = (
+        Recipe.objects.exclude(image="")
+        .values("image")
+        .annotate(refs=Count("id"))
+        .order_by()
+    )
+    MediaFile.objects.bulk_create(
+        MediaFile(name=row["image"], ref_count=row["refs"]) for row in counts.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_recipe_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["ref_count", "updated_at"],
+                        name="core_mediaf_ref_cou_891c7b_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:00
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge tags and ingredients a user has more than once by name.
+
+    The oldest row is kept and recipes linked to the others are moved to it,
+    so the unique constraints added in the next migration can be created.
+    """
+    Recipe = apps.get_model("core", "Recipe")
+    for model_name, relation in (("Tag", "tags"), ("Ingredient", "ingredients")):
+        model = apps.get_model("core", model_name)
+        through = getattr(Recipe, relation).through
+        column = model_name.lower()
+
+        duplicates = (
+            model.objects.values("user_id", "name")
+            .annotate(keep=Min("id"), rows=Count("id"))
+            .filter(rows__gt=1)
+            .order_by()
+        )
+        for duplicate in list(duplicates):
+            keep = duplicate["keep"]
+            extra_ids = list(
+                model.objects.filter(
+                    user_id=duplicate["user_id"], name=duplicate["name"]
+                )
+                .exclude(id=keep)
+                .values_list("id", flat=True)
+            )
+            for extra_id in extra_ids:
+                # a recipe linked to both only keeps its link to the survivor
+                linked = through.objects.filter(**{column: keep}).values("recipe")
+                through.objects.filter(
+                    **{column: extra_id, "recipe__in": linked}
+                ).delete()
+                through.objects.filter(**{column: extra_id}).update(**{column: keep})
+            model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_mediafile"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:22
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The document is rebuilt in the database whenever one of its sources
+# changes, so every writer (ORM, bulk SQL, admin) keeps it current.
+# Only the recipe insert trigger creates documents; the others update them,
+# so deleting a recipe (links first, then the row) never re-creates one.
+# Existing recipes are filled in by `manage.py backfill_search`, which
+# scripts/run.sh runs after every migrate.
+CREATE_TRIGGERS = """
+CREATE FUNCTION core_recipe_search_vector(recipe_id bigint) RETURNS tsvector
+LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('english', recipe.title), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(tag.name, ' ')
+            FROM core_recipe_tags link
+            JOIN core_tag tag ON tag.id = link.tag_id
+            WHERE link.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM core_recipe_ingredients link
+            JOIN core_ingredient ingredient ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('english', recipe.description), 'C')
+    FROM core_recipe recipe
+    WHERE recipe.id = $1
+$$;
+
+CREATE FUNCTION core_refresh_recipe_search(recipe_ids bigint[]) RETURNS void
+LANGUAGE sql AS $$
+    UPDATE core_recipesearchdocument
+    SET vector = core_recipe_search_vector(recipe_id)
+    WHERE recipe_id = ANY($1)
+$$;
+
+CREATE FUNCTION core_recipe_search_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO core_recipesearchdocument (recipe_id, vector)
+    SELECT id, core_recipe_search_vector(id) FROM new_recipes
+    ON CONFLICT (recipe_id) DO UPDATE SET vector = EXCLUDED.vector;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION core_recipe_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_refresh_recipe_search(ARRAY[NEW.id]);
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION core_recipe_search_links() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_refresh_recipe_search(
+        ARRAY(SELECT DISTINCT recipe_id FROM changed_links)
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- TG_ARGV: the link table and its column pointing at the renamed row
+CREATE FUNCTION core_recipe_search_rename() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    recipe_ids bigint[];
+BEGIN
+    EXECUTE format(
+        'SELECT array_agg(recipe_id) FROM %I WHERE %I = $1',
+        TG_ARGV[0], TG_ARGV[1]
+    ) INTO recipe_ids USING NEW.id;
+    PERFORM core_refresh_recipe_search(recipe_ids);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER recipe_search_insert
+AFTER INSERT ON core_recipe
+REFERENCING NEW TABLE AS new_recipes
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_insert();
+
+CREATE TRIGGER recipe_search_update
+AFTER UPDATE OF title, description ON core_recipe
+FOR EACH ROW
+WHEN (OLD.title IS DISTINCT FROM NEW.title
+      OR OLD.description IS DISTINCT FROM NEW.description)
+EXECUTE FUNCTION core_recipe_search_update();
+
+CREATE TRIGGER recipe_search_tags_added
+AFTER INSERT ON core_recipe_tags
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+
+CREATE TRIGGER recipe_search_tags_removed
+AFTER DELETE ON core_recipe_tags
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+
+CREATE TRIGGER recipe_search_ingredients_added
+AFTER INSERT ON core_recipe_ingredients
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+
+CREATE TRIGGER recipe_search_ingredients_removed
+AFTER DELETE ON core_recipe_ingredients
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+
+CREATE TRIGGER recipe_search_tag_renamed
+AFTER UPDATE OF name ON core_tag
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_recipe_search_rename('core_recipe_tags', 'tag_id');
+
+CREATE TRIGGER recipe_search_ingredient_renamed
+AFTER UPDATE OF name ON core_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_recipe_search_rename('core_recipe_ingredients', 'ingredient_id');
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER recipe_search_insert ON core_recipe;
+DROP TRIGGER recipe_search_update ON core_recipe;
+DROP TRIGGER recipe_search_tags_added ON core_recipe_tags;
+DROP TRIGGER recipe_search_tags_removed ON core_recipe_tags;
+DROP TRIGGER recipe_search_ingredients_added ON core_recipe_ingredients;
+DROP TRIGGER recipe_search_ingredients_removed ON core_recipe_ingredients;
+DROP TRIGGER recipe_search_tag_renamed ON core_tag;
+DROP TRIGGER recipe_search_ingredient_renamed ON core_ingredient;
+DROP FUNCTION core_recipe_search_rename();
+DROP FUNCTION core_recipe_search_links();
+DROP FUNCTION core_recipe_search_update();
+DROP FUNCTION core_recipe_search_insert();
+DROP FUNCTION core_refresh_recipe_search(bigint[]);
+DROP FUNCTION core_recipe_search_vector(bigint);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_recipe_attr_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSearchDocument",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="core.recipe",
+                    ),
+                ),
+                ("vector", django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["vector"], name="recipe_search_vector_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
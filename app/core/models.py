@@ -6,23 +6,43 @@ import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core.storage import content_addressed_path, content_hash
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image."""
     ext = os.path.splitext(filename)[1]
+    if settings.RECIPE_IMAGE_STORAGE_MODE == "content":
+        # identical uploads map to the same file, so it is stored once
+        digest = content_hash(instance.image.file)
+        return content_addressed_path(digest, ext.lower())
+
     filename = f"{uuid.uuid4()}{ext}"
 
     # to generate file path for dynamic operating system
     return os.path.join("uploads", "recipe", filename)
 
 
+IMAGE_STATUS_PENDING = "pending"
+IMAGE_STATUS_READY = "ready"
+IMAGE_STATUS_FAILED = "failed"
+IMAGE_STATUS_CHOICES = [
+    (IMAGE_STATUS_PENDING, "Pending"),
+    (IMAGE_STATUS_READY, "Ready"),
+    (IMAGE_STATUS_FAILED, "Failed"),
+]
+
+
 # models.py
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -65,6 +85,8 @@ class Recipe(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # lookups by user are served by the (user, -id) index
+        db_index=False,
     )
     title = models.CharField(max_length=255)
     # textfield can have multiple lines of text
@@ -75,11 +97,50 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # resized copies of image, filled in by the image processing worker
+    image_status = models.CharField(
+        max_length=20,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True,
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # also bumped when tags or ingredients are linked, unlinked or renamed
+    # (see recipe/signals.py); the list and detail ETags are built from it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the recipe list: WHERE user_id = ? ORDER BY id DESC
+            models.Index(fields=["user", "-id"], name="recipe_user_id_desc_idx"),
+            # max(updated_at) and count(*) per user, from the index alone
+            models.Index(fields=["user", "updated_at"], name="recipe_user_updated_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class RecipeSearchDocument(models.Model):
+    """Full-text search vector of a recipe.
+
+    Kept out of the recipe table so list queries never read it, and
+    maintained by database triggers (see migration 0010) from the title,
+    description, tag names and ingredient names.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    vector = SearchVectorField(null=True)
+
+    class Meta:
+        indexes = [GinIndex(fields=["vector"], name="recipe_search_vector_idx")]
+
+
 class Tag(models.Model):
     """Tag for flitering recipes."""
 
@@ -87,7 +148,19 @@ class Tag(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # lookups by user are served by the (user, name) unique index
+        db_index=False,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # one tag per name and user; the index behind it also serves
+        # the list (ordered by name) and the lookups by name
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_tag_user_name"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -100,7 +173,96 @@ class Ingredient(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # lookups by user are served by the (user, name) unique index
+        db_index=False,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # one ingredient per name and user; the index behind it also serves
+        # the list (ordered by name) and the lookups by name
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_ingredient_user_name"
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ImageProcessingJob(models.Model):
+    """Queued request to build the image variants of a recipe."""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="image_jobs",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"Image job {self.id} for recipe {self.recipe_id}"
+
+
+class MediaFileManager(models.Manager):
+    """Manager to keep media file reference counts."""
+
+    def add_reference(self, name):
+        """Record one more reference to the file called name."""
+        now = timezone.now()
+        increment = {"ref_count": models.F("ref_count") + 1, "updated_at": now}
+        with transaction.atomic():
+            if self.filter(name=name).update(**increment):
+                return
+            _, created = self.get_or_create(name=name, defaults={"ref_count": 1})
+            if not created:
+                # another request created the row in the meantime
+                self.filter(name=name).update(**increment)
+
+    def remove_reference(self, name):
+        """Record that one reference to the file called name is gone."""
+        self.filter(name=name, ref_count__gt=0).update(
+            ref_count=models.F("ref_count") - 1,
+            updated_at=timezone.now(),
+        )
+
+
+class MediaFile(models.Model):
+    """Reference count of a stored media file.
+
+    Content-addressed files can be shared by many recipes; gc_media removes
+    a file once nothing refers to it any more.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MediaFileManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["ref_count", "updated_at"])]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
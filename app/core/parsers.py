@@ -0,0 +1,26 @@
+"""
+JSON parsing with orjson.
+"""
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser reading with orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as JSON and return the data."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            # orjson reads UTF-8 bytes or str
+            if encoding.lower().replace("-", "") != "utf8":
+                content = content.decode(encoding)
+            # like the strict JSONParser, NaN and Infinity are refused
+            return orjson.loads(content)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
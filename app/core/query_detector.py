@@ -0,0 +1,330 @@
+"""
+Find the repeated (N+1) and slow SQL queries of a request.
+
+The queries a request runs are grouped by shape: the SQL with its
+parameters and literals blanked out and IN lists and VALUES rows collapsed,
+so the same query for another ID has the same shape. A shape run
+REPEAT_THRESHOLD times or more in one request is reported as repeated, which
+is usually a query per row in a loop (N+1); a query taking SLOW_MS or longer
+is reported as slow. Each report names the code the queries come from: the
+serializer field, or the method of a serializer, a view or the app's own
+code that ran them, and the line they were run from.
+
+Finding that code walks the stack of every query, so in production only a
+SAMPLE_RATE share of the requests is recorded, and their offenders are
+logged as warnings. Tests with QueryBudgetMixin record every request and
+fail on one that runs more queries, or one query shape more often, than
+the test class allows; they do not check times, which vary between hosts.
+
+Like core.instrumentation, the recorder follows the request in a context
+variable into the threads the ASGI handler and the async views use. The
+queries a streamed body runs after the view has returned are not checked.
+"""
+
+import logging
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.deprecation import MiddlewareMixin
+from django.views import View
+from rest_framework import serializers
+
+from core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SAMPLE_RATE": 0.0,
+    "REPEAT_THRESHOLD": 10,
+    "SLOW_MS": 100,
+}
+
+# queries per request, and runs of one query shape, a test allows by default
+TEST_QUERY_BUDGET = 10
+TEST_REPEAT_LIMIT = 2
+
+_recorder = ContextVar("query_recorder", default=None)
+# (queries, runs of one shape) allowed per request under a test budget
+_budget = ContextVar("query_budget", default=None)
+
+_SAVEPOINT_NAMES = re.compile(r'(SAVEPOINT) "[^"]*"')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+# savepoints repeat around every write in a transaction by design
+_TRANSACTION = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+_APP_DIR = str(settings.BASE_DIR) + "/"
+# frames of these files are the detector's, not the code being checked
+_SKIPPED = {__file__, instrumentation.__file__}
+
+
+def get_options():
+    """Return the QUERY_DETECTOR settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, "QUERY_DETECTOR", {})}
+
+
+def shape(sql):
+    """Return sql with its values blanked out, to group queries by."""
+    sql = _LITERALS.sub("?", _SAVEPOINT_NAMES.sub(r"\1 ?", sql))
+    sql = _ROWS.sub("(...)", _LISTS.sub("(...)", sql))
+    return _SPACES.sub(" ", sql).strip()
+
+
+def _owner(frame):
+    """Return the serializer field, view method or app method a frame runs."""
+    code = frame.f_code
+    if not code.co_argcount or code.co_varnames[0] != "self":
+        return None
+    obj = frame.f_locals.get("self")
+    # type(), as isinstance() would evaluate a lazy object such as
+    # request.user, running queries from in here
+    cls = type(obj)
+    if issubclass(cls, serializers.Field):
+        # a field, or a serializer nested as one, is named after it
+        parent = getattr(obj, "parent", None)
+        if parent is not None and getattr(obj, "field_name", None):
+            return f"{type(parent).__name__}.{obj.field_name}"
+    if issubclass(cls, serializers.ListSerializer):
+        # its child serializer, or the view, is more telling
+        return None
+    if issubclass(cls, (serializers.Field, View)):
+        return f"{cls.__name__}.{code.co_name}"
+    # the app's own methods, not e.g. Model.save() run for one of its models
+    if code.co_filename.startswith(_APP_DIR):
+        return f"{cls.__name__}.{code.co_name}"
+    return None
+
+
+def _line(frame):
+    """Return where a frame is, relative to the app or the installed packages."""
+    path = frame.f_code.co_filename
+    if path.startswith(_APP_DIR):
+        path = path.removeprefix(_APP_DIR)
+    else:
+        path = path.rpartition("site-packages/")[2]
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def origin(frame):
+    """Return the code that ran a query and the line it ran it from.
+
+    The line is the innermost of the app's own code inside that code, or
+    that code's own line, e.g. in DRF, if the app's is not on the way.
+    """
+    location = None
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path not in _SKIPPED:
+            if location is None and path.startswith(_APP_DIR):
+                location = _line(frame)
+            owner = _owner(frame)
+            if owner is not None:
+                return owner, location or _line(frame)
+        frame = frame.f_back
+    return "?", location or "?"
+
+
+class QueryRecorder:
+    """The queries one request ran, with their times and origins."""
+
+    def __init__(self):
+        # (sql, seconds, owner, location)
+        self.queries = []
+
+    def offenders(self, repeat_threshold, slow_seconds=None):
+        """Return the repeated query shapes and the slow queries.
+
+        Each is a dict of the kind ("repeated" or "slow"), the shape, how
+        often it ran and for how long in all, and where it came from.
+        """
+        groups = {}
+        found = []
+        for sql, seconds, owner, location in self.queries:
+            source = f"{owner} ({location})"
+            key = shape(sql)
+            if slow_seconds is not None and seconds >= slow_seconds:
+                found.append(
+                    {
+                        "kind": "slow",
+                        "shape": key,
+                        "count": 1,
+                        "seconds": seconds,
+                        "source": source,
+                    }
+                )
+            if key.startswith(_TRANSACTION):
+                continue
+            group = groups.setdefault(key, {"count": 0, "seconds": 0.0, "sources": {}})
+            group["count"] += 1
+            group["seconds"] += seconds
+            group["sources"][source] = group["sources"].get(source, 0) + 1
+
+        for key, group in groups.items():
+            if group["count"] >= repeat_threshold:
+                sources = group["sources"]
+                found.append(
+                    {
+                        "kind": "repeated",
+                        "shape": key,
+                        "count": group["count"],
+                        "seconds": group["seconds"],
+                        "source": max(sources, key=sources.get),
+                    }
+                )
+        return found
+
+    def summary(self):
+        """Return every query shape with its count and origin, one per line."""
+        counts = {}
+        for sql, seconds, owner, location in self.queries:
+            key = (shape(sql), f"{owner} ({location})")
+            counts[key] = counts.get(key, 0) + 1
+        return "\n".join(
+            f"  {count} x {key} from {source}"
+            for (key, source), count in counts.items()
+        )
+
+
+def describe(offenders):
+    """Return offenders as readable lines."""
+    return "\n".join(
+        f"  {o['kind']}: {o['count']} x {o['shape']} "
+        f"({o['seconds'] * 1e3:.1f} ms) from {o['source']}"
+        for o in offenders
+    )
+
+
+def _record_queries(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        owner, location = origin(sys._getframe(1))
+        recorder.queries.append((sql, seconds, owner, location))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Record the queries of checked requests on every new connection."""
+    if _record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_queries)
+
+
+@contextmanager
+def recording():
+    """Record the queries run in the block and yield their QueryRecorder."""
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request in a test ran more queries than the test allows."""
+
+
+@contextmanager
+def query_budget(queries=TEST_QUERY_BUDGET, repeats=TEST_REPEAT_LIMIT):
+    """Fail requests in the block that run too many or repeated queries."""
+    token = _budget.set((queries, repeats))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+class QueryBudgetMixin:
+    """Fail a test whose requests run too many queries or repeat one.
+
+    A request may run query_budget queries, and the same query shape at most
+    repeated_query_limit times; query_budget() changes that for a block.
+    """
+
+    query_budget = TEST_QUERY_BUDGET
+    repeated_query_limit = TEST_REPEAT_LIMIT
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._query_budget = _budget.set((cls.query_budget, cls.repeated_query_limit))
+
+    @classmethod
+    def tearDownClass(cls):
+        _budget.reset(cls._query_budget)
+        super().tearDownClass()
+
+
+class QueryDetectorMiddleware(MiddlewareMixin):
+    """Log the repeated and slow queries of sampled requests."""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        budget = _budget.get()
+        options = get_options()
+        if budget is None and not instrumentation.sampled(options):
+            return self.get_response(request)
+
+        with recording() as recorder:
+            response = self.get_response(request)
+        self._check(request, recorder, budget, options)
+        return response
+
+    async def __acall__(self, request):
+        # the view's sync code runs in threads that copy this context
+        budget = _budget.get()
+        options = get_options()
+        if budget is None and not instrumentation.sampled(options):
+            return await self.get_response(request)
+
+        with recording() as recorder:
+            response = await self.get_response(request)
+        self._check(request, recorder, budget, options)
+        return response
+
+    def _check(self, request, recorder, budget, options):
+        view, action = instrumentation.route(request)
+        name = f"{request.method} {request.path} ({view} {action})"
+        if budget is not None:
+            queries, repeats = budget
+            problems = []
+            if len(recorder.queries) > queries:
+                problems.append(
+                    f"ran {len(recorder.queries)} queries, {queries} allowed"
+                )
+            found = recorder.offenders(repeats + 1)
+            if found:
+                most = max(o["count"] for o in found)
+                problems.append(f"ran a query {most} times, {repeats} allowed")
+            if problems:
+                raise QueryBudgetExceeded(
+                    f"{name} {' and '.join(problems)}:\n{recorder.summary()}"
+                )
+            return
+
+        found = recorder.offenders(
+            options["REPEAT_THRESHOLD"], options["SLOW_MS"] / 1e3
+        )
+        if found:
+            logger.warning(
+                "%s ran %d queries:\n%s",
+                name,
+                len(recorder.queries),
+                describe(found),
+            )
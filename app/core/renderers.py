@@ -0,0 +1,48 @@
+"""
+JSON rendering with orjson.
+
+orjson writes the dicts, lists, strings and numbers of a response several
+times faster than json.dumps. Every other type is handed to DRF's
+JSONEncoder, so dates, times, Decimals, UUIDs and lazy strings come out
+exactly as JSONRenderer writes them. DecimalField already renders
+Recipe.price as a string, so a Decimal only reaches the encoder when a
+view returns one unserialized.
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# datetimes go to JSONEncoder, which cuts them to milliseconds and writes
+# UTC as Z; orjson would keep the microseconds
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME
+
+_default = JSONEncoder().default
+
+
+def dumps(data):
+    """Return data as compact UTF-8 JSON, byte for byte like JSONRenderer."""
+    content = orjson.dumps(data, default=_default, option=OPTIONS)
+    # escaped by JSONRenderer so the output can be embedded in JavaScript
+    return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer writing with orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring."""
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or not self.compact or self.ensure_ascii:
+            # layouts orjson cannot write
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return dumps(data)
+        except orjson.JSONEncodeError:
+            # non-string keys or integers beyond 64 bits, which json.dumps
+            # writes; a type neither knows fails there as well
+            return super().render(data, accepted_media_type, renderer_context)
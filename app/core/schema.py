@@ -0,0 +1,161 @@
+"""
+Precomputed OpenAPI schema for the API docs.
+
+Generating the schema introspects every viewset and serializer, so it is
+built once per code version (by the build_schema command or on the first
+request), written to OPENAPI_SCHEMA_DIR and then served from memory.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+from core.version import code_version
+
+# format -> renderer used to serialize the schema document
+RENDERERS = {
+    "yaml": OpenApiYamlRenderer,
+    "json": OpenApiJsonRenderer,
+}
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+class SchemaDocument:
+    """One rendered schema, with its gzipped body and ETag precomputed."""
+
+    def __init__(self, content):
+        self.content = content
+        # mtime=0 keeps the compressed bytes identical between builds
+        self.gzipped = gzip.compress(content, mtime=0)
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def schema_path(schema_format, version):
+    """Return the file the schema for version is stored in."""
+    return os.path.join(
+        settings.OPENAPI_SCHEMA_DIR, f"openapi-{version}.{schema_format}"
+    )
+
+
+def generate_schema():
+    """Introspect the API and return the OpenAPI schema as a dict."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema(schema):
+    """Return format -> bytes for every served format of schema."""
+    return {
+        schema_format: renderer().render(schema)
+        for schema_format, renderer in RENDERERS.items()
+    }
+
+
+def write_schema(rendered, version):
+    """Write the rendered schema to disk and return the paths written."""
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    paths = []
+    for schema_format, content in rendered.items():
+        path = schema_path(schema_format, version)
+        # write then rename so other workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=settings.OPENAPI_SCHEMA_DIR)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def build_schema():
+    """Generate the schema for the running code and write it to disk."""
+    version = code_version()
+    return write_schema(render_schema(generate_schema()), version)
+
+
+def _load(version):
+    """Return format -> bytes from disk, or None if a format is missing."""
+    rendered = {}
+    for schema_format in RENDERERS:
+        try:
+            with open(schema_path(schema_format, version), "rb") as schema_file:
+                rendered[schema_format] = schema_file.read()
+        except OSError:
+            return None
+    return rendered
+
+
+def get_schema_document(schema_format):
+    """Return the SchemaDocument for the running code in schema_format."""
+    version = code_version()
+    document = _documents.get((version, schema_format))
+    if document is not None:
+        return document
+
+    with _lock:
+        document = _documents.get((version, schema_format))
+        if document is not None:
+            return document
+
+        rendered = _load(version)
+        if rendered is None:
+            rendered = render_schema(generate_schema())
+            try:
+                write_schema(rendered, version)
+            except OSError:
+                # a read-only disk only costs a rebuild in the next process
+                pass
+        for fmt, content in rendered.items():
+            _documents[(version, fmt)] = SchemaDocument(content)
+        return _documents[(version, schema_format)]
+
+
+def reset_schema_cache():
+    """Forget the schema documents held in memory."""
+    _documents.clear()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """Serve the precomputed schema with ETag and gzip support."""
+
+    def _get_schema_response(self, request):
+        # translated or versioned schemas are rare, generate those per request
+        per_request = request.GET.get("lang") or request.GET.get("version")
+        if per_request or not settings.OPENAPI_SCHEMA_CACHE:
+            return super()._get_schema_response(request)
+
+        renderer = request.accepted_renderer
+        document = get_schema_document(renderer.format)
+
+        content, etag = document.content, document.etag
+        use_gzip = re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if use_gzip:
+            content, etag = document.gzipped, f'"{etag[1:-1]}-gzip"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type = f"{content_type}; charset={renderer.charset}"
+            response = HttpResponse(content, content_type=content_type)
+            if use_gzip:
+                response["Content-Encoding"] = "gzip"
+            filename = self._get_filename(request, None)
+            response["Content-Disposition"] = f'inline; filename="{filename}"'
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
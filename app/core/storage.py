@@ -0,0 +1,54 @@
+"""
+Content-addressed file storage for uploaded media.
+"""
+
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# files under this prefix are named after the sha256 of their content
+CONTENT_ADDRESSED_PREFIX = os.path.join("uploads", "recipe", "sha256")
+
+
+def content_hash(file):
+    """Return the sha256 hex digest of file, reusing one computed on upload."""
+    digest = getattr(file, "sha256", None)
+    if digest:
+        return digest
+
+    if not hasattr(file, "chunks"):
+        file = File(file)
+    sha256 = hashlib.sha256()
+    # chunks() rewinds the file before reading it
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def content_addressed_path(digest, ext):
+    """Return the storage path for content with the given digest."""
+    return os.path.join(CONTENT_ADDRESSED_PREFIX, digest[:2], f"{digest}{ext}")
+
+
+def is_content_addressed(name):
+    """Return True if name was generated by content_addressed_path."""
+    return name.startswith(CONTENT_ADDRESSED_PREFIX + os.sep)
+
+
+class MediaStorage(FileSystemStorage):
+    """File system storage that stores identical content only once.
+
+    Saving to a content-addressed name that already exists reuses the
+    existing file instead of writing a copy with a random suffix.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name and is_content_addressed(name) and self.exists(name):
+            # refresh the modification time so gc_media's grace period
+            # protects a file that was just reused
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
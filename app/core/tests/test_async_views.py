@@ -0,0 +1,206 @@
+"""Tests for the async views served under ASGI."""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import include, path, resolve
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.urls import ahealth
+from core.models import Ingredient, Recipe, Tag
+from recipe.urls import router
+from user.authentication import reset_token_cache
+from user.views import ManageUserView
+
+# the app's routes as app/asgi.py builds them
+with override_settings(ASYNC_VIEWS=True):
+    urlpatterns = [
+        path("api/health/", ahealth),
+        path("api/user/me/", ManageUserView.as_view()),
+        path("api/recipe/", include(router.get_urls())),
+    ]
+
+RECIPES_URL = "/api/recipe/recipes/"
+TAGS_URL = "/api/recipe/tags/"
+INGREDIENTS_URL = "/api/recipe/ingredients/"
+EXPORT_URL = "/api/recipe/recipes/export/"
+ME_URL = "/api/user/me/"
+HEALTH_URL = "/api/health/"
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return f"{RECIPES_URL}{recipe_id}/"
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(TestCase):
+    """Test the hot read endpoints answer from async views."""
+
+    def setUp(self):
+        reset_token_cache()
+        caches["responses"].clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123", name="Cook"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = f"Token {self.token.key}"
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+        self.vegan = vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        self.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"Dal {i}", time_minutes=5, price="4.10"
+            )
+            recipe.tags.add(vegan, *([quick] if i else []))
+            recipe.ingredients.add(salt)
+            self.recipes.append(recipe)
+
+    def tearDown(self):
+        reset_token_cache()
+
+    def _async(self, method, url, data=None, token=True, **headers):
+        """Send a request through the ASGI handler and return the response."""
+        if token:
+            headers["Authorization"] = self.auth
+        # client-wide headers are dropped by this Django's AsyncClient
+        send = getattr(AsyncClient(), method)
+        kwargs = {"content_type": "application/json"} if data is not None else {}
+        if data is not None:
+            kwargs["data"] = data
+        return async_to_sync(send)(url, headers=headers, **kwargs)
+
+    def test_async_callbacks(self):
+        """Test the GET routes with an async handler are async views."""
+        urls = [HEALTH_URL, ME_URL, RECIPES_URL, TAGS_URL, INGREDIENTS_URL, EXPORT_URL]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+        self.assertTrue(
+            asyncio.iscoroutinefunction(resolve(detail_url(1)).func),
+        )
+        # no async twin: the route keeps its sync view
+        self.assertFalse(
+            asyncio.iscoroutinefunction(resolve(f"{RECIPES_URL}search/").func)
+        )
+
+    def test_sync_by_default(self):
+        """Test the app's own routes stay sync when ASYNC_VIEWS is off."""
+        with self.settings(ROOT_URLCONF="app.urls"):
+            self.assertFalse(asyncio.iscoroutinefunction(resolve(RECIPES_URL).func))
+            self.assertFalse(asyncio.iscoroutinefunction(resolve(ME_URL).func))
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_same_response(self):
+        """Test every async view answers exactly like its sync view."""
+        urls = [
+            RECIPES_URL,
+            f"{RECIPES_URL}?fields=id,title&expand=tags",
+            f"{RECIPES_URL}?tags={self.vegan.id}&tags_mode=all",
+            detail_url(self.recipes[0].id),
+            TAGS_URL,
+            f"{TAGS_URL}?assigned_only=1",
+            f"{INGREDIENTS_URL}?q=sa",
+            ME_URL,
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with self.settings(ROOT_URLCONF="app.urls"):
+                    expected = self.client.get(url)
+
+                res = self._async("get", url)
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res.content, expected.content)
+                self.assertEqual(res.get("ETag"), expected.get("ETag"))
+                self.assertEqual(res["Allow"], expected["Allow"])
+
+    def test_not_modified(self):
+        """Test a current copy of the list or a recipe gets a 304."""
+        for url in [RECIPES_URL, detail_url(self.recipes[0].id)]:
+            with self.subTest(url=url):
+                etag = self._async("get", url)["ETag"]
+
+                res = self._async("get", url, **{"If-None-Match": etag})
+
+                self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cache_hit_with_validator_query_only(self):
+        """Test a repeated list is answered from the caches after its ETag."""
+        first = self._async("get", TAGS_URL)
+
+        with self.assertNumQueries(1):
+            second = self._async("get", TAGS_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+
+    def test_authentication_required(self):
+        """Test a missing or unknown token is refused as by the sync views."""
+        for headers in [{}, {"Authorization": "Token bad"}]:
+            with self.subTest(headers=headers):
+                res = self._async("get", RECIPES_URL, token=False, **headers)
+
+                self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+                self.assertEqual(res["WWW-Authenticate"], "Token")
+
+    def test_other_users_recipe(self):
+        """Test another user's recipe is not found."""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="testpass123"
+        )
+        recipe = Recipe.objects.create(
+            user=other, title="Soup", time_minutes=5, price=1
+        )
+
+        res = self._async("get", detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch("recipe.transfer.EXPORT_CHUNK_SIZE", 2)
+    def test_export_streamed_async(self):
+        """Test the export is an async body, sent a chunk of recipes at a time."""
+        with self.settings(ROOT_URLCONF="app.urls"):
+            expected = b"".join(self.client.get(EXPORT_URL).streaming_content)
+
+        res = self._async("get", EXPORT_URL)
+
+        async def read(res):
+            return [chunk async for chunk in res.streaming_content]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.is_async)
+        chunks = async_to_sync(read)(res)
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 1])
+        self.assertEqual(b"".join(chunks), expected)
+
+    def test_writes_use_sync_views(self):
+        """Test other methods on an async route still reach their handlers."""
+        payload = {"title": "Stew", "time_minutes": 20, "price": "2.50"}
+
+        created = self._async("post", RECIPES_URL, payload)
+        updated = self._async("patch", ME_URL, {"name": "Chef"})
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.filter(title="Stew").exists())
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(updated.content)["name"], "Chef")
+
+    def test_health(self):
+        """Test the health check answers from its async view."""
+        res = self._async("get", HEALTH_URL, token=False)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content)["status"], "ok")
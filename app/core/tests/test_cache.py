@@ -0,0 +1,36 @@
+"""Tests for the in-process caches."""
+
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.cache import LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the bounded in-process cache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when full."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    @patch("core.cache.time.monotonic")
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are not returned after their TTL."""
+        patched_monotonic.return_value = 100
+        cache = LRUCache(max_size=2, ttl=10)
+        cache.set("a", 1)
+
+        patched_monotonic.return_value = 111
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
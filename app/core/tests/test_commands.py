@@ -3,6 +3,11 @@ Test custom Django management commands.
 
 """
 
+import json
+import os
+import tempfile
+from io import StringIO
+
 # path inorder to mock the behaviour of database
 from unittest.mock import patch
 
@@ -11,9 +16,15 @@ from psycopg2 import OperationalError as Psycopg2Error
 
 # call_command is a helper command that
 # allows to call the command that we are testing
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import _metrics, compare
 
 
 # to test the check method inside BaseCommand from wait_for_db.py
@@ -38,3 +49,127 @@ class CommandTests(SimpleTestCase):
         call_command("wait_for_db")
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    """Test the loadtest command against a running server."""
+
+    def test_loadtest(self):
+        """Test requests are sent with the token and their statuses counted."""
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        token = Token.objects.create(user=user)
+        out = StringIO()
+
+        call_command(
+            "loadtest",
+            self.live_server_url,
+            "--path=/api/health/",
+            "--path=/api/user/me/",
+            f"--token={token.key}",
+            "--concurrency=2",
+            "--duration=0.3",
+            stdout=out,
+        )
+
+        results = json.loads(out.getvalue())
+        self.assertGreater(results["requests"], 0)
+        self.assertEqual(results["statuses"], {"200": results["requests"]})
+        self.assertLessEqual(results["p50_ms"], results["p99_ms"])
+
+    def test_plain_http_only(self):
+        """Test other URLs are refused."""
+        with self.assertRaises(CommandError):
+            call_command("loadtest", "https://example.com")
+
+
+class CompareTests(SimpleTestCase):
+    """Test benchmark results are checked against a baseline."""
+
+    def test_regressions(self):
+        """Test only metrics worse than the threshold are reported."""
+        baseline = {
+            "list": {"p50_us": 100, "queries_per_request": 2, "bytes": 1000},
+            "render": {"mb_per_sec": 50.0, "rows": 10},
+        }
+        results = {
+            "list": {"p50_us": 119, "queries_per_request": 3, "bytes": 900},
+            "render": {"mb_per_sec": 30.0, "rows": 99},
+            "new": {"p50_us": 5},
+        }
+
+        regressions = compare(results, baseline, threshold=20)
+
+        self.assertEqual(
+            [(r["metric"], r["change_pct"]) for r in regressions],
+            [("list.queries_per_request", 50.0), ("render.mb_per_sec", -40.0)],
+        )
+
+    def test_from_zero(self):
+        """Test a query where there were none is a regression."""
+        regressions = compare({"queries_per_call": 1}, {"queries_per_call": 0}, 20)
+
+        self.assertEqual(regressions[0]["change_pct"], None)
+
+
+class BenchmarkBaselineTests(TestCase):
+    """Test the benchmark command saves and checks results."""
+
+    def setUp(self):
+        self.err = StringIO()
+
+    def _run(self, *args):
+        call_command(
+            "benchmark",
+            "token_auth",
+            "--iterations=2",
+            *args,
+            stdout=StringIO(),
+            stderr=self.err,
+        )
+
+    def test_output_and_baseline(self):
+        """Test results saved with --output pass as their own baseline."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            self._run(f"--output={path}")
+            with open(path) as f:
+                saved = json.load(f)
+            # queries are exact; the timings get a generous threshold
+            self._run(f"--baseline={path}", "--threshold=100000")
+
+        self.assertEqual(self.err.getvalue(), "")
+
+        self.assertEqual(saved["token_auth"]["cold"]["queries_per_call"], 1)
+
+    def test_regression_fails(self):
+        """Test a metric worse than the baseline fails the command."""
+        baseline = {"token_auth": {"cold": {"queries_per_call": 0.5}}}
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(baseline, f)
+            f.flush()
+
+            with self.assertRaisesMessage(CommandError, "1 metrics"):
+                self._run(f"--baseline={f.name}")
+
+        (regression,) = json.loads(self.err.getvalue())
+        self.assertEqual(regression["metric"], "token_auth.cold.queries_per_call")
+        self.assertEqual(regression["change_pct"], 100.0)
+
+    def test_committed_baseline(self):
+        """Test the committed baseline holds only the exact query counts."""
+        path = os.path.join(settings.BASE_DIR, "benchmark-baseline.json")
+        with open(path) as f:
+            baseline = json.load(f)
+
+        metrics = [metric for metric, _ in _metrics(baseline)]
+        self.assertIn("recipe_api.recipes_1000.list.queries_per_request", metrics)
+        self.assertIn("user_api.me.queries_per_request", metrics)
+        for metric in metrics:
+            self.assertTrue(metric.endswith(".queries_per_request"), metric)
+
+    def test_missing_baseline(self):
+        """Test an unreadable baseline is refused before running."""
+        with self.assertRaises(CommandError):
+            self._run("--baseline=/nonexistent/results.json")
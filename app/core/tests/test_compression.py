@@ -0,0 +1,131 @@
+"""Tests for the response compression middleware."""
+
+import gzip
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.compression import CompressionMiddleware, choose_encoding
+from core.models import Recipe
+
+RECIPES_URL = reverse("recipe:recipe-list")
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+class NegotiationTests(SimpleTestCase):
+    """Test picking a content coding from Accept-Encoding."""
+
+    def test_choose_encoding(self):
+        """Test q values, wildcards and refusals are honoured."""
+        cases = {
+            "gzip, deflate, br": "br",
+            "gzip": "gzip",
+            "br;q=0.5, gzip": "gzip",
+            "BR;Q=0.9, gzip;q=0.8": "br",
+            "*": "br",
+            "*;q=0.1, br;q=0": "gzip",
+            "gzip;q=0, br;q=0": None,
+            "identity": None,
+            "": None,
+        }
+        for header, coding in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(choose_encoding(header), coding)
+
+    def test_not_compressible(self):
+        """Test bodies that are compressed already are left alone."""
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = HttpResponse(b"x" * 5000, content_type="image/jpeg")
+
+        response = CompressionMiddleware(lambda request: response)(request)
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+@override_settings(RESPONSE_COMPRESSION={"MIN_SIZE": 500})
+class CompressionTests(TestCase):
+    """Test API responses are compressed as negotiated."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f"Recipe {i}", time_minutes=5, price=1)
+            for i in range(count)
+        )
+
+    def test_compressed_above_threshold(self):
+        """Test a large list is compressed with the preferred coding."""
+        self._create_recipes(20)
+        plain = self.client.get(RECIPES_URL)
+
+        for coding, decompress in [
+            ("br", brotli.decompress),
+            ("gzip", gzip.decompress),
+        ]:
+            with self.subTest(coding=coding):
+                res = self.client.get(
+                    RECIPES_URL, HTTP_ACCEPT_ENCODING=f"{coding}, identity"
+                )
+
+                self.assertEqual(res["Content-Encoding"], coding)
+                self.assertEqual(decompress(res.content), plain.content)
+                self.assertEqual(res["Content-Length"], str(len(res.content)))
+                self.assertIn("Accept-Encoding", res["Vary"])
+                self.assertEqual(res["ETag"], f"W/{plain['ETag']}")
+
+    def test_weak_etag_not_modified(self):
+        """Test the weak ETag of a compressed list still gets a 304."""
+        self._create_recipes(20)
+        etag = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING="br")["ETag"]
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_ACCEPT_ENCODING="br", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_small_not_compressed(self):
+        """Test responses under the threshold are sent as they are."""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING="br, gzip")
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertFalse(res.has_header("Vary"))
+
+    def test_not_accepted(self):
+        """Test clients that do not ask for compression get plain bodies."""
+        self._create_recipes(20)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    def test_streamed_export(self):
+        """Test the streamed export is compressed as it is produced."""
+        self._create_recipes(3)
+        plain = b"".join(self.client.get(EXPORT_URL).streaming_content)
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(res.streaming_content)), plain)
+
+    @override_settings(RESPONSE_COMPRESSION={"ENABLED": False})
+    def test_disabled(self):
+        """Test nothing is compressed when turned off."""
+        self._create_recipes(20)
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING="br")
+
+        self.assertFalse(res.has_header("Content-Encoding"))
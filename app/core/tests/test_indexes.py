@@ -0,0 +1,85 @@
+"""
+Tests that the per-user list and lookup queries are served by indexes.
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.explain import explain, indexes_used, node_types
+from core.models import Ingredient, Recipe, Tag
+
+USERS = 4
+RECIPES_PER_USER = 5000
+ATTRS_PER_USER = 2000
+PAGE = 101
+
+
+class IndexUsageTests(TestCase):
+    """Check the query plans on a seeded dataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"user{i}@example.com") for i in range(USERS)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f"Recipe {i}",
+                time_minutes=10,
+                price=Decimal("5.00"),
+            )
+            for user in users
+            for i in range(RECIPES_PER_USER)
+        )
+        for model in (Tag, Ingredient):
+            model.objects.bulk_create(
+                model(user=user, name=f"{model.__name__} {i}")
+                for user in users
+                for i in range(ATTRS_PER_USER)
+            )
+        # the planner needs statistics for the seeded rows
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_user, core_recipe, core_tag, core_ingredient")
+        cls.user = users[USERS // 2]
+
+    def assertUsesIndex(self, queryset, index_name):
+        """Assert the plan scans index_name and needs no separate sort."""
+        plan = explain(queryset)
+        self.assertIn(index_name, indexes_used(plan), plan)
+        self.assertNotIn("Sort", node_types(plan), plan)
+
+    def test_recipe_list(self):
+        """Test the first page of a user's recipes reads the (user, -id) index."""
+        queryset = Recipe.objects.filter(user=self.user).order_by("-id")[:PAGE]
+
+        self.assertUsesIndex(queryset, "recipe_user_id_desc_idx")
+
+    def test_recipe_list_next_page(self):
+        """Test following a cursor keeps using the (user, -id) index."""
+        last_id = Recipe.objects.filter(user=self.user).order_by("-id")[PAGE].id
+        queryset = Recipe.objects.filter(user=self.user, id__lt=last_id).order_by(
+            "-id"
+        )[:PAGE]
+
+        self.assertUsesIndex(queryset, "recipe_user_id_desc_idx")
+
+    def test_attr_lists(self):
+        """Test tags and ingredients are listed by name from the unique index."""
+        for model, index_name in (
+            (Tag, "unique_tag_user_name"),
+            (Ingredient, "unique_ingredient_user_name"),
+        ):
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.filter(user=self.user).order_by("-name")
+
+                self.assertUsesIndex(queryset[:PAGE], index_name)
+
+    def test_attr_lookup_by_name(self):
+        """Test the get-or-create lookup by (user, name) uses the unique index."""
+        queryset = Tag.objects.filter(user=self.user, name__in=["Tag 1", "Tag 2"])
+
+        self.assertIn("unique_tag_user_name", indexes_used(explain(queryset)))
@@ -0,0 +1,236 @@
+"""Tests for the request metrics middleware and the metrics endpoint."""
+
+import json
+import re
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.instrumentation import render_metrics, stats
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse("recipe:recipe-list")
+EXPORT_URL = reverse("recipe:recipe-export")
+METRICS_URL = reverse("metrics")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def timings(response):
+    """Return the Server-Timing header as name -> (duration, description)."""
+    parsed = {}
+    for metric in response["Server-Timing"].split(", "):
+        name, *params = metric.split(";")
+        params = dict(p.split("=", 1) for p in params)
+        parsed[name] = (float(params["dur"]), params.get("desc", "").strip('"'))
+    return parsed
+
+
+def totals(view, action):
+    """Return the recorded totals of a view and action by name."""
+    n = len(instrumentation.BUCKETS)
+    values = stats.snapshot()[1][(view, action)]
+    names = ["count", "seconds", "queries", "db_seconds", "serializer_seconds"]
+    return dict(zip(names + ["bytes"], values[n:]))
+
+
+@override_settings(
+    RESPONSE_CACHE={"ENABLED": False},
+    REQUEST_METRICS={"SERVER_TIMING": True},
+    METRICS_TOKEN="scrape-token",
+)
+class RequestMetricsTests(TestCase):
+    """Test sampled requests are measured and recorded by view."""
+
+    def setUp(self):
+        stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minutes=5, price="4.10"
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+    def tearDown(self):
+        stats.reset()
+
+    def test_server_timing(self):
+        """Test the header reports the request's queries and times."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(self.recipe.id))
+
+        parsed = timings(res)
+        self.assertEqual(parsed["db"][1], f"{len(queries)} queries")
+        self.assertGreater(parsed["serializer"][0], 0)
+        self.assertGreaterEqual(parsed["app"][0], parsed["db"][0])
+
+    def test_recorded_by_view_and_action(self):
+        """Test requests are added up per view and viewset action."""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        res = self.client.post(
+            RECIPES_URL,
+            {"title": "Stew", "time_minutes": 5, "price": "1.00"},
+            format="json",
+        )
+
+        listed = totals("recipe:recipe-list", "list")
+        self.assertEqual(listed["count"], 2)
+        self.assertGreater(listed["queries"], 0)
+        self.assertGreater(listed["serializer_seconds"], 0)
+        self.assertEqual(totals("recipe:recipe-list", "create")["count"], 1)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        requests = stats.snapshot()[0]
+        self.assertEqual(requests[("recipe:recipe-list", "create", 201)], 1)
+
+    def test_streamed_response(self):
+        """Test an export's bytes and queries are counted as it is sent."""
+        res = self.client.get(EXPORT_URL)
+        self.assertNotIn(("recipe:recipe-export", "export"), stats.snapshot()[1])
+
+        body = b"".join(res.streaming_content)
+
+        exported = totals("recipe:recipe-export", "export")
+        self.assertEqual(exported["bytes"], len(body))
+        self.assertGreater(exported["queries"], 0)
+
+    @override_settings(REQUEST_METRICS={"SAMPLE_RATE": 0.0, "SERVER_TIMING": True})
+    def test_not_sampled(self):
+        """Test requests are not measured with sampling turned off."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", res)
+        self.assertEqual(stats.snapshot(), ({}, {}))
+
+    @override_settings(REQUEST_METRICS={"SAMPLE_RATE": 0.5, "SERVER_TIMING": True})
+    def test_sample_rate(self):
+        """Test a share of the requests is measured."""
+        with patch("core.instrumentation.random.random", side_effect=[0.7, 0.3]):
+            skipped = self.client.get(RECIPES_URL)
+            sampled = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", skipped)
+        self.assertIn("Server-Timing", sampled)
+        self.assertEqual(totals("recipe:recipe-list", "list")["count"], 1)
+
+    @override_settings(REQUEST_METRICS={})
+    def test_server_timing_off_by_default(self):
+        """Test requests are recorded without the header unless it is on."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", res)
+        self.assertEqual(totals("recipe:recipe-list", "list")["count"], 1)
+
+    def test_metrics_endpoint(self):
+        """Test the totals are served in the Prometheus text format."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer scrape-token")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        content = res.content.decode()
+        labels = r'view="recipe:recipe-list",action="list"'
+        self.assertRegex(content, rf'requests_total\{{{labels},status="200",')
+        self.assertRegex(content, rf"request_duration_seconds_count\{{{labels},.*\}} 1")
+        self.assertRegex(content, rf'duration_seconds_bucket\{{{labels},.*le="\+Inf"')
+        self.assertRegex(content, r"recipe_app_response_cache_hits_total\{worker=")
+        for line in content.splitlines():
+            if not line.startswith("#"):
+                self.assertRegex(line, r"^[a-z_]+\{.*\} [0-9.e+-]+$")
+
+    def test_metrics_endpoint_needs_token(self):
+        """Test the totals are refused without the token, even to staff."""
+        self.user.is_staff = True
+        self.user.save()
+
+        for headers in [{}, {"HTTP_AUTHORIZATION": "Bearer wrong"}]:
+            with self.subTest(headers=headers):
+                res = self.client.get(METRICS_URL, **headers)
+                self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN=""):
+            res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(ROOT_URLCONF="core.tests.test_async_views")
+class AsyncRequestMetricsTests(TestCase):
+    """Test queries run from async views are counted."""
+
+    def test_async_view(self):
+        """Test the queries of an async list are counted."""
+        stats.reset()
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        token = Token.objects.create(user=user)
+        Recipe.objects.create(user=user, title="Dal", time_minutes=5, price=1)
+
+        with override_settings(
+            RESPONSE_CACHE={"ENABLED": False}, REQUEST_METRICS={"SERVER_TIMING": True}
+        ):
+            res = async_to_sync(AsyncClient().get)(
+                "/api/recipe/recipes/", headers={"Authorization": f"Token {token}"}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        queries = int(re.search(r'desc="(\d+) queries"', res["Server-Timing"])[1])
+        self.assertGreater(queries, 0)
+        # the test routes have no app namespace
+        self.assertEqual(totals("recipe-list", "list")["queries"], queries)
+        stats.reset()
+
+
+class RenderMetricsTests(SimpleTestCase):
+    """Test the Prometheus text rendering."""
+
+    def test_label_values_escaped(self):
+        """Test quotes, backslashes and newlines in label values are escaped."""
+        self.assertEqual(
+            instrumentation._labels(view='a"b\\c\nd'), '{view="a\\"b\\\\c\\nd"}'
+        )
+
+    def test_extra_counters(self):
+        """Test other counters of the worker are exported."""
+        content = render_metrics([("jobs_total", "Jobs run.", 3)])
+
+        self.assertIn("# TYPE recipe_app_jobs_total counter", content)
+        self.assertRegex(content, r'recipe_app_jobs_total\{worker="\d+"\} 3')
+
+
+class RequestMetricsBenchmarkTests(TestCase):
+    """Test the request_metrics benchmark scenario."""
+
+    def test_runs(self):
+        """Test the list is measured with the middleware off, unsampled and on."""
+        out = StringIO()
+
+        call_command(
+            "benchmark", "request_metrics", "--iterations=2", "--size=3", stdout=out
+        )
+
+        results = json.loads(out.getvalue())["request_metrics"]
+        self.assertEqual(results["recipes"], 3)
+        queries = results["no_middleware"]["queries_per_call"]
+        for case in ["not_sampled", "sampled"]:
+            self.assertEqual(results[case]["iterations"], 2)
+            self.assertEqual(results[case]["queries_per_call"], queries)
+        stats.reset()
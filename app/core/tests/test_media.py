@@ -0,0 +1,143 @@
+"""
+Tests for content-addressed media storage and garbage collection.
+"""
+
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import MediaFile, Recipe
+
+
+def image_upload(color=(10, 120, 200)):
+    """Return an uploaded JPEG whose content depends on color."""
+    buffer = BytesIO()
+    Image.new("RGB", (60, 40), color=color).save(buffer, format="JPEG")
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue())
+
+
+class MediaStorageTests(TestCase):
+    """Test deduplication and reference counting of recipe images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "password123",
+        )
+
+    def _recipe(self, **params):
+        defaults = {
+            "user": self.user,
+            "title": "Sample recipe",
+            "time_minutes": 10,
+            "price": Decimal("5.00"),
+        }
+        defaults.update(params)
+        return Recipe.objects.create(**defaults)
+
+    def _refs(self, name):
+        return MediaFile.objects.get(name=name).ref_count
+
+    def _gc(self, *args):
+        call_command("gc_media", "--grace-seconds=0", *args, stdout=StringIO())
+
+    def test_identical_images_stored_once(self):
+        """Test two recipes uploading the same image share one file."""
+        first = self._recipe(image=image_upload())
+        second = self._recipe(image=image_upload())
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith("uploads/recipe/sha256/"))
+        files = os.listdir(os.path.dirname(first.image.path))
+        self.assertEqual(len(files), 1)
+        self.assertEqual(self._refs(first.image.name), 2)
+
+    def test_replacing_image_moves_reference(self):
+        """Test changing a recipe image releases the previous file."""
+        recipe = self._recipe(image=image_upload())
+        old_name = recipe.image.name
+
+        recipe.image = image_upload(color=(0, 0, 0))
+        recipe.save()
+
+        self.assertEqual(self._refs(old_name), 0)
+        self.assertEqual(self._refs(recipe.image.name), 1)
+
+    def test_deleting_recipe_releases_reference(self):
+        """Test deleting a recipe, even loaded without its image, drops the count."""
+        recipe = self._recipe(image=image_upload())
+        name = recipe.image.name
+
+        Recipe.objects.only("id").get(id=recipe.id).delete()
+
+        self.assertEqual(self._refs(name), 0)
+
+    def test_gc_removes_unreferenced_files(self):
+        """Test gc_media deletes orphans and keeps files still in use."""
+        kept = self._recipe(image=image_upload())
+        dropped = self._recipe(image=image_upload(color=(0, 0, 0)))
+        dropped_name = dropped.image.name
+        variant = os.path.join(os.path.splitext(dropped_name)[0], "card.jpg")
+        default_storage.save(variant, BytesIO(b"variant"))
+        dropped.delete()
+
+        self._gc()
+
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertFalse(default_storage.exists(dropped_name))
+        self.assertFalse(default_storage.exists(variant))
+        self.assertFalse(MediaFile.objects.filter(name=dropped_name).exists())
+
+    def test_gc_grace_period(self):
+        """Test recently released files are left for a later run."""
+        recipe = self._recipe(image=image_upload())
+        name = recipe.image.name
+        recipe.delete()
+
+        call_command("gc_media", stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(name))
+
+    def test_gc_dry_run(self):
+        """Test --dry-run reports orphans without deleting them."""
+        recipe = self._recipe(image=image_upload())
+        name = recipe.image.name
+        recipe.delete()
+
+        self._gc("--dry-run")
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self._refs(name), 0)
+
+    def test_gc_scan_removes_untracked_files(self):
+        """Test --scan deletes files with no recipe and no reference row."""
+        kept = self._recipe(image=image_upload())
+        kept_variant = os.path.join(os.path.splitext(kept.image.name)[0], "card.jpg")
+        default_storage.save(kept_variant, BytesIO(b"variant"))
+        stray = default_storage.save("uploads/recipe/stray.jpg", BytesIO(b"x"))
+        stray_variant = default_storage.save(
+            "uploads/recipe/stray/thumbnail.jpg", BytesIO(b"x")
+        )
+
+        self._gc("--scan", "--batch-size=1")
+
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertTrue(default_storage.exists(kept_variant))
+        self.assertFalse(default_storage.exists(stray))
+        self.assertFalse(default_storage.exists(stray_variant))
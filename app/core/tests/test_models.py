@@ -2,11 +2,13 @@
 Tests for models.
 """
 
+import hashlib
 from unittest.mock import patch
 from decimal import Decimal
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 from core import models
 
@@ -81,6 +83,7 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    @override_settings(RECIPE_IMAGE_STORAGE_MODE="uuid")
     @patch("core.models.uuid.uuid4")
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
@@ -89,3 +92,12 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, "exmaple.jpg")
 
         self.assertEqual(file_path, f"uploads/recipe/{uuid}.jpg")
+
+    def test_recipe_file_name_content_hash(self):
+        """Test generating a content-addressed image path."""
+        recipe = models.Recipe(image=SimpleUploadedFile("example.JPG", b"data"))
+        digest = hashlib.sha256(b"data").hexdigest()
+
+        file_path = models.recipe_image_file_path(recipe, "example.JPG")
+
+        self.assertEqual(file_path, f"uploads/recipe/sha256/{digest[:2]}/{digest}.jpg")
@@ -0,0 +1,191 @@
+"""Tests for the N+1 and slow query detector."""
+
+import json
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from core.models import Recipe, Tag
+from core.query_detector import (
+    QueryBudgetExceeded,
+    QueryBudgetMixin,
+    query_budget,
+    recording,
+    shape,
+)
+from recipe.serializers import RecipeSerializer
+
+
+class UnprefetchedRecipesView(APIView):
+    """Render recipes without prefetching their tags and ingredients."""
+
+    def get(self, request):
+        recipes = Recipe.objects.filter(user=request.user).order_by("id")
+        return Response(RecipeSerializer(recipes, many=True).data)
+
+
+urlpatterns = [path("recipes/", UnprefetchedRecipesView.as_view())]
+
+
+class ShapeTests(SimpleTestCase):
+    """Test queries are grouped by their shape."""
+
+    def test_values_blanked(self):
+        """Test parameters, literals and lists do not change the shape."""
+        self.assertEqual(
+            shape('SELECT "a" FROM "t" WHERE "id" IN (%s, %s) AND "n" = \'x\''),
+            shape('SELECT "a" FROM "t" WHERE "id" IN (%s)  AND "n" = \'it\'\'s\''),
+        )
+        self.assertEqual(
+            shape('INSERT INTO "t2" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t2" ("a", "b") VALUES (...)',
+        )
+        self.assertEqual(shape("SELECT 1 LIMIT 21"), "SELECT ? LIMIT ?")
+
+    def test_other_queries(self):
+        """Test queries differing in more than values have other shapes."""
+        self.assertNotEqual(
+            shape('SELECT "a" FROM "t" WHERE "id" = %s'),
+            shape('SELECT "b" FROM "t" WHERE "id" = %s'),
+        )
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class QueryDetectorTests(TestCase):
+    """Test repeated and slow queries are found and traced to their code."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"Dal {i}", time_minutes=5, price=1
+            )
+            recipe.tags.add(vegan)
+
+    def test_repeated_queries(self):
+        """Test a query per row is found and traced to the serializer field."""
+        with recording() as recorder:
+            RecipeSerializer(Recipe.objects.all(), many=True).data
+
+        repeated = [o for o in recorder.offenders(3) if o["kind"] == "repeated"]
+        self.assertEqual(len(repeated), 2)
+        tags = next(o for o in repeated if '"core_tag"' in o["shape"])
+        self.assertEqual(tags["count"], 3)
+        self.assertTrue(tags["source"].startswith("RecipeSerializer.tags ("))
+        self.assertIn(" in to_representation)", tags["source"])
+
+    def test_prefetched_queries(self):
+        """Test prefetched relations are not reported."""
+        queryset = RecipeSerializer.setup_eager_loading(Recipe.objects.all())
+
+        with recording() as recorder:
+            RecipeSerializer(queryset, many=True).data
+
+        self.assertEqual(recorder.offenders(3), [])
+
+    def test_slow_queries(self):
+        """Test queries over the time limit are reported."""
+        with recording() as recorder:
+            Recipe.objects.count()
+
+        self.assertEqual(recorder.offenders(3, slow_seconds=1), [])
+        (slow,) = recorder.offenders(3, slow_seconds=0)
+        self.assertEqual(slow["kind"], "slow")
+        self.assertTrue(slow["source"].startswith("QueryDetectorTests."))
+
+    @override_settings(QUERY_DETECTOR={"SAMPLE_RATE": 1.0, "REPEAT_THRESHOLD": 3})
+    def test_logged(self):
+        """Test the offenders of a sampled request are logged."""
+        with self.assertLogs("core.query_detector", "WARNING") as logs:
+            self.client.get("/recipes/")
+
+        (message,) = logs.output
+        self.assertIn("GET /recipes/", message)
+        self.assertIn('repeated: 3 x SELECT "core_tag"', message)
+        self.assertIn("from RecipeSerializer.tags", message)
+
+    @override_settings(QUERY_DETECTOR={"SAMPLE_RATE": 0.0, "REPEAT_THRESHOLD": 3})
+    def test_not_sampled(self):
+        """Test requests are not checked with sampling turned off."""
+        with self.assertNoLogs("core.query_detector"):
+            self.client.get("/recipes/")
+
+    def test_budget_repeats(self):
+        """Test a request repeating a query fails under a budget."""
+        with query_budget(queries=100, repeats=2):
+            with self.assertRaisesRegex(QueryBudgetExceeded, "3 times, 2 allowed"):
+                self.client.get("/recipes/")
+
+    def test_budget_queries(self):
+        """Test a request running more queries than allowed fails."""
+        with query_budget(queries=1, repeats=100):
+            with self.assertRaisesRegex(
+                QueryBudgetExceeded, "ran 7 queries, 1 allowed"
+            ):
+                self.client.get("/recipes/")
+
+        with query_budget(queries=7, repeats=3):
+            self.client.get("/recipes/")
+
+    @override_settings(ROOT_URLCONF="core.tests.test_async_views")
+    def test_budget_async(self):
+        """Test the queries of an async view count towards the budget."""
+        token = Token.objects.create(user=self.user)
+        client = AsyncClient()
+
+        with query_budget(queries=1):
+            with self.assertRaises(QueryBudgetExceeded):
+                async_to_sync(client.get)(
+                    "/api/recipe/recipes/", headers={"Authorization": f"Token {token}"}
+                )
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+    """Test the budget declared on a test class applies to its requests."""
+
+    query_budget = 4
+
+    def test_over_budget(self):
+        """Test a request running more queries than the class allows fails."""
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        for i in range(5):
+            Recipe.objects.create(user=user, title=f"Dal {i}", time_minutes=5, price=1)
+
+        with self.assertRaisesRegex(QueryBudgetExceeded, "4 allowed"):
+            client.get("/recipes/")
+
+
+class QueryDetectorBenchmarkTests(TestCase):
+    """Test the query_detector benchmark scenario."""
+
+    def test_runs(self):
+        """Test the list is measured with the detector off, unsampled and on."""
+        out = StringIO()
+
+        call_command(
+            "benchmark", "query_detector", "--iterations=2", "--size=3", stdout=out
+        )
+
+        results = json.loads(out.getvalue())["query_detector"]
+        queries = results["no_middleware"]["queries_per_call"]
+        for case in ["not_sampled", "sampled"]:
+            self.assertEqual(results[case]["iterations"], 2)
+            self.assertEqual(results[case]["queries_per_call"], queries)
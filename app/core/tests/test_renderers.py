@@ -0,0 +1,136 @@
+"""Tests for the orjson renderer and parser."""
+
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test rendering matches JSONRenderer byte for byte."""
+
+    def test_same_bytes(self):
+        """Test every type a response may hold renders like JSONRenderer."""
+        utc = datetime.timezone.utc
+        data = {
+            "text": "Crème brûlée \u2028 \u2029 </script>",
+            "numbers": [1, -2.5, 2**63 - 1, True, None],
+            "price": Decimal("12.30"),
+            "created": datetime.datetime(2024, 5, 1, 8, 30, 1, 123456, tzinfo=utc),
+            "local": datetime.datetime(2024, 5, 1, 8, 30),
+            "date": datetime.date(2024, 5, 1),
+            "time": datetime.time(8, 30, 1, 500),
+            "duration": datetime.timedelta(minutes=90),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": gettext_lazy("Not found."),
+            "nested": [{"id": 1, "tags": []}, ("a", "b")],
+            "bytes": b"raw",
+            "set": frozenset([1]),
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_written_by_json_module(self):
+        """Test keys and integers orjson refuses are still rendered."""
+        for data in [{1: "a", 2.5: "b", False: "c", "d": {3: None}}, [10**20]]:
+            with self.subTest(data=data):
+                self.assertEqual(
+                    ORJSONRenderer().render(data), JSONRenderer().render(data)
+                )
+
+    def test_indent_requested(self):
+        """Test an indented rendering is still honoured."""
+        media_type = "application/json; indent=4"
+        data = {"id": 1, "tags": [{"name": "Vegan"}]}
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
+
+    def test_none(self):
+        """Test no data renders an empty body."""
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test parsing request bodies."""
+
+    def _parse(self, body, encoding="utf-8"):
+        return ORJSONParser().parse(
+            BytesIO(body), parser_context={"encoding": encoding}
+        )
+
+    def test_parse(self):
+        """Test a UTF-8 body is parsed."""
+        data = self._parse('{"title": "Crème", "tags": [1, 2.5]}'.encode())
+
+        self.assertEqual(data, {"title": "Crème", "tags": [1, 2.5]})
+
+    def test_other_encoding(self):
+        """Test a body in the charset given by the request is decoded."""
+        data = self._parse('{"title": "Crème"}'.encode("latin-1"), "latin-1")
+
+        self.assertEqual(data, {"title": "Crème"})
+
+    def test_invalid(self):
+        """Test malformed or non-strict JSON is a parse error."""
+        for body in [b'{"title": ', b'{"price": NaN}', b"\xff"]:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    self._parse(body)
+
+
+class JSONAPITests(TestCase):
+    """Test the API reads and writes JSON with orjson."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_create_recipe(self):
+        """Test a recipe round trips with an exact price."""
+        payload = {"title": "Dal", "time_minutes": 30, "price": "4.10"}
+
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn(b'"price":"4.10"', res.content)
+
+    def test_browsable_api_off(self):
+        """Test HTML is not offered outside of DEBUG."""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT="text/html")
+
+        self.assertEqual(res.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_render_benchmark(self):
+        """Test the benchmark reports every renderer, parser and coding."""
+        out = StringIO()
+
+        call_command(
+            "benchmark", "recipe_render", "--size=20", "--iterations=1", stdout=out
+        )
+
+        results = json.loads(out.getvalue())["recipe_render"]
+        for name in ["render_orjson", "parse_orjson", "compress_br", "compress_gzip"]:
+            self.assertIn("mb_per_sec", results[name])
+        self.assertLess(results["compress_br"]["bytes"], results["bytes"])
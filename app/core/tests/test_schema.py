@@ -0,0 +1,115 @@
+"""
+Tests for the precomputed OpenAPI schema.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import schema
+
+SCHEMA_URL = reverse("api-schema")
+
+
+class CachedSchemaTests(TestCase):
+    """Test serving the schema from the precomputed copy."""
+
+    def setUp(self):
+        self.schema_dir = tempfile.mkdtemp()
+        settings_override = override_settings(
+            OPENAPI_SCHEMA_DIR=self.schema_dir,
+            CODE_VERSION="test-version",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.schema_dir, ignore_errors=True)
+        schema.reset_schema_cache()
+        self.addCleanup(schema.reset_schema_cache)
+
+        self.client = APIClient()
+
+    def test_schema_generated_once(self):
+        """Test repeated requests reuse the schema built by the first one."""
+        with patch(
+            "core.schema.generate_schema", wraps=schema.generate_schema
+        ) as generate:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b"openapi:", first.content)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_json_format(self):
+        """Test the JSON schema is served when requested."""
+        res = self.client.get(SCHEMA_URL, {"format": "json"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("/api/recipe/recipes/", json.loads(res.content)["paths"])
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304."""
+        etag = self.client.get(SCHEMA_URL)["ETag"]
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_gzip(self):
+        """Test the precompressed body is served to gzip-capable clients."""
+        plain = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotEqual(res["ETag"], plain["ETag"])
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    def test_build_schema_command(self):
+        """Test the prebuilt schema is served without generating it again."""
+        call_command("build_schema", stdout=StringIO())
+        self.assertTrue(
+            os.path.exists(os.path.join(self.schema_dir, "openapi-test-version.yaml"))
+        )
+
+        with patch("core.schema.generate_schema") as generate:
+            res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        generate.assert_not_called()
+
+    def test_rebuilt_for_new_code_version(self):
+        """Test a different code version does not reuse the old schema."""
+        call_command("build_schema", stdout=StringIO())
+
+        with override_settings(CODE_VERSION="next-version"), patch(
+            "core.schema.generate_schema", wraps=schema.generate_schema
+        ) as generate:
+            self.client.get(SCHEMA_URL)
+
+        generate.assert_called_once()
+        self.assertTrue(
+            os.path.exists(os.path.join(self.schema_dir, "openapi-next-version.yaml"))
+        )
+
+    @override_settings(OPENAPI_SCHEMA_CACHE=False)
+    def test_cache_disabled(self):
+        """Test the schema is generated per request when caching is off."""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", res)
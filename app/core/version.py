@@ -0,0 +1,36 @@
+"""
+The version of the running code.
+
+Anything cached across deployments (the prebuilt OpenAPI schema, the ETags
+of the recipe APIs) is keyed on it, so a new release never serves what the
+old one rendered.
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+
+import drf_spectacular
+import rest_framework
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def source_fingerprint():
+    """Return a digest of the project's source files and API libraries."""
+    sha256 = hashlib.sha256()
+    sha256.update(f"{drf_spectacular.__version__} {rest_framework.VERSION}".encode())
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs.sort()
+        for file_name in sorted(files):
+            if not file_name.endswith(".py"):
+                continue
+            path = os.path.join(root, file_name)
+            stat = os.stat(path)
+            sha256.update(f"{path} {stat.st_size} {stat.st_mtime_ns}".encode())
+    return sha256.hexdigest()[:16]
+
+
+def code_version():
+    """Return CODE_VERSION, or the source fingerprint when it is unset."""
+    return settings.CODE_VERSION or source_fingerprint()
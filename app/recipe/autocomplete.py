@@ -0,0 +1,222 @@
+"""
+In-memory autocomplete of a user's tag and ingredient names.
+
+Each user's names are kept sorted, once per word, so a typed prefix is
+found with a binary search wherever it starts a word. When that leaves
+room, names are also matched fuzzily by trigram similarity, computed the
+way PostgreSQL's pg_trgm does, from an inverted trigram index.
+
+Indexes are built lazily per user and kept in an LRU for TTL seconds,
+never changed once built. Names created or renamed since, in this worker
+or another, have a newer id than the index knows of or an updated_at no
+earlier than the start of its build; they are matched with an SQL prefix match in the query fetching the indexed
+matches, and the index's matches among them are dropped.
+"""
+
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache import LRUCache
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_USERS": 256,
+    "TTL": 30,
+}
+
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+# prefix entries looked at before ranking, to bound the work per keystroke
+MAX_CANDIDATES = 200
+
+_WORD = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Return the pg_trgm style trigrams of text."""
+    grams = set()
+    for word in _WORD.findall(text.casefold()):
+        padded = f"  {word} "
+        grams.update(map("".join, zip(padded, padded[1:], padded[2:])))
+    return grams
+
+
+def _word_starts(key):
+    """Yield the suffixes of key that start a word, the whole key first."""
+    for match in _WORD.finditer(key):
+        start = match.start()
+        yield key[start:]
+
+
+class NameIndex:
+    """Sorted word prefixes and trigrams of one user's names."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.names = {}
+        # (suffix starting at a word, id), sorted
+        self.entries = []
+        self.grams = {}
+        self.postings = {}
+        # the newest object the index knows of and when its build started
+        self.max_id = 0
+        self.snapshot = None
+
+    @classmethod
+    def build(cls, model, user_id):
+        """Load the names of user_id's model objects from the database."""
+        index = cls(user_id)
+        # taken before the read: a rename stamped earlier than the newest
+        # updated_at read may still commit after it
+        index.snapshot = timezone.now()
+        rows = model.objects.filter(user_id=user_id).values_list("id", "name")
+        for obj_id, name in rows.iterator():
+            index._index(obj_id, name, sort=False)
+            index.max_id = max(index.max_id, obj_id)
+        index.entries.sort()
+        return index
+
+    def _index(self, obj_id, name, sort=True):
+        key = name.casefold()
+        self.names[obj_id] = name
+        for suffix in _word_starts(key):
+            if sort:
+                insort(self.entries, (suffix, obj_id))
+            else:
+                self.entries.append((suffix, obj_id))
+        self.grams[obj_id] = trigrams(key)
+        for gram in self.grams[obj_id]:
+            self.postings.setdefault(gram, set()).add(obj_id)
+
+    def add(self, obj_id, name):
+        """Index one more object."""
+        self._index(obj_id, name)
+
+    def changed_since_built(self):
+        """Match the objects this index does not know the current name of."""
+        return Q(id__gt=self.max_id) | Q(updated_at__gte=self.snapshot)
+
+    def knows(self, obj):
+        """Return whether the index has the current name of obj."""
+        return obj.id <= self.max_id and obj.updated_at < self.snapshot
+
+    def search(self, text, limit):
+        """Return the ids of up to limit names matching text, best first.
+
+        Names starting with text come first, then names with a later word
+        starting with text, then names similar to text.
+        """
+        key = text.strip().casefold()
+        if not key:
+            return []
+
+        found = {}
+        start = bisect_left(self.entries, (key,))
+        end = start + MAX_CANDIDATES
+        for suffix, obj_id in self.entries[start:end]:
+            if not suffix.startswith(key):
+                break
+            name = self.names[obj_id].casefold()
+            found.setdefault(obj_id, (not name.startswith(key), name))
+        ids = sorted(found, key=found.get)
+        if len(ids) >= limit:
+            return ids[:limit]
+
+        query = trigrams(key)
+        shared = Counter()
+        for gram in query:
+            shared.update(self.postings.get(gram, ()))
+        similar = []
+        for obj_id, count in shared.items():
+            if obj_id in found:
+                continue
+            similarity = count / (len(query) + len(self.grams[obj_id]) - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                similar.append((-similarity, self.names[obj_id].casefold(), obj_id))
+        similar.sort()
+        ids.extend(obj_id for _, _, obj_id in similar)
+        return ids[:limit]
+
+
+class NameIndexCache:
+    """Per-user NameIndex objects of one model, built on demand."""
+
+    def __init__(self, model):
+        options = {**DEFAULTS, **getattr(settings, "RECIPE_ATTR_AUTOCOMPLETE", {})}
+        self.model = model
+        self.enabled = options["ENABLED"]
+        self.local = LRUCache(options["MAX_USERS"], options["TTL"])
+
+    def get(self, user_id):
+        """Return an index of user_id's names at most TTL seconds old."""
+        index = self.local.get(user_id)
+        if index is None:
+            index = NameIndex.build(self.model, user_id)
+            self.local.set(user_id, index)
+        return index
+
+    def clear(self):
+        """Drop every index."""
+        self.local.clear()
+
+
+_caches = {}
+
+
+def get_name_index(model):
+    """Return the process wide index cache of model, creating it on first use."""
+    if model not in _caches:
+        _caches[model] = NameIndexCache(model)
+    return _caches[model]
+
+
+def reset_name_index():
+    """Discard the index caches so settings are re-read on next use."""
+    _caches.clear()
+
+
+def autocomplete(queryset, user_id, text, limit):
+    """Return up to limit objects of queryset whose names match text."""
+    text = text.strip()
+    index_cache = get_name_index(queryset.model)
+    if not index_cache.enabled:
+        matches = queryset.filter(name__istartswith=text)
+        return list(matches.order_by("name")[:limit])
+
+    index = index_cache.get(user_id)
+    changed = index.changed_since_built()
+    ids = index.search(text, MAX_CANDIDATES)
+    found = []
+    fresh = []
+    # queryset may filter some matches out (assigned_only); fetch the ranked
+    # ids a page at a time until limit objects are found, and the names the
+    # index does not know with the first page
+    for start in range(0, max(len(ids), 1), limit):
+        end = start + limit
+        chunk = ids[start:end]
+        matches = Q(id__in=chunk) & ~changed
+        if not start:
+            matches |= changed & Q(name__istartswith=text)
+        objects = queryset.filter(matches).in_bulk()
+        if not start:
+            fresh = [obj for obj in objects.values() if not index.knows(obj)]
+            for obj in fresh:
+                del objects[obj.id]
+        found.extend(objects[obj_id] for obj_id in chunk if obj_id in objects)
+        if len(found) >= limit:
+            break
+
+    if not fresh:
+        return found[:limit]
+    # the fresh names start with text, so they rank with the indexed
+    # names that do, by name
+    key = text.casefold()
+    starting = [obj for obj in found if obj.name.casefold().startswith(key)]
+    rest = [obj for obj in found if not obj.name.casefold().startswith(key)]
+    starting = sorted(starting + fresh, key=lambda obj: obj.name.casefold())
+    return (starting + rest)[:limit]
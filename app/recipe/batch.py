@@ -0,0 +1,176 @@
+"""
+Batch updates and deletes of recipes.
+
+A batch is applied in one transaction with as few queries as possible:
+recipes given the same field values share one UPDATE, tag and ingredient
+changes are diffed against the through tables in one DELETE and one
+INSERT each, and deletes are one queryset delete(). update() and the
+through table writes send no signals, so updated_at is bumped here; the
+search triggers work as usual.
+
+Every item gets its own result, so one bad item does not hide the others.
+Updates are all or nothing: if any item is invalid or unknown, none is
+applied and the valid ones are reported as not applied (424).
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeBatchUpdateSerializer, get_or_create_attrs
+
+# items accepted in one batch
+MAX_BATCH_SIZE = 100
+
+RELATIONS = [("tags", Tag), ("ingredients", Ingredient)]
+
+
+def _result(recipe_id, status_code, errors=None):
+    result = {"id": recipe_id, "status": status_code}
+    if errors is not None:
+        result["errors"] = errors
+    return result
+
+
+def _not_found(recipe_id):
+    return _result(recipe_id, status.HTTP_404_NOT_FOUND, {"detail": "Not found."})
+
+
+def _not_applied(recipe_id):
+    return _result(
+        recipe_id,
+        status.HTTP_424_FAILED_DEPENDENCY,
+        {"detail": "Not applied: another change in the batch failed."},
+    )
+
+
+def _validate_items(items):
+    """Return the per-item results so far and the valid changes by id."""
+    # one instance validates every item; run_validation keeps no state
+    serializer = RecipeBatchUpdateSerializer(partial=True)
+    results = []
+    changes = {}
+    for item in items:
+        try:
+            data = serializer.run_validation(item)
+            if "id" not in data:
+                raise ValidationError({"id": ["This field is required."]})
+            if data["id"] in changes:
+                raise ValidationError({"id": ["Given more than once."]})
+        except ValidationError as exc:
+            recipe_id = item.get("id") if isinstance(item, dict) else None
+            results.append(_result(recipe_id, status.HTTP_400_BAD_REQUEST, exc.detail))
+            continue
+        recipe_id = data.pop("id")
+        changes[recipe_id] = data
+        results.append(_result(recipe_id, status.HTTP_200_OK))
+    return results, changes
+
+
+def _relink(user, relation, model, names_by_recipe):
+    """Set the relation of each recipe to the named objects, as a diff."""
+    targets = {
+        obj.name: obj.id
+        for obj in get_or_create_attrs(
+            model,
+            user,
+            [name for names in names_by_recipe.values() for name in names],
+        )
+    }
+    wanted = {
+        recipe_id: {targets[name] for name in names}
+        for recipe_id, names in names_by_recipe.items()
+    }
+
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    source = f"{field.m2m_field_name()}_id"
+    target = f"{field.m2m_reverse_field_name()}_id"
+    current = through.objects.filter(**{f"{source}__in": wanted})
+
+    stale = []
+    present = defaultdict(set)
+    for row_id, recipe_id, target_id in current.values_list("id", source, target):
+        if target_id in wanted[recipe_id]:
+            present[recipe_id].add(target_id)
+        else:
+            stale.append(row_id)
+    added = {
+        recipe_id: list(target_ids - present[recipe_id])
+        for recipe_id, target_ids in wanted.items()
+    }
+
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    through.objects.bulk_create(
+        through(**{source: recipe_id, target: target_id})
+        for recipe_id, target_ids in added.items()
+        for target_id in target_ids
+    )
+
+
+def batch_update(user, items):
+    """Apply partial updates to the user's recipes; return per-item results."""
+    results, changes = _validate_items(items)
+
+    with transaction.atomic():
+        # lock the rows so concurrent batches apply one after the other
+        owned = set(
+            Recipe.objects.select_for_update()
+            .filter(user=user, id__in=changes)
+            .values_list("id", flat=True)
+        )
+        for index, result in enumerate(results):
+            if result["status"] == status.HTTP_200_OK and result["id"] not in owned:
+                results[index] = _not_found(result["id"])
+        if any(result["status"] != status.HTTP_200_OK for result in results):
+            return [
+                _not_applied(r["id"]) if r["status"] == status.HTTP_200_OK else r
+                for r in results
+            ]
+
+        # recipes changed the same way share one UPDATE; relinked recipes
+        # with no other change still get their updated_at bumped
+        groups = defaultdict(list)
+        for recipe_id, data in changes.items():
+            fields = {k: v for k, v in data.items() if k not in dict(RELATIONS)}
+            groups[tuple(sorted(fields.items()))].append(recipe_id)
+        now = timezone.now()
+        for fields, recipe_ids in groups.items():
+            Recipe.objects.filter(id__in=recipe_ids).update(
+                **dict(fields), updated_at=now
+            )
+
+        for relation, model in RELATIONS:
+            names_by_recipe = {
+                recipe_id: [item["name"] for item in data[relation]]
+                for recipe_id, data in changes.items()
+                if relation in data
+            }
+            if names_by_recipe:
+                _relink(user, relation, model, names_by_recipe)
+    return results
+
+
+def batch_delete(user, recipe_ids):
+    """Delete the user's recipes by id; return per-item results."""
+    with transaction.atomic():
+        recipes = Recipe.objects.select_for_update().filter(
+            user=user, id__in=recipe_ids
+        )
+        found = set(recipes.values_list("id", flat=True))
+        # one delete() for the lot; it still sends the per-recipe signals
+        # that release the images
+        Recipe.objects.filter(id__in=found).delete()
+    return [
+        (
+            _result(recipe_id, status.HTTP_204_NO_CONTENT)
+            if recipe_id in found
+            else _not_found(recipe_id)
+        )
+        for recipe_id in dict.fromkeys(recipe_ids)
+    ]
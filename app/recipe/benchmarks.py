@@ -0,0 +1,755 @@
+"""
+Benchmark scenarios for the recipe app.
+"""
+
+import json
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from core.benchmark import measure, measure_requests, register
+from core.compression import COMPRESSORS, get_options
+from core.explain import explain, node_types
+from core.models import Ingredient, Recipe, Tag
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from recipe.autocomplete import NameIndex
+from recipe.bitmaps import UserRecipeIndex
+from recipe.fast_serializers import ValuesSerializer
+from recipe.filters import recipe_linked_to, recipe_linked_to_all, used_by_recipes
+from recipe.serializers import RecipeSerializer, TagSerializer
+from recipe.transfer import RecipeImporter
+from recipe.views import RecipeViewSet
+
+# rows fetched for one page of the list endpoints
+PAGE = 101
+BATCH_SIZE = 10_000
+
+
+def seed_recipes(size, users=10, attrs_per_user=50, prefix="bench-recipes"):
+    """Create size recipes spread over users and return the users.
+
+    Every recipe is linked to about three of its owner's tags and three of
+    its owner's ingredients.
+    """
+    owners = get_user_model().objects.bulk_create(
+        get_user_model()(email=f"{prefix}-{i}@example.com") for i in range(users)
+    )
+    for model in (Tag, Ingredient):
+        model.objects.bulk_create(
+            model(user=owner, name=f"{model.__name__} {i}")
+            for owner in owners
+            for i in range(attrs_per_user)
+        )
+    for start in range(0, size, BATCH_SIZE):
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=owners[i % users],
+                title=f"Recipe {i}",
+                time_minutes=1 + i % 120,
+                price=Decimal(i % 9000) / 100,
+            )
+            for i in range(start, min(start + BATCH_SIZE, size))
+        )
+
+    # linking in SQL avoids building millions of through model instances
+    with connection.cursor() as cursor:
+        for relation in ("tags", "ingredients"):
+            field = Recipe._meta.get_field(relation)
+            through = field.remote_field.through
+            recipe_column = through._meta.get_field(field.m2m_field_name()).column
+            target_column = through._meta.get_field(
+                field.m2m_reverse_field_name()
+            ).column
+            cursor.execute(
+                f"""
+                INSERT INTO {through._meta.db_table} ({recipe_column}, {target_column})
+                SELECT recipe.id, target.id
+                FROM {Recipe._meta.db_table} recipe
+                JOIN {field.related_model._meta.db_table} target
+                    ON target.user_id = recipe.user_id
+                WHERE recipe.user_id = ANY(%s) AND (recipe.id + target.id) %% 17 = 0
+                """,
+                [[owner.id for owner in owners]],
+            )
+        through_models = [Recipe.tags.through, Recipe.ingredients.through]
+        for model in [Recipe, Tag, Ingredient, *through_models]:
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return owners
+
+
+def distinct_recipes(user, tag_ids=None, ingredient_ids=None):
+    """Recipe list query as it was built with joins and DISTINCT."""
+    queryset = Recipe.objects.all()
+    if tag_ids:
+        queryset = queryset.filter(tags__id__in=tag_ids)
+    if ingredient_ids:
+        queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+    return queryset.filter(user=user).order_by("-id").distinct()
+
+
+def exists_recipes(user, tag_ids=None, ingredient_ids=None):
+    """Recipe list query as RecipeViewSet builds it."""
+    queryset = Recipe.objects.filter(user=user)
+    if tag_ids:
+        queryset = queryset.filter(recipe_linked_to("tags", tag_ids))
+    if ingredient_ids:
+        queryset = queryset.filter(recipe_linked_to("ingredients", ingredient_ids))
+    return queryset.order_by("-id")
+
+
+def compare_plans(old, new, iterations):
+    """Run both querysets for one page and return their plans and timings."""
+    results = {}
+    for label, queryset in (("distinct", old), ("exists", new)):
+        plan = explain(queryset[:PAGE], analyze=True)
+
+        def run(queryset=queryset):
+            list(queryset[:PAGE])
+
+        results[label] = {
+            "plan": sorted(node_types(plan)),
+            "execution_ms": plan["Actual Total Time"],
+            **measure(run, iterations),
+        }
+    old_ids = list(old.values_list("id", flat=True)[:PAGE])
+    new_ids = list(new.values_list("id", flat=True)[:PAGE])
+    results["same_results"] = old_ids == new_ids
+    return results
+
+
+@register("recipe_filters")
+def recipe_filters(iterations, size=1_000_000):
+    """Compare DISTINCT-over-joins filtering with EXISTS subqueries."""
+    user = seed_recipes(size)[0]
+    tag_ids = list(Tag.objects.filter(user=user).values_list("id", flat=True)[:5])
+    ingredient_ids = list(
+        Ingredient.objects.filter(user=user).values_list("id", flat=True)[:5]
+    )
+
+    cases = {
+        "tags": {"tag_ids": tag_ids},
+        "ingredients": {"ingredient_ids": ingredient_ids},
+        "tags_and_ingredients": {
+            "tag_ids": tag_ids,
+            "ingredient_ids": ingredient_ids,
+        },
+    }
+    results = {"recipes": size}
+    for name, filters in cases.items():
+        results[name] = compare_plans(
+            distinct_recipes(user, **filters),
+            exists_recipes(user, **filters),
+            iterations,
+        )
+
+    assigned_tags = Tag.objects.filter(user=user).order_by("-name")
+    results["assigned_tags"] = compare_plans(
+        assigned_tags.filter(recipe__isnull=False).distinct(),
+        assigned_tags.filter(used_by_recipes("tags")),
+        iterations,
+    )
+    return results
+
+
+@register("recipe_bitmaps")
+def recipe_bitmaps(iterations, size=100_000):
+    """Compare "all of"/"exclude" filters in SQL with the bitmap index."""
+    user = seed_recipes(size)[0]
+    tag_ids = list(Tag.objects.filter(user=user).values_list("id", flat=True)[:2])
+    recipes = Recipe.objects.filter(user=user).order_by("-id")
+    index = UserRecipeIndex.build(user.id)
+
+    def build():
+        UserRecipeIndex.build(user.id)
+
+    results = {"recipes": size, "build": measure(build, max(1, iterations // 10))}
+    cases = {
+        "all_tags": recipes.filter(recipe_linked_to_all("tags", tag_ids)),
+        "exclude_tags": recipes.exclude(recipe_linked_to("tags", tag_ids)),
+    }
+    for name, sql in cases.items():
+        filters = [("tags", tag_ids, name.split("_")[0])]
+
+        def match(filters=filters):
+            bits = index.live
+            for relation, target_ids, mode in filters:
+                bits &= index.match(relation, target_ids, mode)
+            return bits
+
+        def run_sql(queryset=sql):
+            list(queryset[:PAGE])
+
+        def run_bitmap(filters=filters):
+            list(index.filter(recipes, filters)[:PAGE])
+
+        sql_ids = list(sql.values_list("id", flat=True)[:PAGE])
+        bitmap = index.filter(recipes, filters)
+        results[name] = {
+            "sql": measure(run_sql, iterations),
+            "bitmap_match": measure(match, iterations),
+            "bitmap_page": measure(run_bitmap, iterations),
+            "same_results": sql_ids == list(bitmap.values_list("id", flat=True)[:PAGE]),
+        }
+    return results
+
+
+@register("recipe_autocomplete")
+def recipe_autocomplete(iterations, size=5000):
+    """Compare autocomplete from the name index with a LIKE query."""
+    user = get_user_model().objects.create(email="bench-autocomplete@example.com")
+    words = ["red", "green", "smoked", "fresh", "dried", "ground", "wild", "baby"]
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f"{words[i % 8]} {words[i // 8 % 8]} item {i}")
+        for i in range(size)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {Ingredient._meta.db_table}")
+    ingredients = Ingredient.objects.filter(user=user)
+    index = NameIndex.build(Ingredient, user.id)
+
+    def build():
+        NameIndex.build(Ingredient, user.id)
+
+    results = {"names": size, "build": measure(build, max(1, iterations // 10))}
+    for text in ["sm", "smoked gr", "item 42", "smokd"]:
+
+        def run_sql(text=text):
+            list(ingredients.filter(name__icontains=text).order_by("name")[:10])
+
+        def run_index(text=text):
+            list(ingredients.filter(id__in=index.search(text, 10)))
+
+        results[text] = {
+            "sql_icontains": measure(run_sql, iterations),
+            "index_search": measure(
+                lambda text=text: index.search(text, 10), iterations
+            ),
+            "index_and_fetch": measure(run_index, iterations),
+        }
+    return results
+
+
+@register("recipe_import")
+def recipe_import(iterations, size=1000):
+    """Compare creating recipes one by one with the bulk importer."""
+    user = get_user_model().objects.create(email="bench-import@example.com")
+    records = [
+        {
+            "title": f"Imported {i}",
+            "time_minutes": 1 + i % 120,
+            "price": "4.50",
+            "tags": [{"name": f"Tag {i % 20}"}],
+            "ingredients": [
+                {"name": f"Ingredient {i % 50}"},
+                {"name": f"Ingredient {(i + 7) % 50}"},
+            ],
+        }
+        for i in range(size)
+    ]
+    context = {"request": SimpleNamespace(user=user)}
+
+    def one_by_one():
+        for record in records:
+            serializer = RecipeSerializer(data=record, context=context)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=user)
+
+    def bulk():
+        RecipeImporter(user).run(records)
+
+    results = {"recipes": size}
+    for label, func in (("per_recipe", one_by_one), ("bulk_import", bulk)):
+        stats = measure(func, iterations)
+        stats["recipes_per_sec"] = round(size / stats["mean_us"] * 1e6, 1)
+        results[label] = stats
+    return results
+
+
+@register("recipe_sparse_fields")
+def recipe_sparse_fields(iterations, size=1000):
+    """Compare a full recipe list page with narrowed fields= / expand= pages."""
+    user = seed_recipes(size, users=1, prefix="bench-sparse")[0]
+    Recipe.objects.filter(user=user).update(description="Stir well. " * 200)
+    view = RecipeViewSet.as_view({"get": "list"})
+    factory = APIRequestFactory()
+    cases = {
+        "full": {},
+        "with_description": {"fields": "id,title,description"},
+        "ids_only_relations": {"expand": ""},
+        "id_title": {"fields": "id,title"},
+    }
+
+    results = {"recipes": size}
+    # served from the view itself, not the response cache
+    with override_settings(
+        ALLOWED_HOSTS=["testserver"], RESPONSE_CACHE={"ENABLED": False}
+    ):
+        for name, params in cases.items():
+
+            def run(params=params):
+                request = factory.get("/", {"page_size": 100, **params})
+                force_authenticate(request, user)
+                return view(request).render()
+
+            results[name] = {
+                "bytes": len(run().content),
+                **measure(run, iterations),
+            }
+    return results
+
+
+@register("recipe_list_serializers")
+def recipe_list_serializers(iterations, size=1000):
+    """Compare rendering lists with ModelSerializers and ValuesSerializer."""
+    user = seed_recipes(size, users=1, prefix="bench-values")[0]
+    request = Request(APIRequestFactory().get("/"))
+    cases = {
+        "recipes": (RecipeSerializer, Recipe.objects.filter(user=user)),
+        "tags": (TagSerializer, Tag.objects.filter(user=user)),
+    }
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        for name, (serializer_class, queryset) in cases.items():
+            queryset = queryset.order_by("-id")
+            rows = queryset.count()
+
+            def model_serializer(serializer_class=serializer_class, queryset=queryset):
+                queryset = serializer_class.setup_eager_loading(queryset.all())
+                context = {"request": request}
+                return serializer_class(queryset, many=True, context=context).data
+
+            def values_serializer(serializer_class=serializer_class, queryset=queryset):
+                serializer = ValuesSerializer(
+                    serializer_class(context={"request": request})
+                )
+                return serializer.render(serializer.setup_queryset(queryset))
+
+            outputs = []
+            results[name] = {"rows": rows}
+            for label, func in (
+                ("model_serializer", model_serializer),
+                ("values_serializer", values_serializer),
+            ):
+                outputs.append(JSONRenderer().render(func()))
+                stats = measure(func, iterations)
+                stats["rows_per_sec"] = round(rows / stats["mean_us"] * 1e6, 1)
+                results[name][label] = stats
+            results[name]["same_output"] = outputs[0] == outputs[1]
+    return results
+
+
+@register("recipe_render")
+def recipe_render(iterations, size=1000):
+    """Compare JSON renderers, parsers and compression on a recipe list."""
+    user = seed_recipes(size, users=1, prefix="bench-render")[0]
+    request = Request(APIRequestFactory().get("/"))
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        serializer = ValuesSerializer(RecipeSerializer(context={"request": request}))
+        queryset = serializer.setup_queryset(Recipe.objects.filter(user=user))
+        data = {"next": None, "previous": None, "results": serializer.render(queryset)}
+    content = JSONRenderer().render(data)
+    megabytes = len(content) / 1e6
+
+    def throughput(stats):
+        stats["mb_per_sec"] = round(megabytes / stats["mean_us"] * 1e6, 1)
+        return stats
+
+    results = {"recipes": size, "bytes": len(content)}
+    for label, renderer in (("json", JSONRenderer), ("orjson", ORJSONRenderer)):
+        results[f"render_{label}"] = throughput(
+            measure(lambda renderer=renderer: renderer().render(data), iterations)
+        )
+    for label, parser in (("json", JSONParser), ("orjson", ORJSONParser)):
+
+        def parse(parser=parser):
+            parser().parse(BytesIO(content), parser_context={"encoding": "utf-8"})
+
+        results[f"parse_{label}"] = throughput(measure(parse, iterations))
+
+    for coding, factory in COMPRESSORS.items():
+
+        def compress(factory=factory):
+            compress, finish = factory(get_options())
+            return compress(content) + finish()
+
+        stats = throughput(measure(compress, iterations))
+        stats["bytes"] = len(compress())
+        results[f"compress_{coding}"] = stats
+    return results
+
+
+# words the generated names are made of, so search and autocomplete match
+# the way they would on real data
+DISHES = ["curry", "stew", "salad", "soup", "pie", "risotto", "tacos", "noodles"]
+STYLES = ["Spicy", "Quick", "Smoky", "Creamy", "Summer", "Weeknight", "Hearty"]
+TAG_NAMES = ["Vegan", "Vegetarian", "Quick", "Dessert", "Breakfast"]
+INGREDIENT_NAMES = ["Salt", "Pepper", "Garlic", "Onion", "Sage", "Rice", "Saffron"]
+# each generated user has this many tags and ingredients; every recipe
+# links to between the fewest and the most of them
+PROFILE_TAGS = 25
+PROFILE_INGREDIENTS = 150
+TAGS_PER_RECIPE = (1, 4)
+INGREDIENTS_PER_RECIPE = (4, 12)
+# recipe counts of the users recipe_api is run for; the last is --size
+PROFILE_SIZES = (10, 1_000)
+# most seconds spent on one endpoint, for slow ones like a full export
+ENDPOINT_SECONDS = 5.0
+
+
+def _names(words, count):
+    """Return count unique names built from words."""
+    return [
+        words[i % len(words)] + (f" {i // len(words) + 1}" if i >= len(words) else "")
+        for i in range(count)
+    ]
+
+
+def _link_generated(user, relation, count, fewest, most):
+    """Link each of user's recipes to fewest..most of its related objects.
+
+    The n-th recipe gets fewest + n % (most - fewest + 1) of them, picked by
+    position with a stride, so the links are the same on every run.
+    """
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    recipe_column = through._meta.get_field(field.m2m_field_name()).column
+    target_column = through._meta.get_field(field.m2m_reverse_field_name()).column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {through._meta.db_table} ({recipe_column}, {target_column})
+            SELECT recipe.id, target.id
+            FROM (
+                SELECT id, row_number() OVER (ORDER BY id) - 1 AS n
+                FROM {Recipe._meta.db_table} WHERE user_id = %(user)s
+            ) recipe
+            CROSS JOIN generate_series(0, %(most)s - 1) k
+            JOIN (
+                SELECT id, row_number() OVER (ORDER BY id) - 1 AS position
+                FROM {field.related_model._meta.db_table} WHERE user_id = %(user)s
+            ) target ON target.position = (recipe.n * 7 + k * 11) %% %(count)s
+            WHERE k < %(fewest)s + recipe.n %% %(spread)s
+            """,
+            {
+                "user": user.id,
+                "count": count,
+                "most": most,
+                "fewest": fewest,
+                "spread": most - fewest + 1,
+            },
+        )
+
+
+def seed_profile(size, prefix="bench-profile"):
+    """Create a user with size recipes, always the same ones, and return it.
+
+    The user has PROFILE_TAGS tags and PROFILE_INGREDIENTS ingredients, and
+    its recipes link to TAGS_PER_RECIPE and INGREDIENTS_PER_RECIPE of them.
+    """
+    user = get_user_model().objects.create_user(
+        email=f"{prefix}-{size}@example.com", password="benchpass123"
+    )
+    Tag.objects.bulk_create(
+        Tag(user=user, name=name) for name in _names(TAG_NAMES, PROFILE_TAGS)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=name)
+        for name in _names(INGREDIENT_NAMES, PROFILE_INGREDIENTS)
+    )
+    for start in range(0, size, BATCH_SIZE):
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f"{STYLES[i % len(STYLES)]} {DISHES[i % len(DISHES)]} {i}",
+                description="Simmer and season to taste." if i % 3 == 0 else "",
+                time_minutes=5 + i % 115,
+                price=Decimal(100 + i % 4900) / 100,
+            )
+            for i in range(start, min(start + BATCH_SIZE, size))
+        )
+    _link_generated(user, "tags", PROFILE_TAGS, *TAGS_PER_RECIPE)
+    _link_generated(user, "ingredients", PROFILE_INGREDIENTS, *INGREDIENTS_PER_RECIPE)
+    with connection.cursor() as cursor:
+        through_models = [Recipe.tags.through, Recipe.ingredients.through]
+        for model in [Recipe, Tag, Ingredient, *through_models]:
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return user
+
+
+def _image():
+    """Return a small PNG upload."""
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), color=(200, 120, 40)).save(buffer, format="PNG")
+    buffer.seek(0)
+    buffer.name = "bench.png"
+    return buffer
+
+
+def recipe_requests(user):
+    """Return (label, route name, method, URL, request kwargs) for each endpoint.
+
+    Every route and method of recipe/urls.py is covered; requests that
+    change data are rolled back after each call.
+    """
+    recipes = list(Recipe.objects.filter(user=user).order_by("id"))
+    recipe = recipes[len(recipes) // 2]
+    ids = ",".join(str(r.id) for r in recipes[:5])
+    tags = list(Tag.objects.filter(user=user).order_by("id"))
+    ingredients = list(Ingredient.objects.filter(user=user).order_by("id"))
+    new_recipe = {
+        "title": "Benchmark stew",
+        "time_minutes": 30,
+        "price": "7.50",
+        "tags": [{"name": tags[0].name}, {"name": "New tag"}],
+        "ingredients": [{"name": i.name} for i in ingredients[:6]],
+    }
+    ndjson = "\n".join(
+        json.dumps({**new_recipe, "title": f"Imported stew {i}"}) for i in range(10)
+    )
+    detail = reverse("recipe:recipe-detail", args=[recipe.id])
+    tag = reverse("recipe:tag-detail", args=[tags[0].id])
+    ingredient = reverse("recipe:ingredient-detail", args=[ingredients[0].id])
+    json_body = {"format": "json"}
+
+    return [
+        ("api_root", "api-root", "get", reverse("recipe:api-root"), {}),
+        ("list", "recipe-list", "get", reverse("recipe:recipe-list"), {}),
+        (
+            "list_tags_all",
+            "recipe-list",
+            "get",
+            reverse("recipe:recipe-list"),
+            {"data": {"tags": f"{tags[0].id},{tags[1].id}", "tags_mode": "all"}},
+        ),
+        (
+            "list_sparse",
+            "recipe-list",
+            "get",
+            reverse("recipe:recipe-list"),
+            {"data": {"fields": "id,title", "expand": ""}},
+        ),
+        ("detail", "recipe-detail", "get", detail, {}),
+        (
+            "search",
+            "recipe-search",
+            "get",
+            reverse("recipe:recipe-search"),
+            {"data": {"q": "spicy curry"}},
+        ),
+        ("export", "recipe-export", "get", reverse("recipe:recipe-export"), {}),
+        ("tag_list", "tag-list", "get", reverse("recipe:tag-list"), {}),
+        (
+            "tag_assigned_only",
+            "tag-list",
+            "get",
+            reverse("recipe:tag-list"),
+            {"data": {"assigned_only": 1}},
+        ),
+        (
+            "ingredient_list",
+            "ingredient-list",
+            "get",
+            reverse("recipe:ingredient-list"),
+            {},
+        ),
+        (
+            "ingredient_autocomplete",
+            "ingredient-list",
+            "get",
+            reverse("recipe:ingredient-list"),
+            {"data": {"q": "sa"}},
+        ),
+        # writes
+        (
+            "create",
+            "recipe-list",
+            "post",
+            reverse("recipe:recipe-list"),
+            {"data": new_recipe, **json_body},
+        ),
+        ("update", "recipe-detail", "put", detail, {"data": new_recipe, **json_body}),
+        (
+            "partial_update",
+            "recipe-detail",
+            "patch",
+            detail,
+            {"data": {"title": "Renamed stew"}, **json_body},
+        ),
+        ("delete", "recipe-detail", "delete", detail, {}),
+        (
+            "batch_update",
+            "recipe-batch",
+            "patch",
+            reverse("recipe:recipe-batch"),
+            {
+                "data": [{"id": r.id, "time_minutes": 45} for r in recipes[:5]],
+                **json_body,
+            },
+        ),
+        (
+            "batch_delete",
+            "recipe-batch",
+            "delete",
+            f"{reverse('recipe:recipe-batch')}?ids={ids}",
+            {},
+        ),
+        (
+            "import",
+            "recipe-import",
+            "post",
+            reverse("recipe:recipe-import"),
+            {"data": ndjson, "content_type": "application/x-ndjson"},
+        ),
+        (
+            "upload_image",
+            "recipe-upload-image",
+            "post",
+            reverse("recipe:recipe-upload-image", args=[recipe.id]),
+            {"data": {"image": _image}, "format": "multipart"},
+        ),
+        (
+            "tag_update",
+            "tag-detail",
+            "put",
+            tag,
+            {"data": {"name": "Renamed"}, **json_body},
+        ),
+        (
+            "tag_partial_update",
+            "tag-detail",
+            "patch",
+            tag,
+            {"data": {"name": "Renamed"}, **json_body},
+        ),
+        ("tag_delete", "tag-detail", "delete", tag, {}),
+        (
+            "ingredient_update",
+            "ingredient-detail",
+            "put",
+            ingredient,
+            {"data": {"name": "Renamed"}, **json_body},
+        ),
+        (
+            "ingredient_partial_update",
+            "ingredient-detail",
+            "patch",
+            ingredient,
+            {"data": {"name": "Renamed"}, **json_body},
+        ),
+        ("ingredient_delete", "ingredient-detail", "delete", ingredient, {}),
+    ]
+
+
+def measure_endpoints(client, requests, iterations):
+    """Measure each of requests with client; return the results by label."""
+    results = {}
+    for label, route, method, url, kwargs in requests:
+
+        def send(method=method, url=url, kwargs=kwargs):
+            data = kwargs.get("data")
+            if isinstance(data, dict) and callable(data.get("image")):
+                # an upload is read once, so every request needs its own
+                kwargs = {**kwargs, "data": {**data, "image": data["image"]()}}
+            return getattr(client, method)(url, **kwargs)
+
+        results[label] = {
+            "route": route,
+            "method": method.upper(),
+            **measure_requests(
+                send, iterations, ENDPOINT_SECONDS, rollback=method != "get"
+            ),
+        }
+    return results
+
+
+@register("recipe_api")
+def recipe_api(iterations, size=100_000):
+    """Time every recipe endpoint for users with 10, 1k and size recipes."""
+    sizes = sorted({*(n for n in PROFILE_SIZES if n < size), size})
+    results = {}
+    # the views themselves are timed, not the response cache; uploads are
+    # written to a directory removed afterwards
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        ALLOWED_HOSTS=["testserver"],
+        RESPONSE_CACHE={"ENABLED": False},
+        MEDIA_ROOT=media_root,
+    ):
+        for recipes in sizes:
+            start = time.perf_counter()
+            user = seed_profile(recipes)
+            seconds = round(time.perf_counter() - start, 2)
+            client = APIClient(HTTP_ACCEPT_ENCODING="br, gzip")
+            client.credentials(
+                HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}"
+            )
+            results[f"recipes_{recipes}"] = {
+                "seed_seconds": seconds,
+                **measure_endpoints(client, recipe_requests(user), iterations),
+            }
+    return results
+
+
+def _sampling(middleware, setting, iterations, size, prefix):
+    """Time a recipe list page without middleware, and with it sampling none or all."""
+    user = seed_profile(size, prefix=prefix)
+    token = Token.objects.create(user=user).key
+    url = reverse("recipe:recipe-list")
+    cases = {
+        "no_middleware": {
+            "MIDDLEWARE": [m for m in settings.MIDDLEWARE if m != middleware]
+        },
+        "not_sampled": {setting: {"SAMPLE_RATE": 0.0}},
+        "sampled": {setting: {"SAMPLE_RATE": 1.0}},
+    }
+
+    results = {"recipes": size}
+    for name, overrides in cases.items():
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"], RESPONSE_CACHE={"ENABLED": False}, **overrides
+        ):
+            # a client loads the middleware on its first request, which also
+            # caches the token, so that one is not timed
+            client = APIClient(HTTP_AUTHORIZATION=f"Token {token}")
+            client.get(url)
+            results[name] = measure(lambda: client.get(url), iterations)
+    return results
+
+
+@register("request_metrics")
+def request_metrics(iterations, size=1000):
+    """Compare a recipe list page with request metrics off, unsampled and on."""
+    return _sampling(
+        "core.instrumentation.RequestMetricsMiddleware",
+        "REQUEST_METRICS",
+        iterations,
+        size,
+        prefix="bench-metrics",
+    )
+
+
+@register("query_detector")
+def query_detector(iterations, size=1000):
+    """Compare a recipe list page with its queries recorded or not."""
+    return _sampling(
+        "core.query_detector.QueryDetectorMiddleware",
+        "QUERY_DETECTOR",
+        iterations,
+        size,
+        prefix="bench-detector",
+    )
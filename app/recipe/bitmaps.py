@@ -0,0 +1,211 @@
+"""
+In-memory bitmap index of which recipes carry each tag and ingredient.
+
+Every user's recipes get a dense position, and each tag or ingredient
+keeps a Python int used as a bitset of those positions. "All of" filters
+become a bitwise AND and "exclude" filters an AND NOT, computed in
+microseconds instead of a GROUP BY/HAVING or anti-join in the database.
+
+Indexes are built lazily per user and kept in an LRU for TTL seconds. An
+index is never changed once built, so threads can read it freely, and it
+only answers for the recipes it knows: those no newer than its newest
+recipe and not updated since the build started. Any change to a recipe or
+its links bumps its updated_at (see recipe/signals.py and recipe/batch.py),
+so recipes created or changed since, in this worker or another, are found
+and matched in SQL first, in a query on the (user, id) and (user, updated_at)
+indexes that finds none most of the time.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache import LRUCache
+from core.models import Recipe
+from recipe.filters import recipe_matches
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_USERS": 256,
+    "TTL": 30,
+}
+
+RELATIONS = ("tags", "ingredients")
+
+# byte value -> positions of its set bits, to turn a bitset back into ids
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def bits_from_positions(positions):
+    """Return an int with the bits at positions set."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def positions_from_bits(bits):
+    """Yield the positions of the set bits of bits, lowest first."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class UserRecipeIndex:
+    """Bitsets of one user's recipes per tag and per ingredient."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.recipe_ids = []
+        self.positions = {}
+        self.live = 0
+        self.relations = {relation: {} for relation in RELATIONS}
+        # the newest recipe the index knows of and when its build started
+        self.max_id = 0
+        self.snapshot = None
+
+    @classmethod
+    def build(cls, user_id):
+        """Load the index for user_id from the database."""
+        index = cls(user_id)
+        # taken before the reads: a change stamped earlier than the newest
+        # updated_at read may still commit after them
+        index.snapshot = timezone.now()
+        recipes = Recipe.objects.filter(user_id=user_id).order_by("id")
+        for recipe_id in recipes.values_list("id", flat=True):
+            index.positions[recipe_id] = len(index.recipe_ids)
+            index.recipe_ids.append(recipe_id)
+        if index.recipe_ids:
+            index.max_id = index.recipe_ids[-1]
+        index.live = (1 << len(index.recipe_ids)) - 1
+
+        for relation in RELATIONS:
+            field = Recipe._meta.get_field(relation)
+            recipe_column = field.m2m_field_name()
+            target_column = f"{field.m2m_reverse_field_name()}_id"
+            links = field.remote_field.through.objects.filter(
+                **{f"{recipe_column}__user_id": user_id}
+            ).values_list(f"{recipe_column}_id", target_column)
+
+            positions = {}
+            for recipe_id, target_id in links.iterator():
+                # created after the recipes were read: matched in SQL
+                position = index.positions.get(recipe_id)
+                if position is not None:
+                    positions.setdefault(target_id, []).append(position)
+            index.relations[relation] = {
+                target_id: bits_from_positions(target_positions)
+                for target_id, target_positions in positions.items()
+            }
+        return index
+
+    def match(self, relation, target_ids, mode):
+        """Return the bitset of recipes matching target_ids in mode.
+
+        mode is "any" (carries at least one), "all" (carries every one) or
+        "exclude" (carries none).
+        """
+        bitsets = self.relations[relation]
+        if mode == "all":
+            bits = self.live
+            for target_id in target_ids:
+                bits &= bitsets.get(target_id, 0)
+            return bits
+
+        bits = 0
+        for target_id in target_ids:
+            bits |= bitsets.get(target_id, 0)
+        if mode == "exclude":
+            return self.live & ~bits
+        return self.live & bits
+
+    def recipe_ids_for(self, bits):
+        """Return the ids of the recipes set in bits."""
+        return [self.recipe_ids[position] for position in positions_from_bits(bits)]
+
+    def changed_since_built(self, queryset, filters):
+        """Return the ids of recipes in queryset changed since the build.
+
+        Each id maps to whether the recipe matches filters now, checked in
+        SQL: the index does not know its current links.
+        """
+        changed = Q(id__gt=self.max_id) | Q(updated_at__gte=self.snapshot)
+        queryset = queryset.order_by()
+        changed_ids = list(queryset.filter(changed).values_list("id", flat=True))
+        if not changed_ids:
+            return {}
+        matching = set(
+            queryset.filter(recipe_matches(filters), id__in=changed_ids).values_list(
+                "id", flat=True
+            )
+        )
+        return {recipe_id: recipe_id in matching for recipe_id in changed_ids}
+
+    def filter(self, queryset, filters):
+        """Narrow queryset to recipes matching every (relation, ids, mode)."""
+        bits = self.live
+        for relation, target_ids, mode in filters:
+            bits &= self.match(relation, target_ids, mode)
+        changed = self.changed_since_built(queryset, filters)
+        now_matching = [recipe_id for recipe_id, match in changed.items() if match]
+
+        matching = bits.bit_count()
+        if matching <= self.live.bit_count() - matching:
+            ids = [r for r in self.recipe_ids_for(bits) if r not in changed]
+            return queryset.filter(id__in=ids + now_matching)
+        # keep the id list short: list the user's recipes that do not match
+        ids = [r for r in self.recipe_ids_for(self.live & ~bits) if r not in changed]
+        not_matching = [recipe_id for recipe_id, match in changed.items() if not match]
+        return queryset.exclude(id__in=ids + not_matching)
+
+
+class RecipeIndexCache:
+    """Per-user UserRecipeIndex objects, built on demand."""
+
+    def __init__(self):
+        options = {**DEFAULTS, **getattr(settings, "RECIPE_BITMAP_INDEX", {})}
+        self.enabled = options["ENABLED"]
+        self.local = LRUCache(options["MAX_USERS"], options["TTL"])
+
+    def get(self, user_id):
+        """Return an index of user_id's recipes at most TTL seconds old."""
+        index = self.local.get(user_id)
+        if index is None:
+            index = UserRecipeIndex.build(user_id)
+            self.local.set(user_id, index)
+        return index
+
+    def clear(self):
+        """Drop every index."""
+        self.local.clear()
+
+
+_cache = None
+
+
+def get_recipe_index():
+    """Return the process wide index cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = RecipeIndexCache()
+    return _cache
+
+
+def reset_recipe_index():
+    """Discard the index cache so settings are re-read on next use."""
+    global _cache
+    _cache = None
+
+
+def filter_recipes(queryset, user_id, filters):
+    """Apply (relation, ids, mode) filters using the index or, if disabled, SQL."""
+    index_cache = get_recipe_index()
+    if index_cache.enabled:
+        return index_cache.get(user_id).filter(queryset, filters)
+    return queryset.filter(recipe_matches(filters))
@@ -0,0 +1,134 @@
+"""
+Conditional GET support for the recipe APIs.
+
+List and detail responses carry an ETag and a Last-Modified header built
+from cheap aggregates (max(updated_at) and count(*)) rather than from the
+response body, so a client repeating a request with If-None-Match or
+If-Modified-Since gets a 304 before anything is fetched or serialized.
+
+The count in the ETag is what reveals deletions; a client sending only
+If-Modified-Since will not notice a deleted row until something else
+changes, as Last-Modified can only move forward.
+"""
+
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core.version import code_version
+
+# what the list validators are built from
+STATE = {"last": Max("updated_at"), "count": Count("pk")}
+
+
+def make_etag(request, *parts):
+    """Return a strong ETag for the response to request in the given state."""
+    query = sorted(request.query_params.lists())
+    key = [
+        code_version(),
+        request.user.pk,
+        request.path,
+        query,
+        # the browsable API and JSON renderings of the same data differ
+        request.META.get("HTTP_ACCEPT", ""),
+        *parts,
+    ]
+    return '"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """Answer list with 304 when the client's copy is current."""
+
+    def get_validator_querysets(self):
+        """Return the querysets whose state the list response depends on."""
+        return [self.filter_queryset(self.get_queryset())]
+
+    def _not_modified(self, request, last_modified, *parts):
+        """Return a 304 response if the client's copy is current, else None."""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        etag = make_etag(request, last_modified, *parts)
+        self._validators = (etag, timestamp)
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def _list_not_modified(self, request, state):
+        """Return a 304 response if the client's list is current, else None."""
+        changes = [s["last"] for s in state if s["last"]]
+        last_modified = max(changes) if changes else None
+
+        counts = [(s["last"], s["count"]) for s in state]
+        return self._not_modified(request, last_modified, "list", counts)
+
+    def list(self, request, *args, **kwargs):
+        """List objects unless the client already has this list."""
+        state = [
+            # drop ordering and prefetching, only the aggregate is needed
+            queryset.order_by().prefetch_related(None).aggregate(**STATE)
+            for queryset in self.get_validator_querysets()
+        ]
+        response = self._list_not_modified(request, state)
+        if response is not None:
+            return response
+        return super().list(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        """list() with the async ORM."""
+        querysets = await sync_to_async(self.get_validator_querysets)()
+        state = [
+            await queryset.order_by().prefetch_related(None).aaggregate(**STATE)
+            for queryset in querysets
+        ]
+        response = self._list_not_modified(request, state)
+        if response is not None:
+            return response
+        return await super().alist(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Add the validators to 200 and 304 responses."""
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, "_validators", None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            # per-user data: caches may keep it but must check back first
+            response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+# apart from ConditionalGetMixin, as a retrieve() there would give the
+# router a detail GET route on views that have none
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    """Answer retrieve with 304 as well, for views with a detail GET."""
+
+    def _updated_at(self, queryset):
+        """Return the updated_at of the requested object, as a queryset."""
+        lookup_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            queryset.prefetch_related(None)
+            .filter(**{self.lookup_field: self.kwargs[lookup_kwarg]})
+            .values_list("updated_at", flat=True)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return one object unless the client already has this version."""
+        last_modified = self._updated_at(self.get_queryset()).first()
+        # a missing object falls through to the usual 404
+        if last_modified is not None:
+            response = self._not_modified(request, last_modified, "detail")
+            if response is not None:
+                return response
+        return super().retrieve(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """retrieve() with the async ORM."""
+        queryset = await self.aget_queryset()
+        last_modified = await self._updated_at(queryset).afirst()
+        if last_modified is not None:
+            response = self._not_modified(request, last_modified, "detail")
+            if response is not None:
+                return response
+        return await super().aretrieve(request, *args, **kwargs)
@@ -0,0 +1,230 @@
+"""
+Read-only serializers rendering values() rows for the list endpoints.
+
+A ModelSerializer renders every row of a list field by field, and every
+tag and ingredient through a nested serializer of its own, which is where
+most of the time of a recipe list goes. The lists only read, so
+ValuesSerializer fetches the rows with values(), the related objects of a
+page with one values() query per relation, and builds the response dicts
+directly.
+
+The plan of what to render comes from the serializer the view would have
+used, so the fields, their order and the fields= / expand= narrowing stay
+those of the serializer. The output must be identical to the serializer's
+(the parity tests compare the rendered bytes); a field type this module
+does not know how to render from a column raises ImproperlyConfigured
+rather than being rendered differently.
+"""
+
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from core.instrumentation import serializer_time
+from recipe.serializers import ImageVariantsField
+
+# fields whose to_representation returns the column value unchanged
+PLAIN_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ChoiceField,
+)
+
+
+def _file_url(field, storage):
+    """Return a function rendering a stored file name like field does."""
+    use_url = getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+    request = field.context.get("request")
+
+    def render(name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return render
+
+
+class ValuesSerializer:
+    """Render values() rows the way serializer renders model instances."""
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        # columns fetched with values(), rendered or needed to render
+        self.columns = ["id"]
+        # (name, function of the column value or None), in output order
+        self.fields = []
+        # relation name: ValuesSerializer of its objects, or None for IDs
+        self.relations = {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source != name:
+                raise ImproperlyConfigured(f"{name} is not rendered from a column.")
+            if isinstance(field, serializers.ListSerializer):
+                self.relations[name] = ValuesSerializer(field.child)
+                self.fields.append((name, None))
+            elif isinstance(field, serializers.ManyRelatedField):
+                self.relations[name] = None
+                self.fields.append((name, None))
+            else:
+                self.fields.append((name, self._converter(name, field)))
+                if name not in self.columns:
+                    self.columns.append(name)
+
+    def _converter(self, name, field):
+        """Return the function rendering a column value like field does."""
+        if isinstance(field, PLAIN_FIELDS):
+            return None
+        if isinstance(field, serializers.FloatField):
+            return float
+        if isinstance(field, (serializers.DecimalField, ImageVariantsField)):
+            return field.to_representation
+        if isinstance(field, serializers.FileField):
+            return _file_url(field, self.model._meta.get_field(name).storage)
+        raise ImproperlyConfigured(
+            f"Cannot render {name} ({type(field).__name__}) from values()."
+        )
+
+    def setup_queryset(self, queryset, *columns):
+        """Return queryset as values() rows with the columns to render."""
+        # values() replaces only()/defer() and select_related on its own
+        extra = [column for column in columns if column not in self.columns]
+        return queryset.prefetch_related(None).values(*self.columns, *extra)
+
+    def _related_rows(self, name, child, ids):
+        """Return the values_list() rows of relation name for the owners ids."""
+        field = self.model._meta.get_field(name)
+        owner = field.related_query_name()
+        # in the prefetch's order (see related_in_order) within each owner
+        queryset = field.related_model.objects.filter(**{f"{owner}__in": ids}).order_by(
+            owner, "pk"
+        )
+        if child is None:
+            return queryset.values_list(owner, "pk")
+        return queryset.values_list(owner, *child.columns)
+
+    def _group(self, child, rows):
+        """Return the rendered objects of the related rows by owner id."""
+        by_owner = defaultdict(list)
+        if child is None:
+            for owner_id, pk in rows:
+                by_owner[owner_id].append(pk)
+        else:
+            for owner_id, *values in rows:
+                row = dict(zip(child.columns, values))
+                by_owner[owner_id].append(child.to_representation(row))
+        return by_owner
+
+    def to_representation(self, row, related=None):
+        """Return the representation of one row."""
+        data = {}
+        for name, convert in self.fields:
+            if name in self.relations:
+                data[name] = related[name].get(row["id"], [])
+                continue
+            value = row[name]
+            # like Serializer, None is rendered without the field
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def render(self, rows):
+        """Return the representations of rows, like serializer.data."""
+        rows = list(rows)
+        ids = [row["id"] for row in rows]
+        related = {}
+        if ids:
+            for name, child in self.relations.items():
+                queryset = self._related_rows(name, child, ids)
+                # fetched first, so the query is not counted as rendering
+                related_rows = list(queryset)
+                with serializer_time():
+                    related[name] = self._group(child, related_rows)
+        with serializer_time():
+            return [self.to_representation(row, related) for row in rows]
+
+    async def arender(self, rows):
+        """render() with the async ORM; rows is a list or a queryset."""
+        if hasattr(rows, "__aiter__"):
+            rows = [row async for row in rows]
+        ids = [row["id"] for row in rows]
+        related = {}
+        if ids:
+            for name, child in self.relations.items():
+                queryset = self._related_rows(name, child, ids)
+                related_rows = [row async for row in queryset]
+                with serializer_time():
+                    related[name] = self._group(child, related_rows)
+        with serializer_time():
+            return [self.to_representation(row, related) for row in rows]
+
+
+class ValuesListMixin:
+    """List with a ValuesSerializer built from the view's serializer."""
+
+    def get_values_serializer(self):
+        """Return the ValuesSerializer to list with, or None for the serializer."""
+        return ValuesSerializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        """List objects from values() rows."""
+        return self.list_values(self.filter_queryset(self.get_queryset()))
+
+    async def alist(self, request, *args, **kwargs):
+        """list() with the async ORM."""
+        queryset = await self.aget_queryset()
+        return await self.alist_values(self.filter_queryset(queryset))
+
+    def _setup_values(self, values_serializer, queryset):
+        """Return queryset as the rows values_serializer renders, if any."""
+        if values_serializer is None:
+            return queryset
+        # the cursor paginator reads its position from the rows
+        ordering = getattr(self.paginator, "ordering", None) or []
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        columns = [column.lstrip("-") for column in ordering]
+        return values_serializer.setup_queryset(queryset, *columns)
+
+    def _list_response(self, page, data):
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def list_values(self, queryset):
+        """Return the (paginated) list response for queryset."""
+        values_serializer = self.get_values_serializer()
+        queryset = self._setup_values(values_serializer, queryset)
+
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        if values_serializer is not None:
+            data = values_serializer.render(rows)
+        else:
+            data = self.get_serializer(rows, many=True).data
+        return self._list_response(page, data)
+
+    async def alist_values(self, queryset):
+        """list_values() with the async ORM."""
+        values_serializer = self.get_values_serializer()
+        queryset = self._setup_values(values_serializer, queryset)
+
+        # DRF's paginators (and autocomplete) only read synchronously
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        rows = queryset if page is None else page
+        if values_serializer is not None:
+            data = await values_serializer.arender(rows)
+        else:
+            if page is None:
+                # the serializer would read the queryset synchronously
+                rows = [obj async for obj in rows]
+            data = self.get_serializer(rows, many=True).data
+        return self._list_response(page, data)
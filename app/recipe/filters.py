@@ -0,0 +1,61 @@
+"""Query filters for the recipe APIs.
+
+Filtering through a many-to-many join returns a recipe once per matching
+row and needs DISTINCT to undo that. These filters use EXISTS subqueries
+(semi-joins) instead, which return each row at most once and let the
+planner stop at the first matching link.
+"""
+
+from django.db.models import Exists, OuterRef, Q
+
+from core.models import Recipe
+
+
+def _relation(name):
+    """Return the through model and its two column names for a relation."""
+    field = Recipe._meta.get_field(name)
+    return (
+        field.remote_field.through,
+        field.m2m_field_name(),
+        field.m2m_reverse_field_name(),
+    )
+
+
+def recipe_linked_to(relation, ids):
+    """Match recipes linked to any of ids through relation ("tags", ...)."""
+    through, recipe_column, target_column = _relation(relation)
+    return Exists(
+        through.objects.filter(
+            **{recipe_column: OuterRef("pk"), f"{target_column}__in": ids}
+        )
+    )
+
+
+def recipe_linked_to_all(relation, ids):
+    """Match recipes linked to every one of ids through relation."""
+    query = Q()
+    for target_id in set(ids):
+        query &= recipe_linked_to(relation, [target_id])
+    return query
+
+
+def recipe_matches(filters):
+    """Match recipes meeting every (relation, ids, mode) filter.
+
+    mode is "any" (linked to one of ids), "all" or "exclude" (to none).
+    """
+    query = Q()
+    for relation, ids, mode in filters:
+        if mode == "all":
+            query &= recipe_linked_to_all(relation, ids)
+        elif mode == "exclude":
+            query &= ~recipe_linked_to(relation, ids)
+        else:
+            query &= recipe_linked_to(relation, ids)
+    return query
+
+
+def used_by_recipes(relation):
+    """Match tags or ingredients linked to at least one recipe."""
+    through, _, target_column = _relation(relation)
+    return Exists(through.objects.filter(**{target_column: OuterRef("pk")}))
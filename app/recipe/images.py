@@ -0,0 +1,99 @@
+"""Resizing and re-encoding of recipe images."""
+
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.core.files.base import ContentFile
+
+from core.storage import is_content_addressed
+
+# formats accepted for upload, as reported by Pillow
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+# largest image (width * height) we are willing to decode
+MAX_PIXELS = 40_000_000
+# leading bytes that identify each accepted format
+SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+]
+# enough leading bytes to tell every format in SIGNATURES apart
+SIGNATURE_LENGTH = 12
+
+# name -> bounding box; images are scaled down to fit, never up
+VARIANTS = {
+    "thumbnail": (150, 150),
+    "card": (600, 600),
+    "full": (2048, 2048),
+}
+VARIANT_FORMAT = "JPEG"
+VARIANT_QUALITY = 85
+
+
+def sniff_format(head):
+    """Return the image format announced by the first bytes, or None."""
+    # WEBP is a RIFF container: "RIFF" <size> "WEBP"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def variant_path(image_name, variant):
+    """Return the storage path of a variant of image_name."""
+    stem = os.path.splitext(image_name)[0]
+    return f"{stem}/{variant}.jpg"
+
+
+def render_variants(image_file):
+    """Return name -> JPEG bytes for every variant of image_file.
+
+    The image is rotated according to its EXIF orientation and then
+    re-encoded from pixel data only, so no EXIF (camera, GPS...) is kept.
+    """
+    with Image.open(image_file) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode != "RGB":
+            source = source.convert("RGB")
+
+        rendered = {}
+        for name, size in VARIANTS.items():
+            image = source.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            image.save(
+                buffer,
+                format=VARIANT_FORMAT,
+                quality=VARIANT_QUALITY,
+                optimize=True,
+                progressive=True,
+            )
+            rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def create_variants(recipe):
+    """Write the variants of recipe.image to storage and return their paths."""
+    storage = recipe.image.storage
+    paths = {name: variant_path(recipe.image.name, name) for name in VARIANTS}
+    if is_content_addressed(recipe.image.name) and all(
+        storage.exists(path) for path in paths.values()
+    ):
+        # identical originals give identical variants, reuse the stored ones
+        return paths
+
+    with recipe.image.open("rb") as image_file:
+        rendered = render_variants(image_file)
+
+    for name, content in rendered.items():
+        path = paths[name]
+        # regenerating replaces the previous file instead of adding a suffix
+        if storage.exists(path):
+            storage.delete(path)
+        paths[name] = storage.save(path, ContentFile(content))
+    return paths
@@ -0,0 +1,30 @@
+"""Pagination for the recipe APIs."""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+# cursor (keyset) pagination filters on the ordering column instead of
+# using OFFSET, so fetching a deep page costs the same as fetching page one.
+class RecipeCursorPagination(CursorPagination):
+    """Paginate recipes newest first."""
+
+    ordering = "-id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Paginate tags and ingredients by name."""
+
+    ordering = "-name"
+
+
+# ranked search results have no column to keep a cursor on; people rarely
+# look past the first few pages of them, so OFFSET stays cheap
+class RecipeSearchPagination(PageNumberPagination):
+    """Paginate search results by page number, best match first."""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
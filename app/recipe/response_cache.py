@@ -0,0 +1,128 @@
+"""
+Per-user cache of the recipe, tag and ingredient list responses.
+
+A list response (the serialized page) is stored in the RESPONSE_CACHE
+alias of CACHES under the list's ETag. ConditionalGetMixin computes that
+ETag from the current state of the data (max(updated_at) and count(*))
+before the list is built, and it covers the user, the path, the query
+parameters and the code version too, so an entry is only ever found while
+the data it shows is unchanged. Image URLs in a page are absolute, so the
+key also holds the scheme and host the page was requested on. Every change, made in this worker or
+another, moves the ETag on and old entries simply expire; the per-worker
+local-memory default is as correct as a shared backend, it just hits less.
+
+A hit still costs the aggregate query, but not the page, its prefetches
+or the serializer.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "TTL": 60,
+}
+
+
+def get_options():
+    """Return the RESPONSE_CACHE settings merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, "RESPONSE_CACHE", {})}
+
+
+class CacheStats:
+    """Thread-safe hit and miss counters of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Set every counter back to zero."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def count(self, name):
+        """Add one to the named counter."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        """Return the current counters as a dict."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+stats = CacheStats()
+
+
+class ResponseCacheMixin:
+    """Serve list responses from the per-user response cache.
+
+    Must come after ConditionalGetMixin in the bases, which sets the ETag
+    (and answers 304) before list() gets here.
+    """
+
+    def _response_cache_key(self):
+        validators = getattr(self, "_validators", None)
+        if validators is None:
+            return None
+        etag = validators[0].strip('"')
+        origin = f"{self.request.scheme}://{self.request.get_host()}"
+        return f"response:{self.request.user.pk}:{self.basename}:{origin}:{etag}"
+
+    def _cached_response(self, data):
+        stats.count("hits")
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    def _cache_entry(self, response):
+        """Return what to cache of a freshly built response, or None."""
+        if response.status_code == 200 and isinstance(response, Response):
+            return response.data
+        return None
+
+    def list(self, request, *args, **kwargs):
+        """Return the cached list response, or build and cache it."""
+        options = get_options()
+        key = self._response_cache_key()
+        if not options["ENABLED"] or key is None:
+            return super().list(request, *args, **kwargs)
+
+        cache = caches[options["ALIAS"]]
+        data = cache.get(key)
+        if data is not None:
+            return self._cached_response(data)
+
+        stats.count("misses")
+        response = super().list(request, *args, **kwargs)
+        entry = self._cache_entry(response)
+        if entry is not None:
+            cache.set(key, entry, options["TTL"])
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        """list() with the cache's async methods."""
+        options = get_options()
+        key = self._response_cache_key()
+        if not options["ENABLED"] or key is None:
+            return await super().alist(request, *args, **kwargs)
+
+        cache = caches[options["ALIAS"]]
+        data = await cache.aget(key)
+        if data is not None:
+            return self._cached_response(data)
+
+        stats.count("misses")
+        response = await super().alist(request, *args, **kwargs)
+        entry = self._cache_entry(response)
+        if entry is not None:
+            await cache.aset(key, entry, options["TTL"])
+        response["X-Cache"] = "MISS"
+        return response
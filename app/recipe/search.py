@@ -0,0 +1,24 @@
+"""
+Full-text search over recipes.
+
+Each recipe has a tsvector in RecipeSearchDocument, kept current by database
+triggers and covered by a GIN index. Title words weigh most, then tag and
+ingredient names, then the description.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+# text search configuration the triggers build the vectors with
+SEARCH_CONFIG = "english"
+
+
+def search_recipes(queryset, text):
+    """Narrow queryset to recipes matching text, best match first."""
+    # websearch syntax: "quoted phrases", -excluded words and "or"
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    return (
+        queryset.filter(search_document__vector=query)
+        .annotate(rank=SearchRank(F("search_document__vector"), query))
+        .order_by("-rank", "-id")
+    )
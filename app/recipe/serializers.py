@@ -1,10 +1,152 @@
 """Serliazers for recipe APIs."""
 
+from django.db import transaction
+from django.db.models import Prefetch
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from core.instrumentation import TimedSerializerMixin
 from core.models import Recipe, Tag, Ingredient
+from recipe import images
 
 
-class IngredientSerialzier(serializers.ModelSerializer):
+def related_in_order(model, name):
+    """Return the objects of relation name in the order lists render them."""
+    # the related models have no Meta.ordering; without one the order of
+    # the prefetched rows would be up to the query plan
+    return model._meta.get_field(name).related_model.objects.order_by("pk")
+
+
+class EagerLoadingMixin:
+    """Declare the relations a serializer renders so views can preload them."""
+
+    # forward foreign keys fetched with a join in the main query
+    select_related_fields = []
+    # many-to-many relations fetched with one extra query each
+    prefetch_related_fields = []
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Apply select_related and prefetch lookups for this serializer."""
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            model = queryset.model
+            queryset = queryset.prefetch_related(
+                *[
+                    Prefetch(field, related_in_order(model, field))
+                    for field in cls.prefetch_related_fields
+                ]
+            )
+        return queryset
+
+
+class SparseFieldsMixin(EagerLoadingMixin):
+    """Render only the requested fields and expand only the requested relations.
+
+    fields=None renders every field but optional_fields; expand=None renders
+    every prefetched relation as nested objects, others render their IDs.
+    """
+
+    # fields only rendered when asked for by name
+    optional_fields = []
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.selected_fields(fields)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+        for name in self.collapsed_relations(selected, expand):
+            self.fields[name] = serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True
+            )
+
+    @classmethod
+    def selected_fields(cls, fields=None):
+        """Return the names of the fields rendered for a fields selection."""
+        if fields is None:
+            return [name for name in cls.Meta.fields if name not in cls.optional_fields]
+        return [name for name in cls.Meta.fields if name in fields]
+
+    @classmethod
+    def collapsed_relations(cls, selected, expand=None):
+        """Return the selected relations rendered as IDs only."""
+        if expand is None:
+            return []
+        return [
+            name
+            for name in cls.prefetch_related_fields
+            if name in selected and name not in expand
+        ]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=None):
+        """Load only the columns and relations the selected fields render."""
+        model = cls.Meta.model
+        selected = cls.selected_fields(fields)
+        columns = {field.name for field in model._meta.concrete_fields}
+        if fields is not None:
+            queryset = queryset.only(*[name for name in selected if name in columns])
+        else:
+            # e.g. a long description nobody asked for
+            skipped = [name for name in cls.optional_fields if name in columns]
+            if skipped:
+                queryset = queryset.defer(*skipped)
+
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        collapsed = cls.collapsed_relations(selected, expand)
+        prefetches = []
+        for name in cls.prefetch_related_fields:
+            if name not in selected:
+                continue
+            related = related_in_order(model, name)
+            if name in collapsed:
+                # only the IDs are rendered
+                related = related.only("id")
+            prefetches.append(Prefetch(name, related))
+        return queryset.prefetch_related(*prefetches)
+
+
+@extend_schema_field(
+    {"type": "object", "additionalProperties": {"type": "string", "format": "uri"}}
+)
+class ImageVariantsField(serializers.Field):
+    """Render stored image variant paths as URLs, like ImageField does."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Recipe._meta.get_field("image").storage
+        request = self.context.get("request")
+        urls = {}
+        for name, path in value.items():
+            url = storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class BaseRecipeAttrSerializer(
+    TimedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
+    """Base serializer for recipe attributes."""
+
+    def validate_name(self, value):
+        """Reject renaming to a name the user already has."""
+        # nested in a recipe, existing names are reused instead
+        if isinstance(self.instance, self.Meta.model):
+            model = self.Meta.model
+            clash = model.objects.filter(user=self.instance.user_id, name=value)
+            if clash.exclude(id=self.instance.id).exists():
+                raise serializers.ValidationError(
+                    f"You already have a {model._meta.verbose_name} with this name."
+                )
+        return value
+
+
+class IngredientSerialzier(BaseRecipeAttrSerializer):
     """Serializers for ingredients."""
 
     class Meta:
@@ -13,7 +155,7 @@ class IngredientSerialzier(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(BaseRecipeAttrSerializer):
     """Serializer for Tags."""
 
     class Meta:
@@ -22,11 +164,40 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+def get_or_create_attrs(model, user, names):
+    """Return user's objects of model called names, creating missing ones."""
+    # de-duplicate while keeping the order the client sent
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+
+    existing = {
+        obj.name: obj for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in existing]
+    if missing:
+        # a concurrent request may create the same names first; skip
+        # those rows and read back whichever copy won
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        created = model.objects.filter(user=user, name__in=missing)
+        existing.update((obj.name, obj) for obj in created)
+    return [existing[name] for name in names]
+
+
+class RecipeSerializer(
+    TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer
+):
     """Serlializer for recipes."""
 
+    prefetch_related_fields = ["tags", "ingredients"]
+    optional_fields = ["description"]
+
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerialzier(many=True, required=False)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -39,29 +210,24 @@ class RecipeSerializer(serializers.ModelSerializer):
             "tags",
             "ingredients",
             "image",
+            "image_status",
+            "image_variants",
+            "description",
         ]
-        read_only_fields = ["id"]
+        read_only_fields = ["id", "image_status"]
+
+    def _get_or_create_attrs(self, model, items):
+        """Return the user's objects named in items, creating missing ones."""
+        names = [item["name"] for item in items]
+        return get_or_create_attrs(model, self.context["request"].user, names)
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, ingredients):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        return self._get_or_create_attrs(Ingredient, ingredients)
 
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         """Handle getting or creating tags as needed."""
-        # bcz we're inside serializer
-        auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        return self._get_or_create_attrs(Tag, tags)
 
     # by default nested serializer are read only ,
     # so we have to manually define create method
@@ -70,43 +236,124 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop("tags", [])
         ingredients = validated_data.pop("ingredients", [])
 
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_ingredients(ingredients, recipe)
-        self._get_or_create_tags(tags, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
+            recipe.tags.add(*self._get_or_create_tags(tags))
         return recipe
 
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+        with transaction.atomic():
+            # set() diffs against the current relations, so only the
+            # removed and added rows of the through table are touched
+            if tags is not None:
+                instance.tags.set(self._get_or_create_tags(tags))
 
-        for attr, value in validated_data.items():
-            # it takes the instance and assigns the value provided here
-            setattr(instance, attr, value)
+            if ingredients is not None:
+                instance.ingredients.set(self._get_or_create_ingredients(ingredients))
 
-        instance.save()
+            for attr, value in validated_data.items():
+                # it takes the instance and assigns the value provided here
+                setattr(instance, attr, value)
+
+            instance.save()
         return instance
 
 
+class RecipeSearchSerializer(RecipeSerializer):
+    """Serializer for recipe search results."""
+
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ["rank"]
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
 
+    optional_fields = []
+
+
+class RecipeTransferSerializer(RecipeSerializer):
+    """Serializer for recipes in bulk imports and exports."""
+
+    optional_fields = []
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description"]
+        fields = [
+            "id",
+            "title",
+            "description",
+            "time_minutes",
+            "price",
+            "link",
+            "tags",
+            "ingredients",
+        ]
+        # the column is NOT NULL, and one missing price would fail a batch
+        extra_kwargs = {"price": {"required": True}}
+
 
+class RecipeBatchUpdateSerializer(RecipeTransferSerializer):
+    """Serializer for one item of a batch update."""
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(min_value=1)
+
+
+class RecipeBatchResultSerializer(serializers.Serializer):
+    """Serializer for the outcome of one item of a batch."""
+
+    id = serializers.IntegerField(allow_null=True)
+    status = serializers.IntegerField()
+    errors = serializers.JSONField(required=False)
+
+
+class RecipeBatchResponseSerializer(serializers.Serializer):
+    """Serializer for the outcome of a batch update or delete."""
+
+    results = RecipeBatchResultSerializer(many=True)
+
+
+class RecipeImportErrorSerializer(serializers.Serializer):
+    """Serializer for the validation errors of one imported record."""
+
+    index = serializers.IntegerField()
+    errors = serializers.JSONField()
+
+
+class RecipeImportResultSerializer(serializers.Serializer):
+    """Serializer for the outcome of a bulk recipe import."""
+
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = RecipeImportErrorSerializer(many=True)
+    detail = serializers.CharField(required=False)
+
+
+class RecipeImageSerializer(
+    TimedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
     """Serializers for uplaoding image to recipes."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
-        read_only_fields = ["id"]
+        fields = ["id", "image", "image_status", "image_variants"]
+        read_only_fields = ["id", "image_status"]
         extra_kwargs = {"image": {"required": "True"}}
+
+    def validate_image(self, value):
+        """Only accept supported formats of a reasonable size."""
+        # ImageField has already opened the upload with Pillow
+        image = getattr(value, "image", None)
+        if image is None or image.format not in images.ALLOWED_FORMATS:
+            raise serializers.ValidationError("Upload a JPEG, PNG, WEBP or GIF image.")
+        if image.width * image.height > images.MAX_PIXELS:
+            raise serializers.ValidationError("Image dimensions are too large.")
+        return value
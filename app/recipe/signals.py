@@ -0,0 +1,100 @@
+"""Signal handlers for the recipe app."""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Ingredient, MediaFile, Recipe, Tag
+
+
+def _image_name(value):
+    """Return the file name stored in an image field value."""
+    return getattr(value, "name", value) or ""
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    """Remember which image file the recipe was loaded with."""
+    # read the raw value to avoid building a FieldFile for every recipe;
+    # None means the field was deferred and the old value is unknown
+    value = instance.__dict__.get("image")
+    instance._stored_image = None if value is None else _image_name(value)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def load_stored_image(sender, instance, **kwargs):
+    """Look up the stored image of a recipe loaded without it."""
+    if instance._stored_image is None:
+        stored = ""
+        if not instance._state.adding:
+            stored = (
+                Recipe.objects.filter(pk=instance.pk)
+                .values_list("image", flat=True)
+                .first()
+            )
+        instance._stored_image = stored or ""
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, **kwargs):
+    """Move the image reference from the old file to the new one."""
+    new = _image_name(instance.image)
+    old = instance._stored_image
+    if new == old:
+        return
+    if old:
+        MediaFile.objects.remove_reference(old)
+    if new:
+        MediaFile.objects.add_reference(new)
+    instance._stored_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_reference(sender, instance, **kwargs):
+    """Drop the reference a deleted recipe held on its image."""
+    if instance._stored_image:
+        MediaFile.objects.remove_reference(instance._stored_image)
+
+
+@receiver(pre_delete, sender=Recipe)
+def load_owner(sender, instance, **kwargs):
+    """Load the owner of a recipe fetched without it while the row exists."""
+    if "user_id" in instance.get_deferred_fields():
+        instance.refresh_from_db(fields=["user"])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_relinked_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump updated_at of recipes whose tags or ingredients changed."""
+    now = timezone.now()
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear") and pk_set != set():
+            Recipe.objects.filter(pk=instance.pk).update(updated_at=now)
+            instance.updated_at = now
+    elif action in ("post_add", "post_remove") and pk_set:
+        Recipe.objects.filter(pk__in=pk_set).update(updated_at=now)
+    elif action == "pre_clear":
+        # afterwards there is no telling which recipes were linked
+        relation = "tags" if sender is Recipe.tags.through else "ingredients"
+        Recipe.objects.filter(**{relation: instance}).update(updated_at=now)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_of_attr(sender, instance, created=False, **kwargs):
+    """Bump updated_at of recipes showing a renamed or deleted tag/ingredient."""
+    if created:
+        return
+    relation = "tags" if sender is Tag else "ingredients"
+    Recipe.objects.filter(**{relation: instance}).update(updated_at=timezone.now())
@@ -0,0 +1,113 @@
+"""Database-backed queue for recipe image processing.
+
+The upload request only stores the original file and queues a job; the
+`process_images` management command claims jobs and builds the variants.
+No broker is needed: PostgreSQL's SKIP LOCKED lets several workers poll
+the same table without picking up the same job.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import (
+    ImageProcessingJob,
+    Recipe,
+    IMAGE_STATUS_FAILED,
+    IMAGE_STATUS_PENDING,
+    IMAGE_STATUS_READY,
+)
+from recipe.images import create_variants
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# a running job not updated for this long is assumed to be from a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def enqueue_image_processing(recipe):
+    """Mark the recipe image as pending and queue a job to process it."""
+    with transaction.atomic():
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_status=IMAGE_STATUS_PENDING,
+            image_variants={},
+            updated_at=timezone.now(),
+        )
+        recipe.image_status = IMAGE_STATUS_PENDING
+        recipe.image_variants = {}
+        job, _ = ImageProcessingJob.objects.get_or_create(
+            recipe=recipe,
+            status=ImageProcessingJob.STATUS_PENDING,
+        )
+    return job
+
+
+def claim_job():
+    """Lock the oldest runnable job, mark it running and return it."""
+    pending = Q(status=ImageProcessingJob.STATUS_PENDING)
+    stale = Q(
+        status=ImageProcessingJob.STATUS_RUNNING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    )
+    with transaction.atomic():
+        job = (
+            ImageProcessingJob.objects.select_for_update(skip_locked=True)
+            .filter(pending | stale)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ImageProcessingJob.STATUS_RUNNING
+        job.attempts += 1
+        job.save(update_fields=["status", "attempts", "updated_at"])
+    return job
+
+
+def run_job(job):
+    """Build the variants for a claimed job and record the outcome."""
+    recipe = Recipe.objects.filter(pk=job.recipe_id).first()
+    if recipe is None or not recipe.image:
+        job.delete()
+        return
+
+    try:
+        variants = create_variants(recipe)
+    except Exception as exc:
+        logger.exception("Processing image for recipe %s failed", recipe.pk)
+        job.error = str(exc)
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = ImageProcessingJob.STATUS_FAILED
+            # a replacement image has its own job; leave its status alone
+            Recipe.objects.filter(pk=recipe.pk, image=recipe.image.name).update(
+                image_status=IMAGE_STATUS_FAILED, updated_at=timezone.now()
+            )
+        else:
+            job.status = ImageProcessingJob.STATUS_PENDING
+        job.save(update_fields=["status", "error", "updated_at"])
+        return
+
+    with transaction.atomic():
+        # only publish if the image was not replaced while we were working
+        Recipe.objects.filter(pk=recipe.pk, image=recipe.image.name).update(
+            image_status=IMAGE_STATUS_READY,
+            image_variants=variants,
+            updated_at=timezone.now(),
+        )
+        job.delete()
+
+
+def process_pending(limit=None):
+    """Run queued jobs until the queue is empty or limit is reached."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
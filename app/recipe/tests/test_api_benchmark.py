@@ -0,0 +1,99 @@
+"""Tests for the recipe API benchmark and its data generator."""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Recipe
+from core.query_detector import QueryBudgetMixin
+from recipe.benchmarks import (
+    INGREDIENTS_PER_RECIPE,
+    PROFILE_INGREDIENTS,
+    PROFILE_TAGS,
+    TAGS_PER_RECIPE,
+    seed_profile,
+)
+from recipe.urls import router
+
+
+def router_endpoints():
+    """Return the (route name, method) pairs of recipe/urls.py."""
+    endpoints = set()
+    for pattern in router.urls:
+        # the API root view maps no actions; it only answers GET
+        actions = getattr(pattern.callback, "actions", {"get": None})
+        # HEAD is answered by the GET handler
+        endpoints.update(
+            (pattern.name, method.upper()) for method in actions if method != "head"
+        )
+    return endpoints
+
+
+class SeedProfileTests(TestCase):
+    """Test the generated benchmark data."""
+
+    def _links(self, user):
+        return [
+            (
+                recipe.title,
+                sorted(t.name for t in recipe.tags.all()),
+                sorted(i.name for i in recipe.ingredients.all()),
+            )
+            for recipe in Recipe.objects.filter(user=user)
+            .prefetch_related("tags", "ingredients")
+            .order_by("id")
+        ]
+
+    def test_fan_out(self):
+        """Test every recipe links to a realistic number of tags and ingredients."""
+        user = seed_profile(30)
+
+        self.assertEqual(user.tag_set.count(), PROFILE_TAGS)
+        self.assertEqual(user.ingredient_set.count(), PROFILE_INGREDIENTS)
+        links = self._links(user)
+        self.assertEqual(len(links), 30)
+        for _, tags, ingredients in links:
+            fewest, most = TAGS_PER_RECIPE
+            self.assertTrue(fewest <= len(tags) <= most)
+            fewest, most = INGREDIENTS_PER_RECIPE
+            self.assertTrue(fewest <= len(ingredients) <= most)
+
+    def test_deterministic(self):
+        """Test the same data is generated every time."""
+        first = self._links(seed_profile(20, prefix="first"))
+        second = self._links(seed_profile(20, prefix="second"))
+
+        self.assertEqual(first, second)
+
+
+class RecipeAPIBenchmarkTests(QueryBudgetMixin, TestCase):
+    """Test the recipe_api benchmark scenario."""
+
+    # a full update relinks tags and ingredients, and each relink bumps the
+    # recipe's updated_at again
+    query_budget = 24
+    repeated_query_limit = 4
+
+    def test_every_endpoint(self):
+        """Test every route and method is measured and succeeds per profile."""
+        out = StringIO()
+
+        call_command(
+            "benchmark", "recipe_api", "--size=20", "--iterations=1", stdout=out
+        )
+
+        results = json.loads(out.getvalue())["recipe_api"]
+        self.assertEqual(list(results), ["recipes_10", "recipes_20"])
+        for profile in results.values():
+            endpoints = [r for r in profile.values() if isinstance(r, dict)]
+            self.assertEqual(
+                {(r["route"], r["method"]) for r in endpoints}, router_endpoints()
+            )
+            for result in endpoints:
+                self.assertLess(result["status"], 300, result)
+                for metric in ["p50_us", "p95_us", "p99_us", "peak_rss_kb"]:
+                    self.assertGreater(result[metric], 0)
+                self.assertIn("queries_per_request", result)
+                self.assertIn("bytes", result)
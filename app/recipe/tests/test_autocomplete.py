@@ -0,0 +1,219 @@
+"""Tests for tag and ingredient autocomplete."""
+
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin, query_budget
+from recipe.autocomplete import NameIndex, reset_name_index, trigrams
+
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def make_index(names):
+    """Return a NameIndex of names, with ids counting from 1."""
+    index = NameIndex(user_id=1)
+    for obj_id, name in enumerate(names, start=1):
+        index.add(obj_id, name)
+    return index
+
+
+class NameIndexTests(SimpleTestCase):
+    """Test matching names with the in-memory index."""
+
+    def test_trigrams_like_pg_trgm(self):
+        """Test trigrams pad each lowercased word like pg_trgm."""
+        self.assertEqual(trigrams("Cat!"), {"  c", " ca", "cat", "at "})
+
+    def test_prefix_before_word_prefix(self):
+        """Test names starting with the text rank before later words."""
+        index = make_index(["Red pepper", "Pepper", "Peppermint", "Paprika"])
+
+        self.assertEqual(index.search("pep", 10), [2, 3, 1])
+
+    def test_case_insensitive(self):
+        """Test matching ignores case."""
+        index = make_index(["Garlic"])
+
+        self.assertEqual(index.search("GAR", 10), [1])
+
+    def test_fuzzy_matches_typos(self):
+        """Test similar names are found after the prefix matches."""
+        index = make_index(["Tomato", "Potato", "Tomatillo"])
+
+        self.assertEqual(index.search("tomatto", 10)[0], 1)
+        self.assertNotIn(2, index.search("tomatto", 10))
+
+    def test_limit(self):
+        """Test at most limit ids are returned."""
+        index = make_index([f"Salt {i}" for i in range(20)])
+
+        self.assertEqual(len(index.search("salt", 5)), 5)
+
+
+class AutocompleteAPITests(QueryBudgetMixin, TestCase):
+    """Test the q filter of the tag and ingredient lists."""
+
+    def setUp(self):
+        reset_name_index()
+        self.addCleanup(reset_name_index)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _names(self, url, q, **params):
+        res = self.client.get(url, {"q": q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["next"])
+        return [item["name"] for item in res.data["results"]]
+
+    def test_autocomplete_ingredients(self):
+        """Test matching ingredients are returned best first."""
+        for name in ["Chicken breast", "Chickpeas", "Beef", "Smoked chicken"]:
+            Ingredient.objects.create(user=self.user, name=name)
+
+        names = self._names(INGREDIENTS_URL, "chick")
+
+        self.assertEqual(names, ["Chicken breast", "Chickpeas", "Smoked chicken"])
+
+    def test_limit(self):
+        """Test the number of results is limited."""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f"Quick {i}")
+
+        self.assertEqual(len(self._names(TAGS_URL, "qu", limit=2)), 2)
+
+    def test_invalid_limit_rejected(self):
+        """Test a limit out of range returns an error."""
+        for limit in ["0", "51", "ten"]:
+            with self.subTest(limit=limit):
+                res = self.client.get(TAGS_URL, {"q": "a", "limit": limit})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limited_to_user(self):
+        """Test other users' tags are never suggested."""
+        other = get_user_model().objects.create_user(email="other@example.com")
+        Tag.objects.create(user=other, name="Vegan")
+
+        self.assertEqual(self._names(TAGS_URL, "veg"), [])
+
+    def test_with_assigned_only(self):
+        """Test assigned_only still applies to the suggestions."""
+        used = Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Vegetarian")
+        recipe = Recipe.objects.create(
+            user=self.user, title="Stew", time_minutes=5, price=1
+        )
+        recipe.tags.add(used)
+
+        self.assertEqual(self._names(TAGS_URL, "veg", assigned_only=1), ["Vegan"])
+
+    def test_index_follows_changes(self):
+        """Test tags created, renamed and deleted after loading are seen."""
+        self.assertEqual(self._names(TAGS_URL, "veg"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.assertEqual(self._names(TAGS_URL, "veg"), ["Vegan"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = "Dessert"
+            tag.save()
+        self.assertEqual(self._names(TAGS_URL, "veg"), [])
+        self.assertEqual(self._names(TAGS_URL, "des"), ["Dessert"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual(self._names(TAGS_URL, "des"), [])
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_changes_made_elsewhere(self):
+        """Test names changed without this worker being told are seen."""
+        carrot = Ingredient.objects.create(user=self.user, name="Carrot")
+        Ingredient.objects.create(user=self.user, name="Cabbage")
+        self.assertEqual(self._names(INGREDIENTS_URL, "ca"), ["Cabbage", "Carrot"])
+
+        # update() and bulk_create() send no signals, like another worker
+        Ingredient.objects.filter(id=carrot.id).update(
+            name="Parsnip", updated_at=timezone.now()
+        )
+        Ingredient.objects.bulk_create(
+            [Ingredient(user=self.user, name=name) for name in ["Capers", "Pak choi"]]
+        )
+
+        self.assertEqual(self._names(INGREDIENTS_URL, "ca"), ["Cabbage", "Capers"])
+        self.assertEqual(self._names(INGREDIENTS_URL, "pa"), ["Pak choi", "Parsnip"])
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_rename_stamped_before_newest_name(self):
+        """Test a rename is seen though a name read has a later updated_at."""
+        carrot = Ingredient.objects.create(user=self.user, name="Carrot")
+        cabbage = Ingredient.objects.create(user=self.user, name="Cabbage")
+        # a worker whose clock runs ahead
+        Ingredient.objects.filter(id=cabbage.id).update(
+            updated_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self._names(INGREDIENTS_URL, "ca"), ["Cabbage", "Carrot"])
+
+        Ingredient.objects.filter(id=carrot.id).update(
+            name="Parsnip", updated_at=timezone.now()
+        )
+
+        self.assertEqual(self._names(INGREDIENTS_URL, "ca"), ["Cabbage"])
+        self.assertEqual(self._names(INGREDIENTS_URL, "pa"), ["Parsnip"])
+
+    def test_index_sees_tags_created_with_recipes(self):
+        """Test tags bulk created through a recipe are suggested."""
+        self.assertEqual(self._names(TAGS_URL, "th"), [])
+        payload = {
+            "title": "Curry",
+            "time_minutes": 30,
+            "price": "5.00",
+            "tags": [{"name": "Thai"}],
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with query_budget(11):
+                res = self.client.post(RECIPES_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self._names(TAGS_URL, "th"), ["Thai"])
+
+    def test_sql_fallback(self):
+        """Test prefixes still match with the index disabled."""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        with override_settings(RECIPE_ATTR_AUTOCOMPLETE={"ENABLED": False}):
+            reset_name_index()
+            self.assertEqual(self._names(TAGS_URL, "VEG"), ["Vegan"])
+
+    def test_autocomplete_benchmark(self):
+        """Test the benchmark compares the index with a LIKE query."""
+        out = StringIO()
+
+        call_command(
+            "benchmark",
+            "recipe_autocomplete",
+            "--size=100",
+            "--iterations=2",
+            stdout=out,
+        )
+
+        results = json.loads(out.getvalue())["recipe_autocomplete"]
+        self.assertEqual(results["names"], 100)
+        self.assertIn("index_search", results["sm"])
@@ -0,0 +1,236 @@
+"""Tests for the batch update and delete API."""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin
+from recipe.bitmaps import filter_recipes, get_recipe_index, reset_recipe_index
+from recipe.search import search_recipes
+
+BATCH_URL = reverse("recipe:recipe-batch")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, title="Stew", **params):
+    """Create and return a sample recipe."""
+    defaults = {"time_minutes": 5, "price": Decimal("1.00")}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, title=title, **defaults)
+
+
+class BatchUpdateTests(QueryBudgetMixin, TestCase):
+    """Test updating many recipes in one request."""
+
+    def setUp(self):
+        reset_recipe_index()
+        self.addCleanup(reset_recipe_index)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(self.user, f"Recipe {i}") for i in range(3)]
+
+    def _patch(self, items):
+        return self.client.patch(BATCH_URL, items, format="json")
+
+    def test_update_fields(self):
+        """Test each recipe gets its own changes."""
+        first, second, third = self.recipes
+        items = [
+            {"id": first.id, "time_minutes": 30},
+            {"id": second.id, "time_minutes": 30},
+            {"id": third.id, "title": "Dal", "price": "4.20"},
+        ]
+
+        res = self._patch(items)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"],
+            [{"id": recipe.id, "status": 200} for recipe in self.recipes],
+        )
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+        self.assertEqual([r.time_minutes for r in self.recipes], [30, 30, 5])
+        self.assertEqual((third.title, third.price), ("Dal", Decimal("4.20")))
+        self.assertEqual(first.title, "Recipe 0")
+        self.assertGreater(first.updated_at, first.created_at)
+
+    def test_same_changes_share_an_update(self):
+        """Test recipes changed the same way are updated by one query."""
+        items = [{"id": recipe.id, "link": "https://x"} for recipe in self.recipes]
+
+        # savepoint, lock, update, release
+        with self.assertNumQueries(4):
+            self._patch(items)
+
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user, link="https://x").count(), 3
+        )
+
+    def test_relink_tags(self):
+        """Test tags are replaced, adding and removing only what changed."""
+        first, second, _ = self.recipes
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        first.tags.add(vegan, quick)
+        get_recipe_index().get(self.user.id)
+        items = [
+            {"id": first.id, "tags": [{"name": "Vegan"}, {"name": "Spicy"}]},
+            {"id": second.id, "tags": [{"name": "Spicy"}]},
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self._patch(items)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(first.tags.values_list("name", flat=True)), ["Spicy", "Vegan"]
+        )
+        self.assertEqual(list(second.tags.values_list("name", flat=True)), ["Spicy"])
+        spicy = Tag.objects.get(user=self.user, name="Spicy")
+        recipes = Recipe.objects.filter(user=self.user)
+        spicy_recipes = filter_recipes(
+            recipes, self.user.id, [("tags", [spicy.id], "all")]
+        )
+        self.assertEqual(spicy_recipes.count(), 2)
+        quick_recipes = filter_recipes(
+            recipes, self.user.id, [("tags", [quick.id], "all")]
+        )
+        self.assertFalse(quick_recipes.exists())
+
+    def test_clear_ingredients(self):
+        """Test an empty list removes every ingredient."""
+        recipe = self.recipes[0]
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name="Salt"))
+
+        self._patch([{"id": recipe.id, "ingredients": []}])
+
+        self.assertFalse(recipe.ingredients.exists())
+
+    def test_per_item_errors(self):
+        """Test invalid, unknown and duplicate items fail the whole batch."""
+        other = create_recipe(get_user_model().objects.create_user("o@example.com"))
+        first, second, _ = self.recipes
+        items = [
+            {"id": first.id, "title": "Renamed"},
+            {"id": second.id, "time_minutes": "soon"},
+            {"id": other.id, "title": "Not mine"},
+            {"title": "No id"},
+            {"id": first.id, "title": "Again"},
+        ]
+
+        res = self._patch(items)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        results = res.data["results"]
+        self.assertEqual([r["status"] for r in results], [424, 400, 404, 400, 400])
+        self.assertIn("time_minutes", results[1]["errors"])
+        self.assertIn("id", results[3]["errors"])
+        first.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.title, "Recipe 0")
+        self.assertEqual(other.title, "Stew")
+
+    def test_mixed_batch_changes_nothing(self):
+        """Test a batch with one unknown recipe leaves every recipe as it was."""
+        first, second, _ = self.recipes
+        tag = Tag.objects.create(user=self.user, name="Kept")
+        first.tags.add(tag)
+        before = Recipe.objects.get(id=first.id).updated_at
+        items = [
+            {"id": first.id, "title": "Renamed", "tags": [{"name": "New"}]},
+            {"id": second.id, "price": "9.99"},
+            {"id": second.id + 100, "title": "Unknown"},
+        ]
+
+        res = self._patch(items)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r["status"] for r in res.data["results"]], [424, 424, 404])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.title, "Recipe 0")
+        self.assertEqual(first.updated_at, before)
+        self.assertEqual(list(first.tags.all()), [tag])
+        self.assertEqual(second.price, Decimal("1.00"))
+        self.assertFalse(Tag.objects.filter(name="New").exists())
+
+    def test_rejects_bad_batches(self):
+        """Test bodies that are not a list of at most 100 changes are refused."""
+        for body in [{"id": 1}, [], [{"id": 1}] * 101]:
+            res = self._patch(body)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_follows_updates(self):
+        """Test renamed recipes are found by their new title."""
+        recipe = self.recipes[0]
+
+        self._patch([{"id": recipe.id, "title": "Lime pickle"}])
+
+        found = search_recipes(Recipe.objects.filter(user=self.user), "pickle")
+        self.assertEqual(list(found), [recipe])
+
+    def test_list_not_served_stale(self):
+        """Test a cached recipe list shows the changes."""
+        self.client.get(RECIPES_URL)
+
+        self._patch([{"id": self.recipes[0].id, "title": "Changed"}])
+
+        res = self.client.get(RECIPES_URL)
+        self.assertIn("Changed", [r["title"] for r in res.data["results"]])
+
+
+class BatchDeleteTests(QueryBudgetMixin, TestCase):
+    """Test deleting many recipes in one request."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _delete(self, ids):
+        return self.client.delete(f"{BATCH_URL}?ids={','.join(str(i) for i in ids)}")
+
+    def test_delete_recipes(self):
+        """Test the listed recipes are deleted."""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+
+        res = self._delete([recipes[0].id, recipes[2].id])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["status"] for r in res.data["results"]], [204, 204])
+        remaining = Recipe.objects.filter(user=self.user)
+        self.assertEqual(list(remaining), [recipes[1]])
+
+    def test_unknown_and_others_recipes(self):
+        """Test missing and other users' recipes are reported and kept."""
+        recipe = create_recipe(self.user)
+        other = create_recipe(get_user_model().objects.create_user("o@example.com"))
+
+        res = self._delete([recipe.id, other.id, 0])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [(r["id"], r["status"]) for r in res.data["results"]],
+            [(recipe.id, 204), (other.id, 404), (0, 404)],
+        )
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+    def test_ids_required(self):
+        """Test a missing or invalid ids parameter is refused."""
+        for url in [BATCH_URL, f"{BATCH_URL}?ids=1,x"]:
+            res = self.client.delete(url)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
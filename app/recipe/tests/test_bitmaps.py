@@ -0,0 +1,257 @@
+"""Tests for the bitmap index behind the all/exclude recipe filters."""
+
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin, query_budget
+from recipe.bitmaps import (
+    bits_from_positions,
+    get_recipe_index,
+    positions_from_bits,
+    reset_recipe_index,
+)
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, title):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(user=user, title=title, time_minutes=5, price=1)
+
+
+class BitsetTests(TestCase):
+    """Test the bitset helpers."""
+
+    def test_positions_round_trip(self):
+        """Test positions survive conversion to a bitset and back."""
+        positions = [0, 3, 7, 8, 64, 1000]
+
+        bits = bits_from_positions(positions)
+
+        self.assertEqual(bits.bit_count(), len(positions))
+        self.assertEqual(list(positions_from_bits(bits)), positions)
+
+    def test_empty_positions(self):
+        """Test no positions give an empty bitset."""
+        self.assertEqual(bits_from_positions([]), 0)
+        self.assertEqual(list(positions_from_bits(0)), [])
+
+
+class RecipeBitmapFilterTests(QueryBudgetMixin, TestCase):
+    """Test filtering recipes by all of or none of some tags/ingredients."""
+
+    def setUp(self):
+        reset_recipe_index()
+        self.addCleanup(reset_recipe_index)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.beans = Ingredient.objects.create(user=self.user, name="Beans")
+        self.chilli = create_recipe(self.user, "Bean Chilli")
+        self.chilli.tags.add(self.vegan, self.quick)
+        self.chilli.ingredients.add(self.beans)
+        self.curry = create_recipe(self.user, "Curry")
+        self.curry.tags.add(self.vegan)
+        self.steak = create_recipe(self.user, "Steak")
+
+    def _ids(self, params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["id"] for recipe in res.data["results"]]
+
+    def _tags(self, *tags, mode):
+        return {"tags": ",".join(str(tag.id) for tag in tags), "tags_mode": mode}
+
+    def test_filter_all_tags(self):
+        """Test tags_mode=all lists recipes carrying every tag."""
+        ids = self._ids(self._tags(self.vegan, self.quick, mode="all"))
+
+        self.assertEqual(ids, [self.chilli.id])
+
+    def test_filter_exclude_tags(self):
+        """Test tags_mode=exclude lists recipes carrying none of the tags."""
+        ids = self._ids(self._tags(self.quick, mode="exclude"))
+
+        self.assertEqual(ids, [self.steak.id, self.curry.id])
+
+    def test_combine_modes(self):
+        """Test modes combine across tags and ingredients."""
+        params = {
+            **self._tags(self.vegan, mode="any"),
+            "ingredients": str(self.beans.id),
+            "ingredients_mode": "exclude",
+        }
+
+        self.assertEqual(self._ids(params), [self.curry.id])
+
+    def test_other_users_recipes_excluded(self):
+        """Test exclude only lists the user's own recipes."""
+        other = get_user_model().objects.create_user(email="other@example.com")
+        create_recipe(other, "Someone else's")
+
+        ids = self._ids(self._tags(self.vegan, mode="exclude"))
+
+        self.assertEqual(ids, [self.steak.id])
+
+    def test_invalid_ids_rejected(self):
+        """Test non-numeric filter IDs return an error."""
+        res = self.client.get(RECIPES_URL, {"tags": "1,abc"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", res.data)
+
+    def test_too_many_ids_rejected(self):
+        """Test overly long ID lists return an error."""
+        ids = ",".join(str(i) for i in range(1, 102))
+
+        res = self.client.get(RECIPES_URL, {"ingredients": ids})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ingredients", res.data)
+
+    def test_invalid_mode_rejected(self):
+        """Test an unknown filter mode returns an error."""
+        res = self.client.get(RECIPES_URL, self._tags(self.vegan, mode="some"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags_mode", res.data)
+
+    def test_index_follows_link_changes(self):
+        """Test the loaded index is updated when tags are added and removed."""
+        params = self._tags(self.vegan, self.quick, mode="all")
+        self.assertEqual(self._ids(params), [self.chilli.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curry.tags.add(self.quick)
+        self.assertEqual(self._ids(params), [self.curry.id, self.chilli.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chilli.tags.remove(self.vegan)
+        self.assertEqual(self._ids(params), [self.curry.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curry.tags.clear()
+        self.assertEqual(self._ids(params), [])
+
+    def test_index_follows_reverse_changes(self):
+        """Test changes made from the tag side update the index."""
+        params = self._tags(self.quick, mode="exclude")
+        self.assertEqual(self._ids(params), [self.steak.id, self.curry.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quick.recipe_set.add(self.steak)
+        self.assertEqual(self._ids(params), [self.curry.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quick.recipe_set.clear()
+        self.assertEqual(
+            self._ids(params), [self.steak.id, self.curry.id, self.chilli.id]
+        )
+
+    def test_index_follows_new_and_deleted_recipes(self):
+        """Test created and deleted recipes are added to and dropped from the index."""
+        params = self._tags(self.vegan, mode="exclude")
+        self.assertEqual(self._ids(params), [self.steak.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            toast = create_recipe(self.user, "Toast")
+            self.steak.delete()
+        self.assertEqual(self._ids(params), [toast.id])
+
+    def test_index_follows_deleted_tag(self):
+        """Test deleting a tag removes it from the index."""
+        params = self._tags(self.vegan, self.quick, mode="all")
+        self.assertEqual(self._ids(params), [self.chilli.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quick.delete()
+        self.assertEqual(self._ids(params), [])
+
+    def test_index_not_rebuilt_for_changes(self):
+        """Test recipes changed since the index was built are matched in SQL."""
+        params = self._tags(self.quick, mode="exclude")
+        self.assertEqual(self._ids(params), [self.steak.id, self.curry.id])
+        index = get_recipe_index().get(self.user.id)
+
+        # signals and on-commit hooks of another worker never reach this one
+        self.curry.tags.add(self.quick)
+        toast = create_recipe(self.user, "Toast")
+        quick_toast = create_recipe(self.user, "Quick toast")
+        quick_toast.tags.add(self.quick)
+
+        self.assertEqual(self._ids(params), [toast.id, self.steak.id])
+        params = self._tags(self.vegan, self.quick, mode="all")
+        self.assertEqual(self._ids(params), [self.curry.id, self.chilli.id])
+        self.assertIs(get_recipe_index().get(self.user.id), index)
+
+    def test_change_stamped_before_newest_recipe(self):
+        """Test a change is found though a recipe read has a later updated_at."""
+        params = self._tags(self.quick, mode="exclude")
+        # a worker whose clock runs ahead
+        Recipe.objects.filter(id=self.steak.id).update(
+            updated_at=timezone.now() + timedelta(hours=1)
+        )
+        # the index build, then the steak is matched in SQL as changed
+        with query_budget(11):
+            self.assertEqual(self._ids(params), [self.steak.id, self.curry.id])
+
+        self.curry.tags.add(self.quick)
+
+        self.assertEqual(self._ids(params), [self.steak.id])
+
+    def test_matches_sql_fallback(self):
+        """Test the bitmap index and the SQL fallback list the same recipes."""
+        cases = [
+            self._tags(self.vegan, self.quick, mode="all"),
+            self._tags(self.vegan, mode="exclude"),
+            {"ingredients": str(self.beans.id), "ingredients_mode": "all"},
+        ]
+        indexed = [self._ids(params) for params in cases]
+
+        with override_settings(RECIPE_BITMAP_INDEX={"ENABLED": False}):
+            reset_recipe_index()
+            self.assertFalse(get_recipe_index().enabled)
+            self.assertEqual([self._ids(params) for params in cases], indexed)
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_filter_uses_one_query(self):
+        """Test a loaded index answers the filter with one query for changes."""
+        params = self._tags(self.vegan, self.quick, mode="all")
+        self._ids(params)
+
+        # changed recipes (none) for the ETag aggregate and again for the
+        # page, recipes, prefetched tags and prefetched ingredients
+        with self.assertNumQueries(6):
+            self._ids(params)
+
+    def test_recipe_bitmaps_benchmark(self):
+        """Test the benchmark compares SQL and bitmap filtering."""
+        out = StringIO()
+
+        call_command(
+            "benchmark",
+            "recipe_bitmaps",
+            "--size=200",
+            "--iterations=2",
+            stdout=out,
+        )
+
+        results = json.loads(out.getvalue())["recipe_bitmaps"]
+        for case in ["all_tags", "exclude_tags"]:
+            self.assertTrue(results[case]["same_results"])
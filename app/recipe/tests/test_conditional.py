@@ -0,0 +1,201 @@
+"""Tests for conditional GET (ETag / Last-Modified) on the recipe APIs."""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, title="Stew"):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(user=user, title=title, time_minutes=5, price=1)
+
+
+class RecipeTimestampTests(TestCase):
+    """Test updated_at follows changes shown in the recipe."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="user@example.com")
+        self.recipe = create_recipe(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.past = timezone.now() - timedelta(days=1)
+        Recipe.objects.update(updated_at=self.past)
+
+    def _updated_at(self):
+        return Recipe.objects.get(pk=self.recipe.pk).updated_at
+
+    def test_created_at_set(self):
+        """Test new recipes record when they were created."""
+        self.assertIsNotNone(self.recipe.created_at)
+
+    def test_linking_bumps_updated_at(self):
+        """Test adding, removing and clearing tags bumps updated_at."""
+        for change in [
+            lambda: self.recipe.tags.add(self.tag),
+            lambda: self.recipe.tags.remove(self.tag),
+            lambda: self.tag.recipe_set.add(self.recipe),
+            lambda: self.tag.recipe_set.clear(),
+        ]:
+            Recipe.objects.update(updated_at=self.past)
+            change()
+            self.assertGreater(self._updated_at(), self.past)
+
+    def test_renaming_or_deleting_ingredient_bumps_updated_at(self):
+        """Test recipes showing a renamed or deleted ingredient are bumped."""
+        ingredient = Ingredient.objects.create(user=self.user, name="Beans")
+        self.recipe.ingredients.add(ingredient)
+
+        for change in [
+            lambda: Ingredient.objects.filter(pk=ingredient.pk).first().save(),
+            lambda: ingredient.delete(),
+        ]:
+            Recipe.objects.update(updated_at=self.past)
+            change()
+            self.assertGreater(self._updated_at(), self.past)
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    """Test 304 responses for unchanged lists and recipes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def _etag(self, url, params=None):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Cache-Control"], "private, no-cache")
+        return res["ETag"]
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_list_not_modified(self):
+        """Test an unchanged recipe list returns 304 after one query."""
+        etag = self._etag(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(res["ETag"], etag)
+
+    def test_list_if_modified_since(self):
+        """Test If-Modified-Since is honoured by the list."""
+        res = self.client.get(RECIPES_URL)
+        last_modified = res["Last-Modified"]
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        earlier = http_date(self.recipe.updated_at.timestamp() - 60)
+        res = self.client.get(RECIPES_URL, HTTP_IF_MODIFIED_SINCE=earlier)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes(self):
+        """Test creating, changing, linking and deleting recipes change the ETag."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        def rename_tag():
+            tag.name = "Vegetarian"
+            tag.save()
+
+        etags = {self._etag(RECIPES_URL)}
+        for change in [
+            lambda: create_recipe(self.user, "Curry"),
+            lambda: self.recipe.tags.add(tag),
+            rename_tag,
+            lambda: self.recipe.delete(),
+        ]:
+            change()
+            etags.add(self._etag(RECIPES_URL))
+
+        self.assertEqual(len(etags), 5)
+
+    def test_etag_depends_on_query(self):
+        """Test different query parameters get different ETags."""
+        self.assertNotEqual(
+            self._etag(RECIPES_URL), self._etag(RECIPES_URL, {"page_size": 1})
+        )
+
+    def test_etag_depends_on_user(self):
+        """Test two users never share an ETag."""
+        etag = self._etag(RECIPES_URL)
+        other = get_user_model().objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_modified(self):
+        """Test an unchanged recipe returns 304 until it changes."""
+        url = detail_url(self.recipe.id)
+        etag = self._etag(url)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_missing(self):
+        """Test a conditional GET of a missing recipe is still a 404."""
+        res = self.client.get(detail_url(0), HTTP_IF_NONE_MATCH='"x"')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_list_not_modified(self):
+        """Test the tag list returns 304 until a tag changes."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        etag = self._etag(TAGS_URL)
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag.name = "Vegetarian"
+        tag.save()
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_no_tag_detail(self):
+        """Test a tag cannot be read on its own, as before conditional GETs."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        res = self.client.get(reverse("recipe:tag-detail", args=[tag.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_assigned_tags_follow_links(self):
+        """Test the assigned_only list changes when a tag is linked."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        params = {"assigned_only": 1}
+        etag = self._etag(TAGS_URL, params)
+
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
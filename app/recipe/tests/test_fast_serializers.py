@@ -0,0 +1,164 @@
+"""Tests for listing from values() rows with ValuesSerializer."""
+
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin
+from recipe.fast_serializers import ValuesListMixin, ValuesSerializer
+from recipe.serializers import RecipeSerializer
+
+RECIPES_URL = reverse("recipe:recipe-list")
+SEARCH_URL = reverse("recipe:recipe-search")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class ValuesSerializerParityTests(QueryBudgetMixin, TestCase):
+    """Test the values() lists render the same bytes as the serializers."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=n) for n in "ABC"]
+        self.tag_ids = ",".join(str(tag.id) for tag in tags)
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="Unused")
+        prices = [Decimal("0.50"), Decimal("100.00"), Decimal("999.99")]
+        for i, price in enumerate(prices):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"Lime pickle {i}",
+                description="Sour and hot é",
+                time_minutes=i,
+                price=price,
+                link="https://example.com" if i else "",
+            )
+            recipe.tags.add(*tags[: i + 1])
+            if i:
+                recipe.ingredients.add(salt)
+        # a processed image; rendering only needs the stored names
+        Recipe.objects.filter(id=recipe.id).update(
+            image="uploads/recipe/x.jpg",
+            image_status="ready",
+            image_variants={"thumbnail": "uploads/recipe/x-thumbnail.jpg"},
+        )
+
+    def _content(self, url, params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content
+
+    def assertSameBytes(self, url, params=None):
+        """Assert the values() list equals the serializer's, byte for byte."""
+        fast = self._content(url, params)
+        with patch.object(ValuesListMixin, "get_values_serializer", return_value=None):
+            slow = self._content(url, params)
+        self.assertIn(b'"results":[{', fast)
+        self.assertEqual(fast, slow)
+
+    def test_recipe_lists(self):
+        """Test recipe lists in every fields/expand shape."""
+        cases = [
+            {},
+            {"page_size": 2},
+            {"fields": "title,description,price,image,image_variants"},
+            {"fields": "tags,title"},
+            {"expand": ""},
+            {"expand": "ingredients"},
+            {"tags_mode": "all"},
+        ]
+        for params in cases:
+            if "tags_mode" in params:
+                params["tags"] = self.tag_ids
+            with self.subTest(params=params):
+                self.assertSameBytes(RECIPES_URL, params)
+
+    def test_search(self):
+        """Test search results with their rank."""
+        for params in [{"q": "pickle"}, {"q": "lime", "fields": "rank,id"}]:
+            with self.subTest(params=params):
+                self.assertSameBytes(SEARCH_URL, params)
+
+    def test_tag_and_ingredient_lists(self):
+        """Test the tag and ingredient lists."""
+        for url, text in [(TAGS_URL, "b"), (INGREDIENTS_URL, "sa")]:
+            for params in [{}, {"assigned_only": 1}, {"q": text}]:
+                with self.subTest(url=url, params=params):
+                    self.assertSameBytes(url, params)
+
+    def test_related_in_id_order(self):
+        """Test both render a recipe's tags by id, not by when they were linked."""
+        recipe = Recipe.objects.get(title="Lime pickle 2")
+        tags = list(recipe.tags.order_by("id"))
+        recipe.tags.clear()
+        recipe.tags.add(*reversed(tags))
+        # tags collapsed to their IDs
+        params = {"expand": "ingredients"}
+
+        self.assertSameBytes(RECIPES_URL, params)
+        results = self.client.get(RECIPES_URL, params).json()["results"]
+        (rendered,) = [r for r in results if r["id"] == recipe.id]
+        self.assertEqual(rendered["tags"], [tag.id for tag in tags])
+
+    def test_same_queries(self):
+        """Test the values() list runs the queries the prefetches did."""
+        render = patch.object(
+            ValuesSerializer,
+            "render",
+            autospec=True,
+            side_effect=ValuesSerializer.render,
+        )
+
+        # ETag aggregate, recipes, tags, ingredients
+        with render as patched, self.assertNumQueries(4):
+            self._content(RECIPES_URL, {})
+
+        patched.assert_called_once()
+
+    def test_unknown_field_rejected(self):
+        """Test a field it cannot render from a column raises an error."""
+
+        class CountSerializer(RecipeSerializer):
+            count = serializers.SerializerMethodField()
+
+            class Meta(RecipeSerializer.Meta):
+                fields = ["id", "count"]
+
+            def get_count(self, recipe):
+                return 1
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(CountSerializer())
+
+    def test_list_serializers_benchmark(self):
+        """Test the benchmark renders the same output both ways."""
+        out = StringIO()
+
+        call_command(
+            "benchmark",
+            "recipe_list_serializers",
+            "--size=20",
+            "--iterations=1",
+            stdout=out,
+        )
+
+        results = json.loads(out.getvalue())["recipe_list_serializers"]
+        for name in ["recipes", "tags"]:
+            self.assertTrue(results[name]["same_output"])
+            self.assertIn("rows_per_sec", results[name]["values_serializer"])
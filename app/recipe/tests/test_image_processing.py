@@ -0,0 +1,196 @@
+"""Tests for the recipe image processing pipeline."""
+
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageProcessingJob, Recipe
+from core.query_detector import QueryBudgetMixin, query_budget
+from recipe import images
+from recipe.tasks import MAX_ATTEMPTS, process_pending
+
+
+def image_upload_url(recipe_id):
+    """Create and return an image upload URL."""
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_image_file(size=(1200, 800), image_format="JPEG", exif=True):
+    """Create and return a temporary image file."""
+    image_file = tempfile.NamedTemporaryFile(suffix=".jpg")
+    img = Image.new("RGB", size, color=(200, 100, 50))
+    kwargs = {}
+    if exif:
+        img_exif = Image.Exif()
+        img_exif[0x0110] = "Test Camera"
+        kwargs["exif"] = img_exif
+    img.save(image_file, format=image_format, **kwargs)
+    image_file.seek(0)
+    return image_file
+
+
+class ImageProcessingTests(QueryBudgetMixin, TestCase):
+    """Tests for uploading and processing recipe images."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "password123",
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        for path in self.recipe.image_variants.values():
+            storage.delete(path)
+        self.recipe.image.delete()
+
+    def _upload(self, **kwargs):
+        # an upload also counts the file's references and queues its processing
+        with create_image_file(**kwargs) as image_file, query_budget(18):
+            return self.client.post(
+                image_upload_url(self.recipe.id),
+                {"image": image_file},
+                format="multipart",
+            )
+
+    def test_upload_queues_processing(self):
+        """Test uploading stores the original and queues a job."""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["image_status"], "pending")
+        self.assertEqual(res.data["image_variants"], {})
+        self.assertTrue(ImageProcessingJob.objects.filter(recipe=self.recipe).exists())
+
+    def test_process_builds_variants(self):
+        """Test the worker writes resized variants without EXIF."""
+        self._upload()
+
+        processed = process_pending()
+
+        self.assertEqual(processed, 1)
+        self.assertFalse(ImageProcessingJob.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, "ready")
+        self.assertEqual(set(self.recipe.image_variants), set(images.VARIANTS))
+        storage = self.recipe.image.storage
+        for name, path in self.recipe.image_variants.items():
+            with storage.open(path) as variant_file:
+                variant = Image.open(variant_file)
+                variant.load()
+            max_width, max_height = images.VARIANTS[name]
+            self.assertLessEqual(variant.width, max_width)
+            self.assertLessEqual(variant.height, max_height)
+            self.assertEqual(variant.format, "JPEG")
+            self.assertEqual(len(variant.getexif()), 0)
+
+    def test_variants_exposed_on_recipe(self):
+        """Test the recipe detail lists the variant URLs."""
+        self._upload()
+        process_pending()
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data["image_status"], "ready")
+        self.assertEqual(set(res.data["image_variants"]), set(images.VARIANTS))
+        self.assertTrue(res.data["image_variants"]["thumbnail"].startswith("http"))
+
+    # closing connections would end the test case's transaction
+    @patch("core.management.commands.process_images.close_old_connections")
+    def test_process_images_command(self, patched_close):
+        """Test the worker command drains the queue."""
+        self._upload()
+
+        call_command("process_images", "--once", stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, "ready")
+
+    def test_unsupported_format_rejected(self):
+        """Test uploading an image format we do not accept."""
+        res = self._upload(image_format="BMP", exif=False)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageProcessingJob.objects.exists())
+
+    @patch("recipe.tasks.create_variants")
+    def test_failed_job_retried_then_failed(self, patched_create_variants):
+        """Test a failing job is retried and then marked failed."""
+        patched_create_variants.side_effect = OSError("broken image")
+        self._upload()
+
+        with self.assertLogs("recipe.tasks", level="ERROR"):
+            for _ in range(MAX_ATTEMPTS):
+                process_pending()
+
+        job = ImageProcessingJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageProcessingJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, "failed")
+        self.assertEqual(process_pending(), 0)
+
+    @patch("recipe.tasks.create_variants")
+    def test_failure_keeps_replaced_image_pending(self, patched_create_variants):
+        """Test a job failing after the image was replaced leaves the new one."""
+        self._upload()
+        self.recipe.refresh_from_db()
+        self.addCleanup(self.recipe.image.storage.delete, self.recipe.image.name)
+        ImageProcessingJob.objects.update(attempts=MAX_ATTEMPTS - 1)
+
+        def replace_image(recipe):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image="uploads/recipe/replaced.jpg", image_status="pending"
+            )
+            raise OSError("broken image")
+
+        patched_create_variants.side_effect = replace_image
+
+        with self.assertLogs("recipe.tasks", level="ERROR"):
+            process_pending()
+
+        job = ImageProcessingJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageProcessingJob.STATUS_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, "uploads/recipe/replaced.jpg")
+        self.assertEqual(self.recipe.image_status, "pending")
+
+    def test_render_variants_applies_exif_orientation(self):
+        """Test portrait photos stored sideways are rotated upright."""
+        img = Image.new("RGB", (400, 200))
+        img_exif = Image.Exif()
+        # orientation 6: rotate 90 degrees clockwise to display
+        img_exif[0x0112] = 6
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", exif=img_exif)
+        buffer.seek(0)
+
+        rendered = images.render_variants(buffer)
+
+        card = Image.open(BytesIO(rendered["card"]))
+        self.assertEqual(card.size, (200, 400))
@@ -10,6 +10,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
+from core.query_detector import QueryBudgetMixin
 
 from recipe.serializers import IngredientSerialzier
 
@@ -27,7 +28,7 @@ def create_user(email="user@example.com", password="testpass123"):
     return get_user_model().objects.create_user(email=email, password=password)
 
 
-class PublicIngredientsApiTest(TestCase):
+class PublicIngredientsApiTest(QueryBudgetMixin, TestCase):
     """Test unauthenticated API requests."""
 
     def setUp(self):
@@ -40,7 +41,7 @@ class PublicIngredientsApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateIngredientsApiTest(TestCase):
+class PrivateIngredientsApiTest(QueryBudgetMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -58,7 +59,7 @@ class PrivateIngredientsApiTest(TestCase):
         ingredients = Ingredient.objects.all().order_by("-name")
         serializer = IngredientSerialzier(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test list of ingredeints is limited to authenticated user."""
@@ -69,9 +70,9 @@ class PrivateIngredientsApiTest(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], ingredient.name)
-        self.assertEqual(res.data[0]["id"], ingredient.id)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], ingredient.name)
+        self.assertEqual(res.data["results"][0]["id"], ingredient.id)
 
     def test_update_ingredient(self):
         """Test updating an ingredient."""
@@ -112,8 +113,8 @@ class PrivateIngredientsApiTest(TestCase):
 
         s1 = IngredientSerialzier(in1)
         s2 = IngredientSerialzier(in2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertNotIn(s2.data, res.data["results"])
 
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -135,4 +136,4 @@ class PrivateIngredientsApiTest(TestCase):
         recipe2.ingredients.add(ing)
 
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
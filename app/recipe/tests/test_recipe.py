@@ -7,13 +7,16 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from core.query_detector import QueryBudgetMixin, query_budget
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse("recipe:recipe-list")
@@ -51,7 +54,7 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
-class PublicRecipeAPITests(TestCase):
+class PublicRecipeAPITests(QueryBudgetMixin, TestCase):
     """Test unauthenticated API requests."""
 
     def setUp(self):
@@ -64,7 +67,7 @@ class PublicRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeAPITests(TestCase):
+class PrivateRecipeAPITests(QueryBudgetMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -82,7 +85,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.all().order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipe is limited to authenticated user."""
@@ -98,7 +101,27 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_recipe_list_paginated(self):
+        """Test recipes are returned in pages, newest first."""
+        r1 = create_recipe(user=self.user, title="First")
+        r2 = create_recipe(user=self.user, title="Second")
+        r3 = create_recipe(user=self.user, title="Third")
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe["id"] for recipe in res.data["results"]]
+        self.assertEqual(ids, [r3.id, r2.id])
+        self.assertIsNotNone(res.data["next"])
+
+        res = self.client.get(res.data["next"])
+
+        ids = [recipe["id"] for recipe in res.data["results"]]
+        self.assertEqual(ids, [r1.id])
+        self.assertIsNone(res.data["next"])
+        self.assertIsNotNone(res.data["previous"])
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -175,7 +198,9 @@ class PrivateRecipeAPITests(TestCase):
             "tags": [{"name": "Thai"}, {"name": "Dinner"}],
         }
 
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        # creating a recipe also creates its tags and ingredients
+        with query_budget(11):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -198,7 +223,8 @@ class PrivateRecipeAPITests(TestCase):
             "price": Decimal("4.50"),
             "tags": [{"name": "Indian"}, {"name": "Breakfast"}],
         }
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with query_budget(11):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -220,7 +246,9 @@ class PrivateRecipeAPITests(TestCase):
         payload = {"tags": [{"name": "Lunch"}]}
 
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        # an update relinks tags and ingredients and renders them again
+        with query_budget(15):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         new_tag = Tag.objects.get(user=self.user, name="Lunch")
@@ -235,7 +263,8 @@ class PrivateRecipeAPITests(TestCase):
         tag_lunch = Tag.objects.create(user=self.user, name="Lunch")
         payload = {"tags": [{"name": "Lunch"}]}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with query_budget(15):
+            res = self.client.patch(url, payload, format="json")
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(tag_lunch, recipe.tags.all())
         self.assertNotIn(tag_breakfast, recipe.tags.all())
@@ -248,7 +277,8 @@ class PrivateRecipeAPITests(TestCase):
 
         payload = {"tags": []}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with query_budget(11):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
@@ -261,7 +291,8 @@ class PrivateRecipeAPITests(TestCase):
             "price": Decimal("4.30"),
             "ingredients": [{"name": "Cauliflower"}, {"name": "Salt"}],
         }
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with query_budget(11):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -284,7 +315,8 @@ class PrivateRecipeAPITests(TestCase):
             "price": "2.55",
             "ingredients": [{"name": "Lemon"}, {"name": "Fish Sauce"}],
         }
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with query_budget(11):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -304,7 +336,8 @@ class PrivateRecipeAPITests(TestCase):
         recipe = create_recipe(user=self.user)
         payload = {"ingredients": [{"name": "Limes"}]}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with query_budget(15):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         new_ingredient = Ingredient.objects.get(user=self.user, name="Limes")
@@ -319,7 +352,8 @@ class PrivateRecipeAPITests(TestCase):
         ingredient2 = Ingredient.objects.create(user=self.user, name="Chili")
         payload = {"ingredients": [{"name": "Chili"}]}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with query_budget(15):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(ingredient2, recipe.ingredients.all())
@@ -333,11 +367,69 @@ class PrivateRecipeAPITests(TestCase):
 
         payload = {"ingredients": []}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with query_budget(11):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_query_count_independent_of_ingredients(self):
+        """Test nested ingredients are created with set-based queries."""
+        Ingredient.objects.create(user=self.user, name="Ingredient 0")
+        counts = []
+        for size in [2, 30]:
+            payload = {
+                "title": f"Recipe with {size} ingredients",
+                "time_minutes": 30,
+                "price": Decimal("5.00"),
+                "ingredients": [{"name": f"Ingredient {i}"} for i in range(size)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                with query_budget(11):
+                    res = self.client.post(RECIPES_URL, payload, format="json")
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data["ingredients"]), size)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 30)
+
+    def test_create_recipe_with_duplicate_tag_names(self):
+        """Test repeated tag names in a payload create a single tag."""
+        payload = {
+            "title": "Green Curry",
+            "time_minutes": 30,
+            "price": Decimal("6.00"),
+            "tags": [{"name": "Thai"}, {"name": "Thai"}],
+        }
+        with query_budget(11):
+            res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user, name="Thai").count(), 1)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 1)
+
+    def test_update_recipe_keeps_unchanged_tags(self):
+        """Test updating tags only adds and removes the difference."""
+        tag_keep = Tag.objects.create(user=self.user, name="Keep")
+        tag_drop = Tag.objects.create(user=self.user, name="Drop")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_keep, tag_drop)
+        through = Recipe.tags.through
+        kept_row = through.objects.get(recipe=recipe, tag=tag_keep)
+
+        payload = {"tags": [{"name": "Keep"}, {"name": "New"}]}
+        # an update that keeps some tags also removes the links it drops
+        with query_budget(17):
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = set(recipe.tags.values_list("name", flat=True))
+        self.assertEqual(names, {"Keep", "New"})
+        self.assertTrue(through.objects.filter(id=kept_row.id).exists())
+
     def test_filter_by_tags(self):
         """Test filtering recipes by tags."""
         r1 = create_recipe(user=self.user, title="Thai Vegetable Curry")
@@ -354,9 +446,28 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
+
+    def test_filter_by_tags_and_ingredients_without_distinct(self):
+        """Test recipes matching several filter values are listed once."""
+        recipe = create_recipe(user=self.user, title="Veggie Chilli")
+        tags = [Tag.objects.create(user=self.user, name=n) for n in ["Vegan", "Hot"]]
+        ingredient = Ingredient.objects.create(user=self.user, name="Beans")
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(ingredient)
+        create_recipe(user=self.user, title="Plain Rice").tags.add(tags[0])
+
+        params = {
+            "tags": ",".join(str(tag.id) for tag in tags),
+            "ingredients": str(ingredient.id),
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
+        self.assertNotIn("DISTINCT", ctx.captured_queries[0]["sql"])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -374,12 +485,51 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
+
+    def _create_recipes_with_relations(self, count):
+        """Create recipes that each have a tag and an ingredient."""
+        recipes = []
+        # continue numbering so tag and ingredient names stay unique
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"Tag {i}"))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f"Ingredient {i}")
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not run a query per recipe."""
+        for count in [1, 10]:
+            self._create_recipes_with_relations(count)
+            # ETag aggregate, recipes, prefetched tags and prefetched ingredients
+            with self.assertNumQueries(4):
+                res = self.client.get(RECIPES_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data["results"]), Recipe.objects.count())
+
+    def test_retrieve_query_count_is_constant(self):
+        """Test retrieving a recipe preloads its tags and ingredients."""
+        recipe = self._create_recipes_with_relations(1)[0]
+        recipe.tags.add(
+            *[Tag.objects.create(user=self.user, name=f"Extra {i}") for i in range(5)]
+        )
+
+        # ETag lookup, recipe, prefetched tags and prefetched ingredients
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 6)
 
 
-class ImageUploadTests(TestCase):
+class ImageUploadTests(QueryBudgetMixin, TestCase):
     """Tests for the image upload API."""
 
     def setUp(self):
@@ -405,7 +555,9 @@ class ImageUploadTests(TestCase):
             image_file.seek(0)
             payload = {"image": image_file}
             # best way to upload image in django
-            res = self.client.post(url, payload, format="multipart")
+            # an upload also counts the file's references and queues its processing
+            with query_budget(18):
+                res = self.client.post(url, payload, format="multipart")
 
         self.recipe.refresh_from_db()
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,192 @@
+"""Tests for the per-user cache of list responses."""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin
+from recipe.response_cache import stats
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+
+def create_recipe(user, title="Stew"):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(user=user, title=title, time_minutes=5, price=1)
+
+
+class ResponseCacheTests(QueryBudgetMixin, TestCase):
+    """Test list responses are cached per user until their data changes."""
+
+    def setUp(self):
+        caches["responses"].clear()
+        stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+
+    def _get(self, url, params=None, **headers):
+        res = self.client.get(url, params, **headers)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def _names(self, url, key="name", params=None):
+        return [item[key] for item in self._get(url, params).data["results"]]
+
+    def test_hit_with_validator_query_only(self):
+        """Test a repeated list is served from the cache after its ETag."""
+        first = self._get(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            second = self._get(RECIPES_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(stats.snapshot()["hits"], 1)
+        self.assertEqual(stats.snapshot()["misses"], 1)
+
+    def test_hit_not_modified(self):
+        """Test a cached list answers If-None-Match with 304."""
+        etag = self._get(RECIPES_URL)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_keyed_by_params_and_user(self):
+        """Test other query parameters and other users are cached apart."""
+        self._get(RECIPES_URL)
+
+        res = self._get(RECIPES_URL, {"page_size": 1})
+        self.assertEqual(res["X-Cache"], "MISS")
+
+        other = get_user_model().objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+        res = self._get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])
+
+    @override_settings(ALLOWED_HOSTS=["testserver", "cdn.example.com"])
+    def test_keyed_by_host(self):
+        """Test a page with absolute image URLs is cached per host and scheme."""
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image="uploads/recipe/x.jpg", image_status="ready"
+        )
+        self._get(RECIPES_URL)
+
+        for headers in [{"HTTP_HOST": "cdn.example.com"}, {"secure": True}]:
+            with self.subTest(headers=headers):
+                res = self._get(RECIPES_URL, **headers)
+
+                self.assertEqual(res["X-Cache"], "MISS")
+                image = res.data["results"][0]["image"]
+                origin = res.wsgi_request.build_absolute_uri("/")
+                self.assertTrue(image.startswith(origin), image)
+
+    def test_recipe_changes_invalidate(self):
+        """Test creating, updating and deleting recipes refresh the list."""
+        self.assertEqual(self._names(RECIPES_URL, "title"), ["Stew"])
+
+        curry = create_recipe(self.user, "Curry")
+        self.assertEqual(self._names(RECIPES_URL, "title"), ["Curry", "Stew"])
+
+        curry.title = "Thai curry"
+        curry.save()
+        self.assertEqual(self._names(RECIPES_URL, "title"), ["Thai curry", "Stew"])
+
+        curry.delete()
+        self.assertEqual(self._names(RECIPES_URL, "title"), ["Stew"])
+
+    def test_linking_invalidates(self):
+        """Test linking tags refreshes the recipe and assigned tag lists."""
+        params = {"assigned_only": 1}
+        self.assertEqual(self._names(TAGS_URL, params=params), [])
+        self._get(RECIPES_URL)
+
+        self.tag.recipe_set.add(self.recipe)
+
+        self.assertEqual(self._names(TAGS_URL, params=params), ["Vegan"])
+        res = self._get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], "Vegan")
+
+    def test_attr_changes_invalidate(self):
+        """Test renaming and deleting a tag refresh the tag and recipe lists."""
+        self.recipe.tags.add(self.tag)
+        self._get(RECIPES_URL)
+        self.assertEqual(self._names(TAGS_URL), ["Vegan"])
+
+        self.tag.name = "Vegetarian"
+        self.tag.save()
+        self.assertEqual(self._names(TAGS_URL), ["Vegetarian"])
+        res = self._get(RECIPES_URL)
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], "Vegetarian")
+
+        self.tag.delete()
+        self.assertEqual(self._names(TAGS_URL), [])
+
+    def test_scopes_independent(self):
+        """Test an ingredient change keeps cached tag lists."""
+        self._get(TAGS_URL)
+
+        Ingredient.objects.create(user=self.user, name="Beans")
+
+        self.assertEqual(self._get(TAGS_URL)["X-Cache"], "HIT")
+        self.assertEqual(self._names(INGREDIENTS_URL), ["Beans"])
+
+    def test_other_users_changes_keep_cache(self):
+        """Test one user's changes do not invalidate another's lists."""
+        self._get(RECIPES_URL)
+        other = get_user_model().objects.create_user(email="other@example.com")
+
+        create_recipe(other)
+
+        self.assertEqual(self._get(RECIPES_URL)["X-Cache"], "HIT")
+
+    def test_changes_made_elsewhere(self):
+        """Test changes that send no signals, as in another worker, are seen."""
+        first = self._get(RECIPES_URL)
+
+        Recipe.objects.filter(id=self.recipe.id).update(
+            title="Curry", updated_at=timezone.now()
+        )
+
+        res = self._get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertNotEqual(res["ETag"], first["ETag"])
+        self.assertEqual(res.data["results"][0]["title"], "Curry")
+
+    def test_disabled(self):
+        """Test nothing is cached with the cache disabled."""
+        with override_settings(RESPONSE_CACHE={"ENABLED": False}):
+            self._get(RECIPES_URL)
+            res = self._get(RECIPES_URL)
+
+        self.assertNotIn("X-Cache", res)
+        self.assertEqual(stats.snapshot()["hits"], 0)
+
+    def test_health_reports_counters(self):
+        """Test the health check reports the hit and miss counters."""
+        self._get(RECIPES_URL)
+        self._get(RECIPES_URL)
+
+        res = self.client.get(reverse("health"))
+
+        counters = res.json()["response_cache"]
+        self.assertEqual((counters["hits"], counters["misses"]), (1, 1))
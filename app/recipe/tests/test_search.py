@@ -0,0 +1,183 @@
+"""Tests for full-text recipe search."""
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.explain import explain, indexes_used
+from core.models import Ingredient, Recipe, RecipeSearchDocument, Tag
+from core.query_detector import QueryBudgetMixin
+from recipe.search import search_recipes
+
+SEARCH_URL = reverse("recipe:recipe-search")
+
+
+def create_recipe(user, title, description=""):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(
+        user=user, title=title, description=description, time_minutes=5, price=1
+    )
+
+
+class RecipeSearchAPITests(QueryBudgetMixin, TestCase):
+    """Test searching recipes through the API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _search(self, q, **params):
+        res = self.client.get(SEARCH_URL, {"q": q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def _ids(self, q, **params):
+        return [recipe["id"] for recipe in self._search(q, **params).data["results"]]
+
+    def test_title_ranks_above_description(self):
+        """Test title matches come before description matches."""
+        in_description = create_recipe(
+            self.user, "Weeknight dinner", "Finish with a squeeze of lime."
+        )
+        in_title = create_recipe(self.user, "Lime pickle")
+        create_recipe(self.user, "Toast")
+
+        res = self._search("lime")
+
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]], [in_title.id, in_description.id]
+        )
+        ranks = [r["rank"] for r in res.data["results"]]
+        self.assertGreater(ranks[0], ranks[1])
+
+    def test_matches_tag_and_ingredient_names(self):
+        """Test words from tags and ingredients are searchable."""
+        recipe = create_recipe(self.user, "Stew")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name="Leeks"))
+
+        self.assertEqual(self._ids("vegan"), [recipe.id])
+        # stemming: "leek" finds "Leeks"
+        self.assertEqual(self._ids("leek"), [recipe.id])
+
+    def test_document_follows_changes(self):
+        """Test the search document is rebuilt when its sources change."""
+        recipe = create_recipe(self.user, "Stew")
+        tag = Tag.objects.create(user=self.user, name="Winter")
+        recipe.tags.add(tag)
+
+        tag.name = "Hearty"
+        tag.save()
+        self.assertEqual(self._ids("hearty"), [recipe.id])
+        self.assertEqual(self._ids("winter"), [])
+
+        recipe.tags.remove(tag)
+        self.assertEqual(self._ids("hearty"), [])
+
+        recipe.title = "Goulash"
+        recipe.save()
+        self.assertEqual(self._ids("goulash"), [recipe.id])
+        self.assertEqual(self._ids("stew"), [])
+
+    def test_deleting_recipe_removes_document(self):
+        """Test deleting a recipe with links also deletes its document."""
+        recipe = create_recipe(self.user, "Stew")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Winter"))
+
+        recipe.delete()
+
+        self.assertFalse(RecipeSearchDocument.objects.exists())
+
+    def test_search_limited_to_user(self):
+        """Test only the authenticated user's recipes are found."""
+        other = get_user_model().objects.create_user(email="other@example.com")
+        create_recipe(other, "Lime pickle")
+
+        self.assertEqual(self._ids("lime"), [])
+
+    def test_search_combines_with_filters(self):
+        """Test the tag filters narrow search results."""
+        tagged = create_recipe(self.user, "Lime tart")
+        create_recipe(self.user, "Lime pickle")
+        tag = Tag.objects.create(user=self.user, name="Dessert")
+        tagged.tags.add(tag)
+
+        self.assertEqual(self._ids("lime", tags=str(tag.id)), [tagged.id])
+
+    def test_search_paginated(self):
+        """Test results are paginated by page number."""
+        for i in range(3):
+            create_recipe(self.user, f"Lime dish {i}")
+
+        res = self._search("lime", page_size=2)
+
+        self.assertEqual(res.data["count"], 3)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
+    def test_query_required(self):
+        """Test a missing or blank query returns an error."""
+        res = self.client.get(SEARCH_URL, {"q": " "})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("q", res.data)
+
+    def test_search_uses_gin_index(self):
+        """Test a selective search is answered from the GIN index."""
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f"Recipe {i}", time_minutes=5, price=1)
+            for i in range(5000)
+        )
+        create_recipe(self.user, "Lime pickle")
+        with connection.cursor() as cursor:
+            # merge the entries queued by the inserts, as autovacuum would
+            cursor.execute("SELECT gin_clean_pending_list('recipe_search_vector_idx')")
+            for model in (Recipe, RecipeSearchDocument):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        queryset = search_recipes(Recipe.objects.filter(user=self.user), "lime")
+        plan = explain(queryset)
+
+        self.assertIn("recipe_search_vector_idx", indexes_used(plan))
+
+
+class BackfillSearchCommandTests(TestCase):
+    """Test the backfill_search command."""
+
+    def test_builds_missing_documents(self):
+        """Test documents are built for recipes without one."""
+        user = get_user_model().objects.create_user(email="user@example.com")
+        recipes = [create_recipe(user, f"Lime dish {i}") for i in range(5)]
+        recipes[0].tags.add(Tag.objects.create(user=user, name="Zesty"))
+        expected = dict(RecipeSearchDocument.objects.values_list("recipe", "vector"))
+        RecipeSearchDocument.objects.all().delete()
+
+        out = StringIO()
+        call_command("backfill_search", "--batch-size=2", stdout=out)
+
+        self.assertIn("Built 5 search document(s)", out.getvalue())
+        built = dict(RecipeSearchDocument.objects.values_list("recipe", "vector"))
+        self.assertEqual(built, expected)
+        self.assertIn("zesti", built[recipes[0].id])
+
+    def test_skips_existing_documents(self):
+        """Test only missing documents are built unless --all is given."""
+        user = get_user_model().objects.create_user(email="user@example.com")
+        create_recipe(user, "Lime pickle")
+
+        out = StringIO()
+        call_command("backfill_search", stdout=out)
+        self.assertIn("Built 0 search document(s)", out.getvalue())
+
+        call_command("backfill_search", "--all", stdout=out)
+        self.assertIn("Built 1 search document(s)", out.getvalue())
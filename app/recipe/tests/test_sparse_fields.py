@@ -0,0 +1,162 @@
+"""Tests for the fields= and expand= parameters of the recipe APIs."""
+
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin
+
+RECIPES_URL = reverse("recipe:recipe-list")
+SEARCH_URL = reverse("recipe:recipe-search")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class SparseFieldsTests(QueryBudgetMixin, TestCase):
+    """Test narrowing recipe responses to the requested fields."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Lime pickle",
+            description="Sour and hot",
+            time_minutes=30,
+            price="2.00",
+        )
+        self.tag = Tag.objects.create(user=self.user, name="Spicy")
+        self.ingredient = Ingredient.objects.create(user=self.user, name="Lime")
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def _get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, [query["sql"] for query in queries]
+
+    def _recipe_query(self, queries):
+        return next(sql for sql in queries if 'FROM "core_recipe" ' in sql)
+
+    def test_default_fields_unchanged(self):
+        """Test the list renders its usual fields without loading description."""
+        res, queries = self._get(RECIPES_URL, {})
+
+        self.assertEqual(
+            list(res.data["results"][0]),
+            [
+                "id",
+                "title",
+                "time_minutes",
+                "price",
+                "link",
+                "tags",
+                "ingredients",
+                "image",
+                "image_status",
+                "image_variants",
+            ],
+        )
+        self.assertNotIn("description", self._recipe_query(queries))
+
+    def test_select_fields(self):
+        """Test only the requested fields and columns are loaded."""
+        res, queries = self._get(RECIPES_URL, {"fields": "id, title"})
+
+        self.assertEqual(
+            res.data["results"], [{"id": self.recipe.id, "title": "Lime pickle"}]
+        )
+        # ETag aggregate and the recipes; no prefetches
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"core_recipe"."price"', self._recipe_query(queries))
+
+    def test_description_on_request(self):
+        """Test the list returns description when asked for it."""
+        res, _ = self._get(RECIPES_URL, {"fields": "title,description"})
+
+        self.assertEqual(res.data["results"][0]["description"], "Sour and hot")
+
+    def test_collapsed_relations(self):
+        """Test relations left out of expand are rendered as IDs."""
+        res, _ = self._get(RECIPES_URL, {"expand": "tags"})
+
+        result = res.data["results"][0]
+        self.assertEqual(result["tags"], [{"id": self.tag.id, "name": "Spicy"}])
+        self.assertEqual(result["ingredients"], [self.ingredient.id])
+
+    def test_expand_none(self):
+        """Test an empty expand renders every relation as IDs."""
+        res, queries = self._get(RECIPES_URL, {"expand": ""})
+
+        result = res.data["results"][0]
+        self.assertEqual(result["tags"], [self.tag.id])
+        tag_query = next(sql for sql in queries if 'FROM "core_tag"' in sql)
+        self.assertNotIn('"core_tag"."name"', tag_query)
+
+    def test_retrieve_fields(self):
+        """Test the detail view can be narrowed too."""
+        res, _ = self._get(detail_url(self.recipe.id), {"fields": "description"})
+
+        self.assertEqual(res.data, {"description": "Sour and hot"})
+
+    def test_search_fields(self):
+        """Test search results can be narrowed and keep their rank."""
+        res, _ = self._get(SEARCH_URL, {"q": "pickle", "fields": "title,rank"})
+
+        self.assertEqual(list(res.data["results"][0]), ["title", "rank"])
+
+    def test_unknown_names_rejected(self):
+        """Test unknown fields or relations return an error."""
+        for params in [{"fields": "id,secret"}, {"expand": "user"}]:
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], res.data)
+
+    def test_updates_unaffected(self):
+        """Test fields= does not narrow what an update saves."""
+        url = f"{detail_url(self.recipe.id)}?fields=title"
+
+        res = self.client.patch(url, {"time_minutes": 45}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.time_minutes, 45)
+        self.assertEqual(self.recipe.description, "Sour and hot")
+
+    def test_sparse_fields_benchmark(self):
+        """Test the benchmark reports smaller narrowed pages."""
+        out = StringIO()
+
+        call_command(
+            "benchmark",
+            "recipe_sparse_fields",
+            "--size=20",
+            "--iterations=1",
+            stdout=out,
+        )
+
+        results = json.loads(out.getvalue())["recipe_sparse_fields"]
+        self.assertLess(results["id_title"]["bytes"], results["full"]["bytes"])
+        self.assertLess(
+            results["id_title"]["queries_per_call"],
+            results["full"]["queries_per_call"],
+        )
@@ -0,0 +1,312 @@
+"""Tests for the bulk recipe import and export APIs."""
+
+import json
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.query_detector import QueryBudgetMixin, query_budget
+from recipe import transfer
+from recipe.bitmaps import filter_recipes, get_recipe_index, reset_recipe_index
+from recipe.search import search_recipes
+
+IMPORT_URL = reverse("recipe:recipe-import")
+EXPORT_URL = reverse("recipe:recipe-export")
+NDJSON = "application/x-ndjson"
+
+
+def record(title, tags=(), ingredients=(), **fields):
+    """Return an import record for a recipe."""
+    return {
+        "title": title,
+        "time_minutes": 10,
+        "price": "2.50",
+        "tags": [{"name": name} for name in tags],
+        "ingredients": [{"name": name} for name in ingredients],
+        **fields,
+    }
+
+
+def ndjson(records):
+    """Return records as an NDJSON body."""
+    return "".join(json.dumps(r) + "\n" for r in records).encode()
+
+
+class JSONArrayReaderTests(SimpleTestCase):
+    """Test reading a JSON array a chunk at a time."""
+
+    def _read(self, body):
+        return list(transfer.JSONArrayReader(BytesIO(body.encode())))
+
+    def test_items_across_chunks(self):
+        """Test items split over chunk boundaries are decoded whole."""
+        items = [{"title": "é" * i, "n": i} for i in range(50)]
+
+        with patch.object(transfer, "CHUNK_SIZE", 7):
+            self.assertEqual(self._read(json.dumps(items)), items)
+
+    def test_empty_array(self):
+        """Test an empty array yields nothing."""
+        self.assertEqual(self._read(" [ ] "), [])
+
+    def test_malformed(self):
+        """Test broken arrays raise ImportStreamError."""
+        for body in ['{"title": "x"}', '[{"title": 1} {"title": 2}]', "[{", "[] x"]:
+            with self.subTest(body=body):
+                with self.assertRaises(transfer.ImportStreamError):
+                    self._read(body)
+
+    def test_record_too_large(self):
+        """Test an over-long record is rejected."""
+        with patch.multiple(transfer, MAX_RECORD_SIZE=100, CHUNK_SIZE=16):
+            with self.assertRaises(transfer.ImportStreamError):
+                self._read(json.dumps([{"title": "x" * 1000}]))
+
+
+class RecipeImportTests(QueryBudgetMixin, TestCase):
+    """Test the bulk import API."""
+
+    def setUp(self):
+        reset_recipe_index()
+        self.addCleanup(reset_recipe_index)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _import(self, body, content_type=NDJSON):
+        # an import creates recipes, tags, ingredients and links in bulk
+        with query_budget(11):
+            return self.client.post(IMPORT_URL, body, content_type=content_type)
+
+    def test_import_ndjson(self):
+        """Test recipes with their tags and ingredients are created."""
+        Tag.objects.create(user=self.user, name="Vegan")
+        body = ndjson(
+            [
+                record("Chilli", ["Vegan", "Spicy"], ["Beans"], description="Hot"),
+                record("Curry", ["Spicy"], ["Beans", "Rice", "Beans"]),
+            ]
+        )
+
+        res = self._import(body)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {"created": 2, "failed": 0, "errors": []})
+        chilli = Recipe.objects.get(user=self.user, title="Chilli")
+        self.assertEqual(chilli.description, "Hot")
+        self.assertEqual(
+            sorted(chilli.tags.values_list("name", flat=True)), ["Spicy", "Vegan"]
+        )
+        curry = Recipe.objects.get(user=self.user, title="Curry")
+        self.assertEqual(
+            sorted(curry.ingredients.values_list("name", flat=True)), ["Beans", "Rice"]
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_import_json_array(self):
+        """Test a JSON array body is imported too."""
+        body = json.dumps([record("Toast"), record("Soup")])
+
+        res = self._import(body, content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_batches_use_constant_queries(self):
+        """Test a batch is written with a fixed number of queries."""
+        records = [record(f"Recipe {i}", [f"Tag {i}"], ["Salt"]) for i in range(50)]
+
+        # savepoint, tags and ingredients (select, insert, select each),
+        # recipes, two through tables, release
+        with self.assertNumQueries(11):
+            res = self._import(ndjson(records))
+
+        self.assertEqual(res.data["created"], 50)
+
+    def test_batches_committed_separately(self):
+        """Test every batch is written in its own transaction."""
+        records = [record(f"Recipe {i}") for i in range(5)]
+
+        with patch.object(transfer, "BATCH_SIZE", 2):
+            with patch.object(
+                transfer.RecipeImporter, "_write", autospec=True
+            ) as write:
+                write.side_effect = lambda importer, batch: None
+                transfer.import_stream(self.user, BytesIO(ndjson(records)), NDJSON, 2)
+
+        self.assertEqual(
+            [len(call.args[1]) for call in write.call_args_list], [2, 2, 1]
+        )
+
+    def test_invalid_records_reported(self):
+        """Test invalid records are skipped and reported by position."""
+        body = ndjson([record("Good"), {"title": "No time"}, record("x" * 300)])
+
+        res = self._import(body)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["failed"], 2)
+        self.assertEqual([error["index"] for error in res.data["errors"]], [1, 2])
+        self.assertIn("time_minutes", res.data["errors"][0]["errors"])
+
+    def test_malformed_stream_keeps_earlier_records(self):
+        """Test records before a broken line are still imported."""
+        body = ndjson([record("Good")]) + b"{not json\n" + ndjson([record("Lost")])
+
+        res = self._import(body)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["created"], 1)
+        self.assertIn("Record 1", res.data["detail"])
+        titles = Recipe.objects.filter(user=self.user).values_list("title", flat=True)
+        self.assertEqual(list(titles), ["Good"])
+
+    def test_unsupported_media_type(self):
+        """Test bodies other than JSON and NDJSON are refused."""
+        res = self._import(b"title,time", content_type="text/csv")
+
+        self.assertEqual(res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_body_without_length_refused(self):
+        """Test a body with no Content-Length is refused, not read as empty."""
+        res = self.client.generic(
+            "POST", IMPORT_URL, ndjson([record("Lost")]), NDJSON, CONTENT_LENGTH=""
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_411_LENGTH_REQUIRED)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_empty_body_refused(self):
+        """Test an empty body is a bad request, not an import of nothing."""
+        res = self.client.generic("POST", IMPORT_URL, b"", NDJSON, CONTENT_LENGTH="0")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("detail", res.data)
+
+    def test_imported_recipes_indexed(self):
+        """Test imported recipes are searchable and matched by tag filters."""
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        get_recipe_index().get(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._import(ndjson([record("Lime pickle", ["Vegan"])]))
+
+        recipe = Recipe.objects.get(user=self.user)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(list(search_recipes(recipes, "pickle")), [recipe])
+        matched = filter_recipes(recipes, self.user.id, [("tags", [vegan.id], "all")])
+        self.assertEqual(list(matched), [recipe])
+
+    def test_import_benchmark(self):
+        """Test the benchmark compares per-recipe and bulk imports."""
+        out = StringIO()
+
+        call_command(
+            "benchmark", "recipe_import", "--size=20", "--iterations=1", stdout=out
+        )
+
+        results = json.loads(out.getvalue())["recipe_import"]
+        self.assertGreater(
+            results["per_recipe"]["queries_per_call"],
+            results["bulk_import"]["queries_per_call"],
+        )
+
+
+class RecipeExportTests(QueryBudgetMixin, TestCase):
+    """Test the streaming export API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self, params=None):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], NDJSON)
+        body = b"".join(res.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_export_own_recipes(self):
+        """Test the user's recipes are streamed oldest first."""
+        other = get_user_model().objects.create_user(email="other@example.com")
+        Recipe.objects.create(user=other, title="Not mine", time_minutes=1, price=1)
+        for title in ["First", "Second"]:
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price="1.50"
+            )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Quick"))
+
+        lines = self._export()
+
+        self.assertEqual([line["title"] for line in lines], ["First", "Second"])
+        self.assertEqual(lines[1]["price"], "1.50")
+        self.assertEqual([tag["name"] for tag in lines[1]["tags"]], ["Quick"])
+
+    def test_export_in_chunks(self):
+        """Test recipes are read a chunk at a time."""
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"R{i}", time_minutes=5, price=1
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f"I{i}")
+            )
+
+        # one server-side cursor, then tag and ingredient prefetches per chunk
+        with patch.object(transfer, "EXPORT_CHUNK_SIZE", 2):
+            with self.assertNumQueries(7):
+                lines = self._export()
+
+        self.assertEqual(len(lines), 5)
+
+    def test_export_filtered(self):
+        """Test the list filters apply to the export."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        Recipe.objects.create(user=self.user, title="Steak", time_minutes=5, price=1)
+        stew = Recipe.objects.create(
+            user=self.user, title="Stew", time_minutes=5, price=1
+        )
+        stew.tags.add(tag)
+
+        lines = self._export({"tags": str(tag.id)})
+
+        self.assertEqual([line["title"] for line in lines], ["Stew"])
+
+    def test_round_trip(self):
+        """Test an export imports back into an equal set of recipes."""
+        recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minutes=30, price="3.20", link="x"
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Lentils")
+        )
+        exported = self._export()
+
+        other = get_user_model().objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+        with query_budget(11):
+            res = self.client.post(IMPORT_URL, ndjson(exported), content_type=NDJSON)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        reexported = self._export()
+        for line in exported + reexported:
+            line.pop("id")
+            for item in line["tags"] + line["ingredients"]:
+                item.pop("id")
+        self.assertEqual(reexported, exported)
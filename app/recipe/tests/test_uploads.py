@@ -0,0 +1,144 @@
+"""Tests for the streaming recipe image upload handler."""
+
+import hashlib
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import exceptions, status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.query_detector import QueryBudgetMixin
+from recipe.uploads import RecipeImageUploadHandler, UploadTooLarge
+
+
+def image_upload_url(recipe_id):
+    """Create and return an image upload URL."""
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def image_bytes(size=(300, 200), image_format="JPEG"):
+    """Return the encoded bytes of a sample image."""
+    buffer = BytesIO()
+    Image.new("RGB", size, color=(10, 120, 200)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def feed(handler, data, chunk_size=1024):
+    """Stream data through handler in chunks and return the completed file."""
+    handler.new_file("image", "upload.jpg", "image/jpeg", len(data))
+    for start in range(0, len(data), chunk_size):
+        end = start + chunk_size
+        handler.receive_data_chunk(data[start:end], start)
+    return handler.file_complete(len(data))
+
+
+class RecipeImageUploadHandlerTests(TestCase):
+    """Test the upload handler on its own."""
+
+    def test_streams_to_disk_and_hashes(self):
+        """Test a valid image is written to a temporary file with its hash."""
+        data = image_bytes()
+        handler = RecipeImageUploadHandler()
+
+        with self.assertLogs("recipe.uploads", level="INFO") as logs:
+            uploaded = feed(handler, data)
+
+        self.assertEqual(uploaded.read(), data)
+        self.assertEqual(uploaded.sha256, hashlib.sha256(data).hexdigest())
+        self.assertTrue(uploaded.temporary_file_path())
+        self.assertEqual(handler.dimensions, (300, 200))
+        self.assertIn("peak", logs.output[0])
+        uploaded.close()
+
+    def test_memory_bounded_by_chunk(self):
+        """Test only the current chunk is buffered once the header is read."""
+        data = image_bytes(size=(1500, 1500))
+        handler = RecipeImageUploadHandler()
+
+        with self.assertLogs("recipe.uploads", level="INFO"):
+            feed(handler, data, chunk_size=4096).close()
+
+        self.assertGreater(len(data), 8 * 4096)
+        self.assertLessEqual(handler.peak_buffered, 2 * 4096)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=4096)
+    def test_oversized_upload_aborted_early(self):
+        """Test reading stops at the first chunk over the size limit."""
+        data = image_bytes(size=(1500, 1500))
+        handler = RecipeImageUploadHandler()
+        handler.new_file("image", "upload.jpg", "image/jpeg", len(data))
+
+        handler.receive_data_chunk(data[:4096], 0)
+        with self.assertRaises(UploadTooLarge):
+            handler.receive_data_chunk(data[4096:8192], 4096)
+
+    def test_non_image_rejected_on_first_chunk(self):
+        """Test a body without image magic bytes is rejected immediately."""
+        handler = RecipeImageUploadHandler()
+        handler.new_file("image", "upload.jpg", "image/jpeg", None)
+
+        with self.assertRaises(exceptions.ValidationError):
+            handler.receive_data_chunk(b"#!/bin/sh\necho not an image\n", 0)
+
+    @patch("recipe.images.MAX_PIXELS", 100)
+    def test_dimensions_checked_from_header(self):
+        """Test images over the pixel limit are rejected before completion."""
+        data = image_bytes(size=(300, 200))
+        handler = RecipeImageUploadHandler()
+        handler.new_file("image", "upload.jpg", "image/jpeg", len(data))
+
+        with self.assertRaises(exceptions.ValidationError):
+            handler.receive_data_chunk(data[:1024], 0)
+
+
+class ImageUploadLimitTests(QueryBudgetMixin, TestCase):
+    """Test upload limits through the API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "password123",
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+
+    def _post(self, content, name="photo.jpg"):
+        upload = SimpleUploadedFile(name, content, content_type="image/jpeg")
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {"image": upload},
+            format="multipart",
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_oversized_upload_rejected(self):
+        """Test uploads over the limit get 413 and are not stored."""
+        res = self._post(image_bytes(size=(800, 800)))
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_non_image_rejected(self):
+        """Test a non-image body is rejected with a validation error."""
+        res = self._post(b"plain text pretending to be a photo")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", res.data)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
@@ -0,0 +1,249 @@
+"""
+Bulk import and streaming export of recipes.
+
+Imports read the request body a piece at a time, either as NDJSON (one
+recipe per line) or as a JSON array, validate each record on its own and
+write every batch of valid recipes in its own transaction: one INSERT for
+the recipes and one per through table, instead of the per-recipe create
+and get_or_create round trips of RecipeSerializer. The search documents
+are kept by the database triggers.
+
+Exports stream the user's recipes as NDJSON in the same format, reading
+them with iterator() so memory use does not grow with the recipe count.
+Django's ASGI handler reads a sync streaming body to the end before
+sending any of it, so under ASGI the export is an async body instead,
+reading and rendering each chunk of recipes in a thread.
+"""
+
+import codecs
+import json
+import re
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeTransferSerializer, get_or_create_attrs
+
+NDJSON_MEDIA_TYPES = ["application/x-ndjson", "application/ndjson"]
+# recipes validated and written per transaction
+BATCH_SIZE = 500
+# bytes read from the request body at a time
+CHUNK_SIZE = 64 * 1024
+# larger records are rejected rather than buffered
+MAX_RECORD_SIZE = 1024 * 1024
+# validation errors listed in the response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+# recipes fetched per query (and per prefetch of their tags/ingredients)
+EXPORT_CHUNK_SIZE = 500
+
+RELATIONS = [("tags", Tag), ("ingredients", Ingredient)]
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class ImportStreamError(ValueError):
+    """The import body cannot be read any further."""
+
+
+def read_ndjson(stream):
+    """Yield the records of an NDJSON stream, one per non-blank line."""
+    while True:
+        line = stream.readline(MAX_RECORD_SIZE + 1)
+        if not line:
+            return
+        if len(line) > MAX_RECORD_SIZE:
+            raise ImportStreamError("Record is too large.")
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ImportStreamError("Record is not valid JSON.")
+
+
+class JSONArrayReader:
+    """Yield the items of a JSON array read from a stream in chunks."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk to the buffer; return False at the end."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(CHUNK_SIZE)
+        self.eof = not chunk
+        try:
+            text = self.text_decoder.decode(chunk, final=self.eof)
+        except UnicodeDecodeError:
+            raise ImportStreamError("Body is not valid UTF-8.")
+        # drop what has been consumed so the buffer stays about one record
+        pos = self.pos
+        self.buffer = self.buffer[pos:] + text
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or "" at the end."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos] if self.pos < len(self.buffer) else ""
+
+    def _item(self):
+        """Decode the value starting at the current position."""
+        self._peek()
+        while True:
+            try:
+                item, self.pos = self.json_decoder.raw_decode(self.buffer, self.pos)
+                return item
+            except ValueError:
+                # most likely the value continues in the next chunk
+                pending = len(self.buffer) - self.pos
+                if pending > MAX_RECORD_SIZE:
+                    raise ImportStreamError("Record is too large.")
+                if not self._fill():
+                    raise ImportStreamError("Record is not valid JSON.")
+
+    def __iter__(self):
+        if self._peek() != "[":
+            raise ImportStreamError("Expected a JSON array.")
+        self.pos += 1
+        if self._peek() == "]":
+            self.pos += 1
+        else:
+            while True:
+                yield self._item()
+                char = self._peek()
+                self.pos += 1
+                if char == "]":
+                    break
+                if char != ",":
+                    raise ImportStreamError("Expected ',' or ']' after a record.")
+        if self._peek():
+            raise ImportStreamError("Unexpected data after the array.")
+
+
+class RecipeImporter:
+    """Validate records and write the valid ones as recipes in batches."""
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        # one instance validates every record; run_validation keeps no state
+        self.serializer = RecipeTransferSerializer()
+        self.read = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, records):
+        """Import records; return counts, errors and why reading stopped."""
+        result = {}
+        batch = []
+        try:
+            for record in records:
+                data = self._validate(record)
+                self.read += 1
+                if data is not None:
+                    batch.append(data)
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+        except ImportStreamError as exc:
+            # the records before the broken one are still imported
+            result["detail"] = f"Record {self.read}: {exc}"
+        if batch:
+            self._write(batch)
+
+        result.update(created=self.created, failed=self.failed, errors=self.errors)
+        return result
+
+    def _validate(self, record):
+        """Return the validated record, or None after noting its errors."""
+        try:
+            return self.serializer.run_validation(record)
+        except ValidationError as exc:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"index": self.read, "errors": exc.detail})
+            return None
+
+    def _write(self, batch):
+        """Create the recipes of batch and link their tags and ingredients."""
+        with transaction.atomic():
+            attr_ids = {}
+            for relation, model in RELATIONS:
+                names = [
+                    item["name"] for data in batch for item in data.get(relation, [])
+                ]
+                objects = get_or_create_attrs(model, self.user, names)
+                attr_ids[relation] = {obj.name: obj.id for obj in objects}
+
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    user=self.user,
+                    **{k: v for k, v in data.items() if k not in attr_ids},
+                )
+                for data in batch
+            )
+
+            for relation, ids_by_name in attr_ids.items():
+                field = Recipe._meta.get_field(relation)
+                through = field.remote_field.through
+                source = f"{field.m2m_field_name()}_id"
+                target = f"{field.m2m_reverse_field_name()}_id"
+                rows = []
+                for recipe, data in zip(recipes, batch):
+                    items = data.get(relation, [])
+                    names = dict.fromkeys(item["name"] for item in items)
+                    rows.extend(
+                        through(**{source: recipe.id, target: ids_by_name[name]})
+                        for name in names
+                    )
+                through.objects.bulk_create(rows)
+        self.created += len(recipes)
+
+
+def import_stream(user, stream, media_type, batch_size=BATCH_SIZE):
+    """Import the recipes in stream, NDJSON or a JSON array by media_type."""
+    if media_type in NDJSON_MEDIA_TYPES:
+        records = read_ndjson(stream)
+    else:
+        records = JSONArrayReader(stream)
+    return RecipeImporter(user, batch_size).run(records)
+
+
+def export_recipes(queryset, serializer):
+    """Yield the recipes of queryset as NDJSON lines."""
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for recipe in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        data = serializer.to_representation(recipe)
+        yield (encoder.encode(data) + "\n").encode()
+
+
+def _read_chunk(lines):
+    """Return the next EXPORT_CHUNK_SIZE lines of lines as one chunk."""
+    return b"".join(islice(lines, EXPORT_CHUNK_SIZE))
+
+
+async def aexport_recipes(queryset, serializer):
+    """export_recipes() as an async body, for the ASGI handler."""
+    lines = export_recipes(queryset, serializer)
+    # thread sensitive, like the async ORM: every chunk is read on the
+    # thread and connection that opened the cursor
+    read_chunk = sync_to_async(_read_chunk)
+    try:
+        while chunk := await read_chunk(lines):
+            yield chunk
+    finally:
+        # closes the cursor early if the client went away
+        await sync_to_async(lines.close)()
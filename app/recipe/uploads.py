@@ -0,0 +1,131 @@
+"""Streaming upload handler for recipe images."""
+
+import hashlib
+import logging
+from io import BytesIO
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from rest_framework import exceptions, status
+
+from recipe import images
+
+logger = logging.getLogger(__name__)
+
+# stop looking for width/height after this many bytes; large EXIF or ICC
+# segments can push a JPEG's frame header past the first chunk
+HEADER_LIMIT = 512 * 2**10
+# allowance for multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD = 64 * 2**10
+
+
+class UploadTooLarge(exceptions.APIException):
+    """Raised when an upload is over RECIPE_IMAGE_MAX_UPLOAD_SIZE."""
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Uploaded file is too large."
+    default_code = "upload_too_large"
+
+
+def invalid_image(message):
+    """Return the error raised for an upload that is not an image we accept."""
+    return exceptions.ValidationError({"image": [message]})
+
+
+class RecipeImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream an image upload to disk, validating it as chunks arrive.
+
+    Only the current chunk and, until width and height are known, the
+    first bytes of the file are held in memory. Bodies that are too large
+    or are not images are rejected as soon as that is detectable, without
+    reading the rest of the request.
+    """
+
+    image_field = "image"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        self.peak_buffered = 0
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        # reject on the declared length before reading any of the body
+        if content_length and content_length > self.max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.image_field:
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.head = b""
+        self.size = 0
+        self.image_format = None
+        self.dimensions = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self._abort()
+            raise UploadTooLarge()
+
+        if self.dimensions is None and len(self.head) < HEADER_LIMIT:
+            self.head += raw_data
+            self._inspect_head()
+            if self.dimensions is not None or len(self.head) >= HEADER_LIMIT:
+                # the serializer re-checks anything we could not decide here
+                self.head = b""
+
+        self.peak_buffered = max(self.peak_buffered, len(raw_data) + len(self.head))
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.image_format is None:
+            self._inspect_head(final=True)
+        self.head = b""
+        uploaded = super().file_complete(file_size)
+        # lets storage reuse the digest instead of reading the file again
+        uploaded.sha256 = self.sha256.hexdigest()
+        logger.info(
+            "Image upload %s: %d bytes, %s %s, peak %d bytes buffered in memory",
+            self.file_name,
+            file_size,
+            self.image_format,
+            "x".join(str(d) for d in self.dimensions or ()) or "size unknown",
+            self.peak_buffered,
+        )
+        return uploaded
+
+    def _inspect_head(self, final=False):
+        """Check the magic bytes and, once available, the image dimensions."""
+        if self.image_format is None:
+            if len(self.head) < images.SIGNATURE_LENGTH and not final:
+                return
+            self.image_format = images.sniff_format(self.head)
+            if self.image_format is None:
+                self._abort()
+                raise invalid_image("Upload a JPEG, PNG, WEBP or GIF image.")
+
+        try:
+            with Image.open(BytesIO(self.head)) as image:
+                self.dimensions = image.size
+        except Image.DecompressionBombError:
+            self.dimensions = (images.MAX_PIXELS + 1, 1)
+        except (OSError, SyntaxError, ValueError):
+            # header not complete yet, try again with the next chunk
+            return
+
+        width, height = self.dimensions
+        if width * height > images.MAX_PIXELS:
+            self._abort()
+            raise invalid_image("Image dimensions are too large.")
+
+    def _abort(self):
+        """Drop the partially written file."""
+        self.head = b""
+        self.upload_interrupted()
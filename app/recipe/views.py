@@ -6,18 +6,50 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
 )
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins, status
 
 # action is a way to add new functionality to viewset default functionality
 from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
 from rest_framework.response import Response
 
 
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from core.async_views import AsyncViewMixin
 from core.models import Recipe, Tag, Ingredient
 from recipe import serializers
+from recipe.autocomplete import autocomplete
+from recipe.batch import MAX_BATCH_SIZE, batch_delete, batch_update
+from recipe.bitmaps import filter_recipes
+from recipe.conditional import ConditionalGetMixin, ConditionalRetrieveMixin
+from recipe.fast_serializers import ValuesListMixin
+from recipe.filters import recipe_linked_to, used_by_recipes
+from recipe.response_cache import ResponseCacheMixin
+from recipe.tasks import enqueue_image_processing
+from recipe.transfer import (
+    NDJSON_MEDIA_TYPES,
+    aexport_recipes,
+    export_recipes,
+    import_stream,
+)
+from recipe.uploads import RecipeImageUploadHandler
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+    RecipeSearchPagination,
+)
+from recipe.search import search_recipes
+from user.authentication import CachedTokenAuthentication
 
+# how the IDs given to the tags/ingredients filters must match
+FILTER_MODES = ["any", "all", "exclude"]
+# longest list of IDs accepted by one filter parameter
+MAX_FILTER_IDS = 100
+# tag/ingredient autocomplete results returned by default and at most
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
 
 # by using MODELVIEWSET ,
 # You're telling Django REST Framework (DRF):
@@ -39,55 +71,177 @@ from recipe import serializers
 # destroy() – DELETE /recipes/<id>/
 
 
+# query parameters shared by the recipe list and search
+FILTER_PARAMETERS = [
+    OpenApiParameter(
+        "tags",
+        OpenApiTypes.STR,
+        description="Comma separated list of tag IDs to filter.",
+    ),
+    OpenApiParameter(
+        "tags_mode",
+        OpenApiTypes.STR,
+        enum=FILTER_MODES,
+        description=(
+            "How tags match: recipes with any of them (default), "
+            "all of them, or none of them (exclude)."
+        ),
+    ),
+    OpenApiParameter(
+        "ingredients",
+        OpenApiTypes.STR,
+        description="Comma separated list of ingredient IDS to filter.",
+    ),
+    OpenApiParameter(
+        "ingredients_mode",
+        OpenApiTypes.STR,
+        enum=FILTER_MODES,
+        description="How ingredients match, like tags_mode.",
+    ),
+]
+
+# actions whose responses can be narrowed with fields= and expand=
+SPARSE_ACTIONS = ["list", "retrieve", "search"]
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        OpenApiTypes.STR,
+        description=(
+            "Comma separated list of the fields to return, e.g. id,title. "
+            "The list and search also accept description."
+        ),
+    ),
+    OpenApiParameter(
+        "expand",
+        OpenApiTypes.STR,
+        description=(
+            "Comma separated list of the relations (tags, ingredients) "
+            "returned as objects; the others are returned as lists of IDs. "
+            "All are expanded by default."
+        ),
+    ),
+]
+
+
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                "tags",
-                OpenApiTypes.STR,
-                description="Comma separated list of tag IDs to filter.",
-            ),
-            OpenApiParameter(
-                "Ingredients",
-                OpenApiTypes.STR,
-                description="Comma separated list of ingredient IDS to filter.",
-            ),
-        ]
-    )
+    list=extend_schema(parameters=FILTER_PARAMETERS + SPARSE_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalRetrieveMixin,
+    ResponseCacheMixin,
+    ValuesListMixin,
+    AsyncViewMixin,
+    viewsets.ModelViewSet,
+):
     """View for manage recipe APIs."""
 
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
 
-    def _params_to_ints(self, qs):
+    def _params_to_ints(self, qs, param="ids"):
         """convert a list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(",")]
+        try:
+            ids = [int(str_id) for str_id in qs.split(",") if str_id.strip()]
+        except ValueError:
+            raise ValidationError({param: ["Expected a comma separated list of IDs."]})
+        if len(ids) > MAX_FILTER_IDS:
+            raise ValidationError({param: [f"At most {MAX_FILTER_IDS} IDs allowed."]})
+        return ids
+
+    def _filter_mode(self, param):
+        """Return the validated match mode for a filter parameter."""
+        mode = self.request.query_params.get(f"{param}_mode", "any")
+        if mode not in FILTER_MODES:
+            choices = ", ".join(FILTER_MODES)
+            raise ValidationError({f"{param}_mode": [f"Choose one of: {choices}."]})
+        return mode
 
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
+        queryset = self.queryset.filter(user=self.request.user)
         # parameters given in the urls is accessed through this method
-        tags = self.request.query_params.get("tags")
-        ingredients = self.request.query_params.get("ingredients")
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-
-        return queryset.filter(user=self.request.user).order_by("-id").distinct()
+        indexed = []
+        for param in ["tags", "ingredients"]:
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            ids = self._params_to_ints(value, param)
+            mode = self._filter_mode(param)
+            if mode == "any":
+                # EXISTS never duplicates a recipe, so no DISTINCT is needed
+                queryset = queryset.filter(recipe_linked_to(param, ids))
+            else:
+                indexed.append((param, ids, mode))
+        if indexed:
+            # "all" and "exclude" are answered by the in-memory bitmap index
+            queryset = filter_recipes(queryset, self.request.user.id, indexed)
+
+        return self._setup_eager_loading(queryset.order_by("-id"))
+
+    def _names_param(self, param, choices):
+        """Return the validated names in a comma separated query parameter."""
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in choices]
+        if unknown:
+            raise ValidationError(
+                {
+                    param: [
+                        f"Unknown: {', '.join(unknown)}. "
+                        f"Choose from: {', '.join(choices)}."
+                    ]
+                }
+            )
+        return names
+
+    def _sparse_fieldset(self):
+        """Return the fields and expand selections of the request."""
+        if self.action not in SPARSE_ACTIONS:
+            return None, None
+        if not hasattr(self, "_sparse"):
+            serializer_class = self.get_serializer_class()
+            fields = self._names_param("fields", serializer_class.Meta.fields)
+            expand = self._names_param(
+                "expand", serializer_class.prefetch_related_fields
+            )
+            # an empty fields= means the defaults, an empty expand= means none
+            self._sparse = (fields or None, expand)
+        return self._sparse
+
+    def _setup_eager_loading(self, queryset):
+        """Preload the relations the serializer for this action renders."""
+        # destroy never renders the recipe, so there is nothing to preload
+        if self.action == "destroy":
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if self.action in SPARSE_ACTIONS:
+            # skip the columns and relations that will not be rendered
+            fields, expand = self._sparse_fieldset()
+            return serializer_class.setup_eager_loading(queryset, fields, expand)
+        return serializer_class.setup_eager_loading(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, narrowed to the requested fields."""
+        if self.action in SPARSE_ACTIONS:
+            kwargs["fields"], kwargs["expand"] = self._sparse_fieldset()
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == "list":
             return serializers.RecipeSerializer
+        elif self.action == "search":
+            return serializers.RecipeSearchSerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        elif self.action in ("import_recipes", "export", "batch"):
+            return serializers.RecipeTransferSerializer
 
         return self.serializer_class
 
@@ -97,16 +251,147 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                required=True,
+                description=(
+                    "Words to look for in the title, description, tags and "
+                    'ingredients. Supports "phrases", -word and or.'
+                ),
+            ),
+            *FILTER_PARAMETERS,
+            *SPARSE_PARAMETERS,
+        ]
+    )
+    @action(methods=["GET"], detail=False, pagination_class=RecipeSearchPagination)
+    def search(self, request):
+        """Search recipes by text, best match first."""
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": ["This query parameter is required."]})
+        queryset = search_recipes(self.get_queryset(), text)
+        return self.list_values(queryset)
+
+    @extend_schema(
+        methods=["PATCH"],
+        request=serializers.RecipeBatchUpdateSerializer(many=True),
+        responses={
+            200: serializers.RecipeBatchResponseSerializer,
+            400: serializers.RecipeBatchResponseSerializer,
+        },
+    )
+    @extend_schema(
+        methods=["DELETE"],
+        parameters=[
+            OpenApiParameter(
+                "ids",
+                OpenApiTypes.STR,
+                required=True,
+                description="Comma separated list of recipe IDs to delete.",
+            )
+        ],
+        responses={
+            200: serializers.RecipeBatchResponseSerializer,
+            400: serializers.RecipeBatchResponseSerializer,
+        },
+    )
+    @action(methods=["PATCH", "DELETE"], detail=False)
+    def batch(self, request):
+        """Update or delete many recipes in one transaction."""
+        if request.method == "DELETE":
+            ids = self._params_to_ints(request.query_params.get("ids", ""))
+            if not ids:
+                raise ValidationError({"ids": ["This query parameter is required."]})
+            results = batch_delete(request.user, ids)
+        else:
+            items = request.data
+            if not isinstance(items, list) or not items:
+                raise ValidationError(
+                    {"non_field_errors": ["Expected a non-empty list of changes."]}
+                )
+            if len(items) > MAX_BATCH_SIZE:
+                raise ValidationError(
+                    {"non_field_errors": [f"At most {MAX_BATCH_SIZE} changes allowed."]}
+                )
+            results = batch_update(request.user, items)
+
+        ok = all(result["status"] < 400 for result in results)
+        status_code = status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST
+        return Response({"results": results}, status=status_code)
+
+    @extend_schema(
+        request={
+            "application/x-ndjson": serializers.RecipeTransferSerializer,
+            "application/json": serializers.RecipeTransferSerializer(many=True),
+        },
+        responses={
+            201: serializers.RecipeImportResultSerializer,
+            400: serializers.RecipeImportResultSerializer,
+        },
+    )
+    @action(methods=["POST"], detail=False, url_path="import", url_name="import")
+    def import_recipes(self, request):
+        """Create recipes from an NDJSON stream or a JSON array."""
+        media_type = request.content_type.split(";")[0].strip().lower()
+        if media_type not in NDJSON_MEDIA_TYPES + ["application/json"]:
+            raise UnsupportedMediaType(media_type)
+        if request.stream is None:
+            # the body is only read up to its Content-Length, so a chunked
+            # upload without one reads as empty
+            if not request.META.get("CONTENT_LENGTH"):
+                return Response(
+                    {"detail": "A Content-Length header is required."},
+                    status=status.HTTP_411_LENGTH_REQUIRED,
+                )
+            raise ValidationError({"detail": "The body is empty."})
+
+        # read the body as it arrives instead of parsing it all with
+        # request.data; every batch of valid recipes is committed on its own
+        result = import_stream(request.user, request.stream, media_type)
+
+        ok = not result["failed"] and "detail" not in result
+        status_code = status.HTTP_201_CREATED if ok else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=status_code)
+
+    @extend_schema(
+        parameters=FILTER_PARAMETERS,
+        responses={(200, "application/x-ndjson"): serializers.RecipeTransferSerializer},
+    )
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """Stream the recipes as NDJSON, oldest first."""
+        queryset = self.get_queryset().order_by("id")
+        return self._export_response(export_recipes(queryset, self.get_serializer()))
+
+    async def aexport(self, request):
+        """export() with an async body, which the ASGI handler streams."""
+        queryset = (await self.aget_queryset()).order_by("id")
+        return self._export_response(aexport_recipes(queryset, self.get_serializer()))
+
+    def _export_response(self, lines):
+        response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="recipes.ndjson"'
+        return response
+
     # detail = True means it is applied to only one recipe but not
     # all the recipes
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
+        # must be in place before request.data parses the body
+        request._request.upload_handlers = [RecipeImageUploadHandler(request)]
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            # only the original is stored here; the resized variants are
+            # built by the process_images worker
+            with transaction.atomic():
+                recipe = serializer.save()
+                enqueue_image_processing(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -120,11 +405,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT,
                 enum=[0, 1],
                 description="Filter by items assgined to recipes.",
-            )
+            ),
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                description=(
+                    "Autocomplete: names starting with q, then names with a "
+                    "word starting with q, then similar names. Returns one "
+                    "page of at most limit items."
+                ),
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=(
+                    f"Most items returned with q (default {AUTOCOMPLETE_LIMIT}, "
+                    f"max {MAX_AUTOCOMPLETE_LIMIT})."
+                ),
+            ),
         ]
     )
 )
 class BaseRecipeAttrViewSet(
+    ConditionalGetMixin,
+    ResponseCacheMixin,
+    ValuesListMixin,
+    AsyncViewMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
@@ -132,18 +438,67 @@ class BaseRecipeAttrViewSet(
 ):
     """Base viewset for recipe attributes."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    # name of the Recipe many-to-many field holding these objects
+    recipe_relation = None
 
     # to filter down to the user that created them
     def get_queryset(self):
         """Filter queryset to authenticated user."""
         assigned_only = bool(int(self.request.query_params.get("assigned_only", 0)))
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-
-        return queryset.filter(user=self.request.user).order_by("-name").distinct()
+            queryset = queryset.filter(used_by_recipes(self.recipe_relation))
+
+        queryset = queryset.order_by("-name")
+        return self.get_serializer_class().setup_eager_loading(queryset)
+
+    def _limit(self):
+        """Return the validated autocomplete result limit."""
+        value = self.request.query_params.get("limit", AUTOCOMPLETE_LIMIT)
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_AUTOCOMPLETE_LIMIT:
+            raise ValidationError(
+                {"limit": [f"Expected a number from 1 to {MAX_AUTOCOMPLETE_LIMIT}."]}
+            )
+        return limit
+
+    def _autocomplete_text(self):
+        return self.request.query_params.get("q", "").strip()
+
+    def get_values_serializer(self):
+        """List from values() rows, but autocomplete matches are objects."""
+        if self._autocomplete_text():
+            return None
+        return super().get_values_serializer()
+
+    def get_validator_querysets(self):
+        """Return the querysets whose state the list response depends on."""
+        querysets = super().get_validator_querysets()
+        if int(self.request.query_params.get("assigned_only", 0)):
+            # linking a recipe changes which items are assigned; that bumps
+            # the recipe, not the tag or ingredient
+            querysets.append(Recipe.objects.filter(user=self.request.user))
+        return querysets
+
+    def paginate_queryset(self, queryset):
+        """Return one page of items, or the best matches for q."""
+        text = self._autocomplete_text()
+        if not text:
+            return super().paginate_queryset(queryset)
+        return autocomplete(queryset, self.request.user.id, text, self._limit())
+
+    def get_paginated_response(self, data):
+        """Wrap a page of items, or the matches for q, in the list envelope."""
+        if not self._autocomplete_text():
+            return super().get_paginated_response(data)
+        # same envelope as the paginated list, as a single page
+        return Response({"next": None, "previous": None, "results": data})
 
 
 # mixins helps to modify the prebuilt method
@@ -152,6 +507,7 @@ class TagViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_relation = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -159,3 +515,4 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.IngredientSerialzier
     queryset = Ingredient.objects.all()
+    recipe_relation = "ingredients"
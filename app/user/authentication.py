@@ -0,0 +1,238 @@
+"""
+Cached token authentication for the APIs.
+"""
+
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import LRUCache
+
+DEFAULTS = {
+    "MAX_SIZE": 1024,
+    "TTL": 30,
+    "SHARED_CACHE": None,
+}
+
+
+class TokenCache:
+    """Two-tier cache of token -> user rows.
+
+    The in-process LRU answers most lookups. When SHARED_CACHE names an
+    alias from CACHES, misses fall through to it so workers share warm
+    entries, and it keeps a version per user that every hit is checked
+    against, so a token revoked or a user changed in one worker stops
+    being served by all of them. Without it other workers cannot be told,
+    so the cache is only used when this is the only worker.
+
+    Only plain field values are stored, so every hit builds fresh model
+    instances and one request can never see another's edits.
+    """
+
+    def __init__(self):
+        options = {**DEFAULTS, **getattr(settings, "TOKEN_AUTH_CACHE", {})}
+        self.ttl = options["TTL"]
+        self.local = LRUCache(options["MAX_SIZE"], self.ttl)
+        self.shared_alias = options["SHARED_CACHE"]
+        self.enabled = self.shared_alias is not None or (
+            getattr(settings, "WEB_WORKERS", 1) == 1
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _shared_key(self, key):
+        # never use the raw token as a key in an external cache
+        return "token-auth:" + hashlib.sha256(key.encode()).hexdigest()
+
+    def _version_key(self, user_id):
+        return f"token-auth-user:{user_id}"
+
+    def get(self, key):
+        """Return a (user, token) pair for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self.local.get(key)
+        if self.shared is not None:
+            if entry is None:
+                entry = self.shared.get(self._shared_key(key))
+                if entry is not None:
+                    self.local.set(key, entry)
+            if entry is not None:
+                user_id = entry["token"]["user_id"]
+                version = self.shared.get(self._version_key(user_id))
+                entry = self._current(key, entry, version)
+        return None if entry is None else _load(entry)
+
+    async def aget(self, key):
+        """get() awaiting the shared tier."""
+        if not self.enabled:
+            return None
+        entry = self.local.get(key)
+        if self.shared is not None:
+            if entry is None:
+                entry = await self.shared.aget(self._shared_key(key))
+                if entry is not None:
+                    self.local.set(key, entry)
+            if entry is not None:
+                user_id = entry["token"]["user_id"]
+                version = await self.shared.aget(self._version_key(user_id))
+                entry = self._current(key, entry, version)
+        return None if entry is None else _load(entry)
+
+    def _current(self, key, entry, version):
+        """Return entry, or drop it and return None if its user changed."""
+        if entry["version"] == version:
+            return entry
+        self.local.delete(key)
+        return None
+
+    def set(self, key, user, token):
+        """Cache the user and token rows for key."""
+        if not self.enabled:
+            return
+        entry = _dump(user, token)
+        if self.shared is not None:
+            entry["version"] = self.shared.get(self._version_key(user.pk))
+            self.shared.set(self._shared_key(key), entry, self.ttl)
+        self.local.set(key, entry)
+
+    async def aset(self, key, user, token):
+        """set() awaiting the shared tier."""
+        if not self.enabled:
+            return
+        entry = _dump(user, token)
+        if self.shared is not None:
+            entry["version"] = await self.shared.aget(self._version_key(user.pk))
+            await self.shared.aset(self._shared_key(key), entry, self.ttl)
+        self.local.set(key, entry)
+
+    def delete(self, key):
+        """Drop key from both tiers."""
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+
+    def invalidate_user(self, user_id):
+        """Stop serving every cached token of user_id, in all workers."""
+        self.local.delete_matching(lambda entry: entry["token"]["user_id"] == user_id)
+        if self.shared is not None:
+            # a new random value rather than incr(), which not every backend
+            # does atomically; it must outlive the entries it outdates, which
+            # live up to two TTLs once copied from the shared tier
+            self.shared.set(self._version_key(user_id), uuid.uuid4().hex, 2 * self.ttl)
+
+    def clear(self):
+        """Drop every locally cached token."""
+        self.local.clear()
+
+
+def _dump(user, token):
+    """Return the cacheable field values of user and token."""
+    user_fields = [
+        field.attname
+        for field in user._meta.concrete_fields
+        # the hash is not needed to serve requests, leave it deferred
+        if field.attname != "password"
+    ]
+    return {
+        "user": {name: getattr(user, name) for name in user_fields},
+        "token": {
+            field.attname: getattr(token, field.attname)
+            for field in token._meta.concrete_fields
+        },
+    }
+
+
+def _load(entry):
+    """Build fresh user and token instances from cached field values."""
+    user = get_user_model().from_db(
+        DEFAULT_DB_ALIAS, list(entry["user"]), list(entry["user"].values())
+    )
+    token = Token.from_db(
+        DEFAULT_DB_ALIAS, list(entry["token"]), list(entry["token"].values())
+    )
+    token.user = user
+    return user, token
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Return the process-wide token cache."""
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = TokenCache()
+    return _token_cache
+
+
+def reset_token_cache():
+    """Discard the process-wide token cache so settings are re-read."""
+    global _token_cache
+    with _token_cache_lock:
+        _token_cache = None
+
+
+class _HeaderKey(TokenAuthentication):
+    """Reads the key from the Authorization header like TokenAuthentication."""
+
+    def authenticate_credentials(self, key):
+        return key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the database on a cache hit."""
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        # invalid tokens and inactive users raise here and are never cached
+        user, token = super().authenticate_credentials(key)
+        cache.set(key, user, token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, reading with the async ORM."""
+        header = _HeaderKey()
+        header.keyword = self.keyword
+        key = header.authenticate(request)
+        if key is None:
+            return None
+
+        cache = get_token_cache()
+        cached = await cache.aget(key)
+        if cached is not None:
+            return cached
+
+        user, token = await self.aauthenticate_credentials(key)
+        await cache.aset(key, user, token)
+        return user, token
+
+    async def aauthenticate_credentials(self, key):
+        """TokenAuthentication.authenticate_credentials() with the async ORM."""
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related("user").aget(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
@@ -0,0 +1,75 @@
+"""
+Benchmark scenarios for the user app.
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import register, measure, measure_requests
+from user.authentication import CachedTokenAuthentication, get_token_cache
+
+# most seconds spent on one endpoint; the password hashing ones are slow
+ENDPOINT_SECONDS = 5.0
+
+
+@register("token_auth")
+def token_auth(iterations):
+    """Compare token authentication with a cold and a warm cache."""
+    user = get_user_model().objects.create_user(
+        email="bench-token@example.com",
+        password="benchpass123",
+    )
+    key = Token.objects.create(user=user).key
+    auth = CachedTokenAuthentication()
+    cache = get_token_cache()
+
+    def cold():
+        cache.delete(key)
+        auth.authenticate_credentials(key)
+
+    cold_stats = measure(cold, iterations)
+    auth.authenticate_credentials(key)
+    warm_stats = measure(lambda: auth.authenticate_credentials(key), iterations)
+    cache.delete(key)
+    return {"cold": cold_stats, "warm": warm_stats}
+
+
+@register("user_api")
+def user_api(iterations):
+    """Time every user endpoint; requests that change data are rolled back."""
+    password = "benchpass123"
+    user = get_user_model().objects.create_user(
+        email="bench-user@example.com", password=password, name="Bench"
+    )
+    client = APIClient(HTTP_ACCEPT_ENCODING="br, gzip")
+    client.credentials(
+        HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}"
+    )
+    new_user = {"email": "bench-new@example.com", "password": password, "name": "New"}
+    requests = [
+        ("me", "me", "get", {}),
+        ("create", "create", "post", new_user),
+        ("token", "token", "post", {"email": user.email, "password": password}),
+        ("update", "me", "put", {**new_user, "email": user.email}),
+        ("partial_update", "me", "patch", {"name": "Renamed"}),
+    ]
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        for label, route, method, data in requests:
+            url = reverse(f"user:{route}")
+
+            def send(method=method, url=url, data=data):
+                return getattr(client, method)(url, data, format="json")
+
+            results[label] = {
+                "route": route,
+                "method": method.upper(),
+                **measure_requests(
+                    send, iterations, ENDPOINT_SECONDS, rollback=method != "get"
+                ),
+            }
+    return results
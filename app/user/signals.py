@@ -0,0 +1,39 @@
+"""
+Signal handlers for the user app.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import get_token_cache
+
+# saved on every login, and not used to authenticate
+UNCACHED_USER_FIELDS = {"last_login"}
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop serving a token from the cache once its deletion commits."""
+    key, user_id = instance.key, instance.user_id
+
+    def invalidate():
+        cache = get_token_cache()
+        cache.delete(key)
+        cache.invalidate_user(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, update_fields, **kwargs):
+    """Drop cached tokens when a user changes, e.g. password or is_active."""
+    if created:
+        return
+    if update_fields is not None and set(update_fields) <= UNCACHED_USER_FIELDS:
+        return
+    user_id = instance.pk
+    # until the change commits, a lookup would cache the old row again
+    transaction.on_commit(lambda: get_token_cache().invalidate_user(user_id))
@@ -0,0 +1,247 @@
+"""
+Tests for the cached token authentication.
+"""
+
+import json
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.query_detector import QueryBudgetMixin
+from user.authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    get_token_cache,
+    reset_token_cache,
+)
+
+ME_URL = reverse("user:me")
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)
+
+
+class CachedTokenAuthenticationTests(QueryBudgetMixin, TestCase):
+    """Test authenticating with cached tokens."""
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def tearDown(self):
+        reset_token_cache()
+
+    def test_cache_hit_runs_no_queries(self):
+        """Test a warm token is authenticated without the database."""
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_cache_hit_returns_fresh_instances(self):
+        """Test changes to a returned user do not leak into the cache."""
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        user.name = "Changed in request"
+
+        cached_user, _ = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertIsNot(cached_user, user)
+        self.assertEqual(cached_user.name, self.user.name)
+
+    def test_invalid_token_rejected(self):
+        """Test an unknown token fails and is not cached."""
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials("invalid")
+
+        self.assertIsNone(get_token_cache().get("invalid"))
+
+    def test_deleted_token_invalidated(self):
+        """Test a deleted token stops authenticating."""
+        key = self.token.key
+        self.auth.authenticate_credentials(key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        self.assertIsNone(get_token_cache().get(key))
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_inactive_user_invalidated(self):
+        """Test deactivating a user stops their cached token."""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_invalidated_once_committed(self):
+        """Test a change is only dropped from the cache when it commits."""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+            self.assertIsNotNone(get_token_cache().get(self.token.key))
+
+        callbacks[0]()
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_last_login_kept_cached(self):
+        """Test saving only the last login keeps the user's tokens cached."""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            update_last_login(None, self.user)
+
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+
+    @override_settings(WEB_WORKERS=2)
+    def test_off_with_workers_and_no_shared_tier(self):
+        """Test other workers' changes could not be seen, so nothing is cached."""
+        reset_token_cache()
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(len(get_token_cache().local), 0)
+
+    def test_password_change_invalidates_cache(self):
+        """Test updating the password through the API drops the cache entry."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = client.patch(ME_URL, {"password": "newpassword123"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(get_token_cache().get(self.token.key))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("newpassword123"))
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            },
+            "tokens": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "token-auth-tests",
+            },
+        },
+        TOKEN_AUTH_CACHE={"SHARED_CACHE": "tokens"},
+    )
+    def test_shared_cache_tier(self):
+        """Test a miss in the local tier is served from the shared cache."""
+        reset_token_cache()
+        self.auth.authenticate_credentials(self.token.key)
+        get_token_cache().local.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+        key = self.token.key
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        get_token_cache().local.clear()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            },
+            "tokens": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "token-auth-tests",
+            },
+        },
+        TOKEN_AUTH_CACHE={"SHARED_CACHE": "tokens"},
+        WEB_WORKERS=2,
+    )
+    def test_changes_reach_other_workers(self):
+        """Test a user changed in one worker stops being served by another."""
+        other_worker = TokenCache()
+        reset_token_cache()
+        self.auth.authenticate_credentials(self.token.key)
+        self.assertIsNotNone(other_worker.get(self.token.key))
+        self.assertEqual(len(other_worker.local), 1)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertIsNone(other_worker.get(self.token.key))
+        self.assertEqual(len(other_worker.local), 0)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def _aauthenticate(self, key):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Token {key}")
+        return async_to_sync(self.auth.aauthenticate)(request)
+
+    def test_async_cache_shared_with_sync(self):
+        """Test async views read and fill the same token cache."""
+        with self.assertNumQueries(1):
+            user, token = self._aauthenticate(self.token.key)
+
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+            cached_user, _ = self._aauthenticate(self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(cached_user.email, self.user.email)
+
+    def test_async_rejects_like_sync(self):
+        """Test async authentication refuses what the sync one does."""
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="Token")
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            async_to_sync(self.auth.aauthenticate)(request)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._aauthenticate("invalid")
+        self.assertIsNone(
+            async_to_sync(self.auth.aauthenticate)(RequestFactory().get("/"))
+        )
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._aauthenticate(self.token.key)
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_benchmark_warm_cache_runs_no_queries(self):
+        """Test the token_auth benchmark reports no queries once warm."""
+        out = StringIO()
+
+        call_command("benchmark", "token_auth", "--iterations", "5", stdout=out)
+
+        results = json.loads(out.getvalue())["token_auth"]
+        self.assertEqual(results["cold"]["queries_per_call"], 1)
+        self.assertEqual(results["warm"]["queries_per_call"], 0)
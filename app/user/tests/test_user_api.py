@@ -2,6 +2,10 @@
 Tests for the user API.
 """
 
+import json
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -9,6 +13,7 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.query_detector import QueryBudgetMixin
 
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
@@ -20,7 +25,7 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
-class PublicUserApiTests(TestCase):
+class PublicUserApiTests(QueryBudgetMixin, TestCase):
     """Test the public feature of the user API."""
 
     @classmethod
@@ -103,7 +108,7 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateUserApiTests(TestCase):
+class PrivateUserApiTests(QueryBudgetMixin, TestCase):
     """Test API requests that require authentication."""
 
     def setUp(self):
@@ -140,3 +145,32 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payaload["name"])
         self.assertTrue(self.user.check_password(payaload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class UserAPIBenchmarkTests(QueryBudgetMixin, TestCase):
+    """Test the user_api benchmark scenario."""
+
+    def test_every_endpoint(self):
+        """Test every route and method of the user API is measured."""
+        out = StringIO()
+
+        call_command("benchmark", "user_api", "--iterations=1", stdout=out)
+
+        results = json.loads(out.getvalue())["user_api"]
+        endpoints = {(r["route"], r["method"]) for r in results.values()}
+        self.assertEqual(
+            endpoints,
+            {
+                ("create", "POST"),
+                ("token", "POST"),
+                ("me", "GET"),
+                ("me", "PUT"),
+                ("me", "PATCH"),
+            },
+        )
+        for result in results.values():
+            self.assertLess(result["status"], 300, result)
+        # the changes were rolled back
+        self.assertFalse(
+            get_user_model().objects.filter(email="bench-new@example.com").exists()
+        )
@@ -0,0 +1,18 @@
+server {
+    listen ${LISTEN_PORT};
+
+    location /static {
+        alias /vol/static;
+
+    }
+
+    location / {
+        proxy_pass          http://${APP_HOST}:${APP_PORT};
+        proxy_http_version  1.1;
+        proxy_set_header    Host $http_host;
+        proxy_set_header    X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header    X-Forwarded-Proto $scheme;
+        client_max_body_size 10M;
+
+    }
+}
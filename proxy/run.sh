@@ -2,5 +2,12 @@
 
 set -e 
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf 
-nginx -g 'daemon off;'
\ No newline at end of file
+# SERVER_MODE=asgi proxies HTTP to uvicorn instead of the uwsgi protocol
+template=/etc/nginx/default.conf.tpl
+if [ "$SERVER_MODE" = "asgi" ]; then
+    template=/etc/nginx/asgi.conf.tpl
+fi
+
+# only our variables; nginx's own ($host, $scheme...) are left alone
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < $template > /etc/nginx/conf.d/default.conf 
+nginx -g 'daemon off;'
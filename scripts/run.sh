@@ -2,8 +2,25 @@
 
 set -e
 
+# worker processes; settings.py only trusts per-worker caches with one
+export WEB_WORKERS="${WEB_WORKERS:-2}"
+
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
+python manage.py build_schema
 python manage.py migrate 
+# index recipes the search migration found; a no-op once they all are
+python manage.py backfill_search
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # the image processing worker, restarted like uwsgi's attached daemon
+    (while true; do python manage.py process_images; sleep 1; done) &
+    # HTTP behind the proxy (which must run with SERVER_MODE=asgi too);
+    # app/asgi.py turns ASYNC_VIEWS on
+    exec uvicorn app.asgi:application --host 0.0.0.0 --port 9000 --workers "$WEB_WORKERS" \
+        --proxy-headers --forwarded-allow-ips "*"
+fi
 
-uwsgi --socket :9000 --workers 2 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# the uwsgi master also runs (and restarts) the image processing worker
+uwsgi --socket :9000 --workers "$WEB_WORKERS" --master --enable-threads --module app.wsgi \
+    --attach-daemon "python manage.py process_images"